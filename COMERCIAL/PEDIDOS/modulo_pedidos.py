@@ -21,6 +21,8 @@ try:
 except ImportError:
     st.error("Erro crítico: Arquivo conexao.py não localizado.")
 
+import modulo_carteira
+
 # Importação do módulo de configurações e Módulos Satélites (Tarefas/Renovação)
 try:
     from COMERCIAL import modulo_comercial_configuracoes
@@ -69,21 +71,9 @@ def registrar_movimentacao_financeira(conn, dados_pedido, tipo_lancamento, valor
         # 2. Define quem está operando (Usuário Logado)
         nome_operador = st.session_state.get('usuario_nome', 'Sistema')
 
-        # 3. Calcula Saldo Anterior
-        cur.execute("""
-            SELECT saldo_novo 
-            FROM cliente.extrato_carteira_por_produto 
-            WHERE id_cliente = %s 
-            ORDER BY id DESC LIMIT 1
-        """, (id_cliente,))
-        res_saldo = cur.fetchone()
-        saldo_anterior = float(res_saldo[0]) if res_saldo else 0.0
-        
+        # 3. Atualiza o saldo da carteira (UPDATE ... RETURNING, linha travada até o commit)
         valor_float = float(valor)
-        if tipo_lancamento == 'CREDITO':
-            saldo_novo = saldo_anterior + valor_float
-        else: # DEBITO
-            saldo_novo = saldo_anterior - valor_float
+        saldo_anterior, saldo_novo = modulo_carteira.movimentar_saldo(cur, id_cliente, tipo_lancamento, valor)
             
         # 4. Insere Completo
         # Nota: Schema cliente.extrato_carteira_por_produto usa TEXT para IDs
@@ -236,7 +226,7 @@ def criar_pedido_novo_fluxo(cliente, produto, qtd, valor_unitario, valor_total,
         msg_whats = ""
         if avisar_cliente and p_tel_cliente and modulo_comercial_configuracoes:
             try:
-                inst = modulo_wapi.buscar_instancia_ativa()
+                inst = modulo_wapi.buscar_instancia_ativa(p_tel_cliente)
                 if inst:
                     tpl = modulo_comercial_configuracoes.buscar_template_config("PEDIDOS", "criacao")
                     if tpl:
@@ -336,7 +326,7 @@ def atualizar_status_pedido(id_pedido, novo_status, dados_pedido, avisar, obs):
                                         .replace("{produto}", str(dados_pedido['nome_produto'])) \
                                         .replace("{obs_status}", obs)
                     
-                    inst = modulo_wapi.buscar_instancia_ativa()
+                    inst = modulo_wapi.buscar_instancia_ativa(dados_pedido['telefone_cliente'])
                     if inst:
                         modulo_wapi.enviar_msg_api(inst[0], inst[1], dados_pedido['telefone_cliente'], msg_final)
             
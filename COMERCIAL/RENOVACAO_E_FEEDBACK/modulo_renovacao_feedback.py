@@ -110,7 +110,7 @@ def atualizar_status_rf(id_rf, novo_status, obs, dados_rf, avisar):
                                         .replace("{produto}", str(dados_rf['nome_produto'])) \
                                         .replace("{obs_status}", obs)
                     
-                    instancia = modulo_wapi.buscar_instancia_ativa()
+                    instancia = modulo_wapi.buscar_instancia_ativa(dados_rf['telefone_cliente'])
                     if instancia:
                         modulo_wapi.enviar_msg_api(instancia[0], instancia[1], dados_rf['telefone_cliente'], msg_final)
 
@@ -108,7 +108,7 @@ def criar_tarefa(id_pedido, id_cliente, id_produto, data_prev, obs_tarefa, dados
             conn.close()
             
             if avisar_cli and dados_pedido.get('telefone_cliente') and modulo_comercial_configuracoes:
-                instancia = modulo_wapi.buscar_instancia_ativa()
+                instancia = modulo_wapi.buscar_instancia_ativa(dados_pedido['telefone_cliente'])
                 if instancia:
                     template = modulo_comercial_configuracoes.buscar_template_config("TAREFAS", "solicitado")
                     
@@ -145,7 +145,7 @@ def atualizar_status_tarefa(id_tarefa, novo_status, obs_status, dados_completos,
                                         .replace("{produto}", str(dados_completos['nome_produto'])) \
                                         .replace("{obs_status}", obs_status)
                     
-                    inst = modulo_wapi.buscar_instancia_ativa()
+                    inst = modulo_wapi.buscar_instancia_ativa(dados_completos['telefone_cliente'])
                     if inst:
                         modulo_wapi.enviar_msg_api(inst[0], inst[1], dados_completos['telefone_cliente'], msg_final)
 
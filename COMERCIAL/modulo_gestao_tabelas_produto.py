@@ -2,7 +2,6 @@ import streamlit as st
 import pandas as pd
 import psycopg2
 from sqlalchemy import create_engine
-from sqlalchemy.exc import SQLAlchemyError
 import sys
 import os
 
@@ -26,6 +25,9 @@ except ImportError:
         st.error("Arquivo 'conexao.py' não encontrado. Verifique a configuração.")
         conexao = None
 
+import modulo_catalogo as catalogo
+import modulo_salvamento_incremental as salvamento
+
 # --- CONFIGURAÇÕES ---
 # Lista de schemas permitidos para visualização/edição
 SCHEMAS_PERMITIDOS = ['cliente', 'admin', 'permissoes', 'permissao', 'public']
@@ -39,32 +41,7 @@ def obter_lista_completa_tabelas(schemas):
     """
     Busca todas as tabelas dos schemas permitidos e retorna uma lista de tuplas (schema, tabela).
     """
-    if not conexao: return []
-    
-    try:
-        conn = psycopg2.connect(
-            host=conexao.host, port=conexao.port, database=conexao.database,
-            user=conexao.user, password=conexao.password
-        )
-        cursor = conn.cursor()
-        
-        # Formata a lista para o SQL
-        schemas_str = "', '".join(schemas)
-        query = f"""
-            SELECT table_schema, table_name 
-            FROM information_schema.tables 
-            WHERE table_schema IN ('{schemas_str}')
-            ORDER BY table_schema, table_name;
-        """
-        
-        cursor.execute(query)
-        resultados = cursor.fetchall() 
-        conn.close()
-        
-        return resultados # Retorna a variável correta 'resultados'
-    except Exception as e:
-        st.error(f"Erro ao buscar lista de tabelas: {e}")
-        return []
+    return [(schema, tabela) for schema in sorted(schemas) for tabela in catalogo.listar_tabelas(schema)]
 
 def carregar_dados(schema, tabela):
     """Lê os dados da tabela para um DataFrame"""
@@ -77,24 +54,29 @@ def carregar_dados(schema, tabela):
         st.error(f"Erro ao ler tabela: {e}")
         return None
 
-def salvar_alteracoes(df, schema, tabela):
+def salvar_alteracoes(df, schema, tabela, df_original):
     """
-    Substitui a tabela inteira pelos dados novos (Truncate + Insert).
+    Grava só as linhas incluídas/alteradas/excluídas em relação a df_original (pela PK).
     """
     try:
-        engine = create_engine(get_db_url())
-        with engine.begin() as conn:
-            # 1. Truncate (Limpa a tabela mantendo a estrutura)
-            conn.exec_driver_sql(f'TRUNCATE TABLE "{schema}"."{tabela}" RESTART IDENTITY CASCADE')
-            
-            # 2. Insert (Insere os dados do DataFrame)
-            df.to_sql(tabela, conn, schema=schema, if_exists='append', index=False)
-            
-        return True, "Dados salvos com sucesso!"
-    except SQLAlchemyError as e:
+        conn = psycopg2.connect(host=conexao.host, port=conexao.port, database=conexao.database, user=conexao.user, password=conexao.password)
+    except Exception as e:
+        return False, f"Erro de conexão: {str(e)}"
+    try:
+        resultado = salvamento.salvar_diff(conn, schema, tabela, df_original, df)
+        conn.commit()
+        return True, f"Dados salvos com sucesso: {salvamento.resumo_diff(resultado)}"
+    except ValueError as e:
+        conn.rollback()
+        return False, str(e)
+    except psycopg2.Error as e:
+        conn.rollback()
         return False, f"Erro de banco de dados: {str(e)}"
     except Exception as e:
+        conn.rollback()
         return False, f"Erro genérico: {str(e)}"
+    finally:
+        conn.close()
 
 # --- FUNÇÃO PRINCIPAL DO MÓDULO ---
 def app_tabelas():
@@ -171,10 +153,10 @@ def app_tabelas():
                         st.warning("Nenhuma alteração detectada.")
                     else:
                         with st.spinner("Salvando no Banco de Dados..."):
-                            sucesso, msg = salvar_alteracoes(df_editado, schema_atual, nome_tabela_atual)
+                            sucesso, msg = salvar_alteracoes(df_editado, schema_atual, nome_tabela_atual, df_original)
                             if sucesso:
                                 st.success(msg)
-                                st.session_state['df_base'] = df_editado
+                                st.session_state['df_base'] = carregar_dados(schema_atual, nome_tabela_atual)
                             else:
                                 st.error(f"Falha ao salvar: {msg}")
 
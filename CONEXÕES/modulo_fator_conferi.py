@@ -1,8 +1,8 @@
 import streamlit as st
 import pandas as pd
 import psycopg2
-import requests
 import json
+import codecs
 import os
 import re
 import sys
@@ -28,6 +28,10 @@ except ImportError as e:
     st.error(f"Erro crítico: Não foi possível importar 'modulo_validadores'. Detalhe: {e}")
     st.stop()
 
+import modulo_carteira
+import modulo_catalogo as catalogo
+import modulo_http as cliente_http
+
 # --- DIRETÓRIOS ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PASTA_JSON = os.path.join(BASE_DIR, "JSON")
@@ -64,36 +68,145 @@ def sanitizar_e_formatar(valor):
     return v_str.upper()
 
 # =============================================================================
-# 2. PARSER SIMPLIFICADO
+# 2. PARSER INCREMENTAL (UMA PASSADA, SEM ÁRVORE INTERMEDIÁRIA)
 # =============================================================================
 
-def _xml_to_dict_simple(element):
-    text = element.text.strip() if element.text else None
-    if len(element) == 0:
-        return text
-    result = {}
-    for child in element:
-        tag = child.tag.replace('{', '').split('}')[-1].upper()
-        child_data = _xml_to_dict_simple(child)
-        if tag in result:
-            if isinstance(result[tag], list):
-                result[tag].append(child_data)
+TAMANHO_BLOCO_PARSER = 64 * 1024
+
+def _normalizar_tag(tag):
+    return tag.replace('{', '').split('}')[-1].upper()
+
+def _chaves_caminho(caminho_str):
+    """Passos de um caminho do mapa (SEÇÃO;SUBCAMPO;[]{LISTA}) já normalizados como tags."""
+    caminho_limpo = re.sub(r'".*?"', '', str(caminho_str)).strip()
+    chaves = []
+    for passo in [p.strip() for p in caminho_limpo.split(';') if p.strip()]:
+        chave = passo.replace('[]', '').replace('{', '').replace('}', '').upper().strip()
+        if not chave: break
+        chaves.append(chave)
+    return chaves
+
+def compilar_caminhos_mapeados(caminhos):
+    """
+    Monta a árvore de tags usada pelo parser para montar só os ramos referenciados pelo mapa.
+    Um nó None significa "manter a subárvore inteira". Retorna None se algum caminho pedir a resposta toda.
+    """
+    arvore = {}
+    for caminho_str in caminhos:
+        if not caminho_str: continue
+        chaves = _chaves_caminho(caminho_str)
+        if not chaves: return None
+        no = arvore
+        for chave in chaves[:-1]:
+            if chave in no and no[chave] is None: break
+            no = no.setdefault(chave, {})
+        else:
+            no[chaves[-1]] = None
+    return arvore
+
+def carregar_caminhos_mapeados():
+    """Lê os caminhos JSON cadastrados em fatorconferi_conexao_tabelas e compila para o parser."""
+    conn = get_conn()
+    if not conn: return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT DISTINCT jason_api_fatorconferi_coluna FROM conexoes.fatorconferi_conexao_tabelas WHERE jason_api_fatorconferi_coluna IS NOT NULL")
+            return compilar_caminhos_mapeados([r[0] for r in cur.fetchall()])
+    except: return None
+    finally: conn.close()
+
+class _NoXML:
+    __slots__ = ('tag', 'filhos', 'partes_texto', 'tem_filhos', 'caminho', 'manter')
+
+    def __init__(self, tag, caminho, manter):
+        self.tag = tag
+        self.filhos = {}
+        self.partes_texto = []
+        self.tem_filhos = False
+        self.caminho = caminho
+        self.manter = manter
+
+class _MontadorDict:
+    """Target do XMLParser: converte os eventos start/data/end direto no dict final."""
+
+    def __init__(self, caminhos=None):
+        self.caminhos = caminhos
+        self.pilha = []
+        self.resultado = None
+        self.tags = {}
+
+    def start(self, tag, attrib):
+        tag_norm = self.tags.get(tag)
+        if tag_norm is None:
+            tag_norm = self.tags[tag] = _normalizar_tag(tag)
+        tag = tag_norm
+        if not self.pilha:
+            self.pilha.append(_NoXML(tag, self.caminhos, True))
+            return
+        pai = self.pilha[-1]
+        pai.tem_filhos = True
+        if not pai.manter:
+            self.pilha.append(_NoXML(tag, None, False))
+        elif pai.caminho is None:
+            self.pilha.append(_NoXML(tag, None, True))
+        elif tag in pai.caminho:
+            self.pilha.append(_NoXML(tag, pai.caminho[tag], True))
+        else:
+            self.pilha.append(_NoXML(tag, None, False))
+
+    def data(self, texto):
+        no = self.pilha[-1]
+        if no.manter and not no.tem_filhos:
+            no.partes_texto.append(texto)
+
+    def end(self, tag):
+        no = self.pilha.pop()
+        if not no.manter: return
+        if no.tem_filhos:
+            valor = no.filhos
+        else:
+            valor = ''.join(no.partes_texto).strip() if no.partes_texto else None
+
+        if not self.pilha:
+            self.resultado = valor
+            return
+        filhos = self.pilha[-1].filhos
+        if no.tag in filhos:
+            if isinstance(filhos[no.tag], list):
+                filhos[no.tag].append(valor)
             else:
-                result[tag] = [result[tag], child_data]
+                filhos[no.tag] = [filhos[no.tag], valor]
         else:
-            result[tag] = child_data
-    return result
+            filhos[no.tag] = valor
+
+    def close(self):
+        return self.resultado
 
-def parse_xml_to_dict(texto_raw):
+def parse_xml_to_dict(texto_raw, caminhos=None):
+    """
+    Converte a resposta da API (XML ou JSON) em dict numa única passada, alimentando o parser em blocos.
+    'caminhos' (ver compilar_caminhos_mapeados) restringe a montagem aos ramos usados pelo mapa de dados.
+    """
     try:
+        if not texto_raw: return {}
+        decodificador = None
+        cabeca = texto_raw[:64]
         if isinstance(texto_raw, bytes):
-            texto_raw = texto_raw.decode('utf-8', errors='ignore')
-        texto_raw = texto_raw.replace('ISO-8859-1', 'UTF-8')
-        try:
-            return json.loads(texto_raw)
-        except: pass
-        root = ET.fromstring(texto_raw)
-        return _xml_to_dict_simple(root)
+            decodificador = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+            cabeca = cabeca.decode('utf-8', errors='ignore')
+        if cabeca.lstrip()[:1] in ('{', '['):
+            try:
+                return json.loads(texto_raw)
+            except: pass
+
+        # Alimentado com str, o expat ignora o encoding declarado (ISO-8859-1) e usa UTF-8
+        parser = ET.XMLParser(target=_MontadorDict(caminhos))
+        for inicio in range(0, len(texto_raw), TAMANHO_BLOCO_PARSER):
+            bloco = texto_raw[inicio:inicio + TAMANHO_BLOCO_PARSER]
+            if decodificador: bloco = decodificador.decode(bloco)
+            parser.feed(bloco)
+        if decodificador: parser.feed(decodificador.decode(b'', final=True))
+        return parser.close()
     except Exception as e:
         return {}
 
@@ -262,7 +375,7 @@ def consultar_saldo_api():
     if not cred['token']: return False, 0.0
     url = f"{cred['url']}?acao=VER_SALDO&TK={cred['token']}"
     try:
-        response = requests.get(url, timeout=10)
+        response = cliente_http.get(url, "fator.saldo")
         valor_texto = response.text.strip()
         if '<' in valor_texto:
             try: root = ET.fromstring(valor_texto); valor_texto = root.text 
@@ -331,12 +444,8 @@ def processar_cobranca_novo_fluxo(conn, dados_cliente, origem_custo_chave):
         
         if valor_debitar <= 0: return True, "Gratuito."
 
-        # 3. Busca Saldo Anterior
-        sql_saldo = "SELECT saldo_novo FROM cliente.extrato_carteira_por_produto WHERE id_cliente = %s ORDER BY id DESC LIMIT 1"
-        cur.execute(sql_saldo, (id_cli,))
-        res_saldo = cur.fetchone()
-        saldo_anterior = float(res_saldo[0]) if res_saldo else 0.0
-        saldo_novo = saldo_anterior - valor_debitar
+        # 3. Debita o saldo (linha do cliente travada até o commit)
+        saldo_anterior, saldo_novo = modulo_carteira.movimentar_saldo(cur, id_cli, 'DEBITO', res_custo[0])
         
         # 4. Nome do Operador
         nome_operador = st.session_state.get('usuario_nome', 'Sistema')
@@ -381,11 +490,7 @@ def obter_dados_financeiros_cliente(conn, id_cliente, origem_custo):
         else:
             dados["custo_previsto"] = buscar_valor_consulta_atual()
 
-        sql_saldo = "SELECT saldo_novo FROM cliente.extrato_carteira_por_produto WHERE id_cliente = %s ORDER BY id DESC LIMIT 1"
-        cur.execute(sql_saldo, (str(id_cliente),))
-        res_saldo = cur.fetchone()
-        if res_saldo:
-            dados["saldo_atual"] = float(res_saldo[0])
+        dados["saldo_atual"] = modulo_carteira.obter_saldo(cur, id_cliente)
             
     except: pass
     return dados
@@ -454,7 +559,7 @@ def realizar_consulta_cpf_segura(cpf, ambiente, forcar_nova=False, id_cliente_pa
             conn.rollback(); conn.close()
             return {"sucesso": False, "msg": "Token API ausente."}
         
-        resp = requests.get(f"{cred['url']}?acao=CONS_CPF&TK={cred['token']}&DADO={cpf_padrao}", timeout=30)
+        resp = cliente_http.get(f"{cred['url']}?acao=CONS_CPF&TK={cred['token']}&DADO={cpf_padrao}", "fator.cons-cpf")
         dados = parse_xml_to_dict(resp.text)
         
         nome_arq = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{cpf_padrao}.json"
@@ -584,35 +689,10 @@ def criar_tabela_conexao_tabelas():
         finally: conn.close()
 
 def listar_tabelas_disponiveis():
-    conn = get_conn()
-    if not conn: return []
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT table_schema || '.' || table_name 
-                FROM information_schema.tables 
-                WHERE table_schema IN ('banco_pf', 'conexoes', 'sistema_consulta') 
-                ORDER BY table_schema, table_name
-            """)
-            return [r[0] for r in cur.fetchall()]
-    except: return []
-    finally: conn.close()
+    return [f"{schema}.{tabela}" for schema in ('banco_pf', 'conexoes', 'sistema_consulta') for tabela in catalogo.listar_tabelas(schema)]
 
 def listar_colunas_geral(nome_tabela_completo):
-    conn = get_conn()
-    if not conn: return []
-    try:
-        with conn.cursor() as cur:
-            parts = nome_tabela_completo.split('.')
-            schema = parts[0] if len(parts) > 1 else 'public'
-            tabela = parts[1] if len(parts) > 1 else parts[0]
-            cur.execute("""
-                SELECT column_name FROM information_schema.columns 
-                WHERE table_schema = %s AND table_name = %s ORDER BY ordinal_position
-            """, (schema, tabela))
-            return [r[0] for r in cur.fetchall()]
-    except: return []
-    finally: conn.close()
+    return catalogo.listar_colunas(nome_tabela_completo)
 
 def listar_mapeamento_tabela(nome_tabela):
     conn = get_conn()
@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import tracemalloc
+import argparse
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+import modulo_fator_conferi as mfc
+
+# =============================================================================
+# BENCHMARK DO PARSER FATOR CONFERI
+# Uso: python util_benchmark_parser_fator.py [pasta_amostras] [--repeticoes N] [--mapa]
+# A pasta pode conter respostas XML gravadas (.xml) ou os JSON salvos em CONEXÕES/JSON,
+# que são convertidos de volta para XML antes da medição.
+# =============================================================================
+
+def _parse_referencia_no(element):
+    """Implementação anterior (ET.fromstring + recursão), mantida só para comparação."""
+    text = element.text.strip() if element.text else None
+    if len(element) == 0:
+        return text
+    result = {}
+    for child in element:
+        tag = child.tag.replace('{', '').split('}')[-1].upper()
+        child_data = _parse_referencia_no(child)
+        if tag in result:
+            if isinstance(result[tag], list):
+                result[tag].append(child_data)
+            else:
+                result[tag] = [result[tag], child_data]
+        else:
+            result[tag] = child_data
+    return result
+
+def parse_referencia(texto_raw):
+    try:
+        if isinstance(texto_raw, bytes):
+            texto_raw = texto_raw.decode('utf-8', errors='ignore')
+        texto_raw = texto_raw.replace('ISO-8859-1', 'UTF-8')
+        try:
+            return json.loads(texto_raw)
+        except: pass
+        return _parse_referencia_no(ET.fromstring(texto_raw))
+    except Exception:
+        return {}
+
+def _dict_para_xml(tag, valor, partes):
+    if isinstance(valor, list):
+        for item in valor: _dict_para_xml(tag, item, partes)
+    elif isinstance(valor, dict):
+        partes.append(f"<{tag}>")
+        for k, v in valor.items(): _dict_para_xml(k, v, partes)
+        partes.append(f"</{tag}>")
+    elif valor is None:
+        partes.append(f"<{tag}/>")
+    else:
+        partes.append(f"<{tag}>{escape(str(valor))}</{tag}>")
+
+def carregar_amostras(pasta):
+    amostras = []
+    for nome in sorted(os.listdir(pasta)):
+        caminho = os.path.join(pasta, nome)
+        if nome.lower().endswith('.xml'):
+            with open(caminho, 'rb') as f: amostras.append((nome, f.read().decode('utf-8', errors='ignore')))
+        elif nome.lower().endswith('.json'):
+            with open(caminho, 'r', encoding='utf-8') as f: dados = json.load(f)
+            if not isinstance(dados, dict) or not dados: continue
+            partes = ['<?xml version="1.0" encoding="ISO-8859-1"?>']
+            _dict_para_xml("CONSULTA", dados, partes)
+            amostras.append((nome, ''.join(partes)))
+    return amostras
+
+def medir(funcao, texto, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes): resultado = funcao(texto)
+    tempo_ms = (time.perf_counter() - inicio) * 1000 / repeticoes
+
+    tracemalloc.start()
+    funcao(texto)
+    pico_kb = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return resultado, tempo_ms, pico_kb
+
+def executar_benchmark(pasta, repeticoes, usar_mapa):
+    amostras = carregar_amostras(pasta)
+    if not amostras:
+        print(f"❌ Nenhuma amostra .xml/.json encontrada em {pasta}")
+        return
+
+    caminhos = mfc.carregar_caminhos_mapeados() if usar_mapa else None
+    if usar_mapa and caminhos is None:
+        print("⚠️  Mapa de dados indisponível (ou pede a resposta inteira). Medindo só o parse completo.")
+
+    print(f"{'AMOSTRA':<40} {'KB':>8} {'ANTIGO ms':>10} {'NOVO ms':>10} {'MAPA ms':>10} {'ANTIGO pico':>12} {'NOVO pico':>10}")
+    for nome, texto in amostras:
+        ref, t_ref, m_ref = medir(parse_referencia, texto, repeticoes)
+        novo, t_novo, m_novo = medir(mfc.parse_xml_to_dict, texto, repeticoes)
+        t_mapa = None
+        if caminhos is not None:
+            _, t_mapa, _ = medir(lambda t: mfc.parse_xml_to_dict(t, caminhos), texto, repeticoes)
+
+        status = "" if ref == novo else "  ⚠️ RESULTADO DIVERGENTE"
+        col_mapa = f"{t_mapa:>10.2f}" if t_mapa is not None else f"{'-':>10}"
+        print(f"{nome[:40]:<40} {len(texto) / 1024:>8.1f} {t_ref:>10.2f} {t_novo:>10.2f} {col_mapa} {m_ref:>10.0f}KB {m_novo:>8.0f}KB{status}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Compara o parser antigo e o incremental do Fator Conferi.")
+    ap.add_argument("pasta", nargs="?", default=mfc.PASTA_JSON)
+    ap.add_argument("--repeticoes", type=int, default=20)
+    ap.add_argument("--mapa", action="store_true", help="Mede também o parse restrito aos caminhos do mapa de dados")
+    args = ap.parse_args()
+    executar_benchmark(args.pasta, args.repeticoes, args.mapa)
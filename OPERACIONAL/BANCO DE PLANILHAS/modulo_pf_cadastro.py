@@ -12,6 +12,13 @@ try:
 except ImportError:
     st.error("Erro crítico: conexao.py não encontrado.")
 
+import modulo_catalogo as catalogo
+
+try:
+    import modulo_busca_indices
+except ImportError:
+    modulo_busca_indices = None
+
 # ==============================================================================
 # 1. CAMADA DE DADOS E BACKEND
 # ==============================================================================
@@ -99,6 +106,9 @@ def init_db_structures():
         except Exception as e:
             print(f"Erro no init_db: {e}")
 
+    # Índices trigram de nome/CPF/telefone usados por buscar_pf_simples
+    if modulo_busca_indices: modulo_busca_indices.garantir_indices_busca('banco_pf')
+
 # --- HELPERS E VALIDAÇÕES ---
 
 def formatar_cpf_visual(cpf_db):
@@ -159,6 +169,30 @@ def safe_view(valor):
 
 # --- OPERAÇÕES DE BANCO (CRUD & LISTAGEM) ---
 
+def carregar_satelites_matriculas(conn, matriculas):
+    """
+    Busca de uma vez os contratos (pf_contratos) e os dados CLT (pf_matricula_dados_clt)
+    de todas as matrículas do cliente com = ANY(%s) e agrupa por matrícula em memória.
+    Retorna {'contratos': {matricula: [registros]}, 'dados_clt': {matricula: [registros]}}.
+    """
+    lotes = {'contratos': {}, 'dados_clt': {}}
+    matriculas = list(dict.fromkeys(m for m in matriculas if m))
+    if not matriculas: return lotes
+    try:
+        df_contratos = pd.read_sql("SELECT * FROM banco_pf.pf_contratos WHERE matricula_ref = ANY(%s) ORDER BY id", conn, params=(matriculas,))
+        if not df_contratos.empty:
+            df_contratos['origem_tabela'] = 'banco_pf.pf_contratos'
+            df_contratos['tipo_origem'] = 'Geral'
+            for matricula, grupo in df_contratos.groupby(df_contratos['matricula_ref'].astype(str).str.strip(), sort=False):
+                lotes['contratos'][matricula] = grupo.to_dict('records')
+    except: conn.rollback()
+    try:
+        df_clt = pd.read_sql("SELECT * FROM banco_pf.pf_matricula_dados_clt WHERE matricula = ANY(%s) ORDER BY id", conn, params=(matriculas,))
+        for matricula, grupo in df_clt.groupby(df_clt['matricula'].astype(str).str.strip(), sort=False):
+            lotes['dados_clt'][matricula] = grupo.where(pd.notnull(grupo), None).to_dict('records')
+    except: conn.rollback()
+    return lotes
+
 def carregar_dados_completos(cpf):
     conn = get_conn(); dados = {'geral': {}, 'telefones': [], 'emails': [], 'enderecos': [], 'empregos': [], 'contratos': []}
     if conn:
@@ -180,18 +214,14 @@ def carregar_dados_completos(cpf):
             except:
                 conn.rollback(); df_emp = pd.DataFrame()
 
-            # Processa vínculos principais
+            # Processa vínculos principais (contratos e dados CLT de todas as matrículas em lote)
             if not df_emp.empty:
+                lotes = carregar_satelites_matriculas(conn, df_emp['matricula'].dropna().astype(str).str.strip().tolist())
                 for _, row_emp in df_emp.iterrows():
-                    vinculo = {'convenio': str(row_emp['convenio']).strip(), 'matricula': str(row_emp['matricula']).strip(), 'dados_extras': row_emp.get('dados_extras'), 'contratos': []}
-                    # Tenta buscar contratos
-                    try:
-                        df_contratos = pd.read_sql("SELECT * FROM banco_pf.pf_contratos WHERE matricula_ref = %s", conn, params=(vinculo['matricula'],))
-                        if not df_contratos.empty:
-                            df_contratos['origem_tabela'] = 'banco_pf.pf_contratos'
-                            df_contratos['tipo_origem'] = 'Geral'
-                            vinculo['contratos'] = df_contratos.to_dict('records')
-                    except: pass
+                    matricula = str(row_emp['matricula']).strip()
+                    vinculo = {'convenio': str(row_emp['convenio']).strip(), 'matricula': matricula, 'dados_extras': row_emp.get('dados_extras'), 'contratos': [], 'dados_clt': []}
+                    vinculo['contratos'] = lotes['contratos'].get(matricula, [])
+                    vinculo['dados_clt'] = lotes['dados_clt'].get(matricula, [])
                     dados['empregos'].append(vinculo)
 
             # --- 2. BUSCA COMPLEMENTAR (TABELA CPF_CONVENIO) ---
@@ -370,29 +400,30 @@ def buscar_pf_simples(termo, pagina=1, itens_por_pagina=50):
     conn = get_conn()
     if conn:
         try:
-            termo_limpo = limpar_normalizar_cpf(termo)
-            col_fk_tel = 'cpf'
-            try:
-                cur_cols = conn.cursor()
-                cur_cols.execute("SELECT column_name FROM information_schema.columns WHERE table_schema = 'banco_pf' AND table_name = 'pf_telefones' AND column_name = 'cpf_ref'")
-                if cur_cols.fetchone(): col_fk_tel = 'cpf_ref'
-                cur_cols.close()
-            except: pass
+            termo_digitos = limpar_apenas_numeros(termo)
+            col_fk_tel = 'cpf_ref' if catalogo.tabela_tem_coluna('pf_telefones', 'cpf_ref', 'banco_pf') else 'cpf'
 
             params = []
-            if termo_limpo and len(termo_limpo) > 6:
-                sql_base = f"SELECT DISTINCT d.id, d.nome, d.cpf, d.data_nascimento FROM banco_pf.pf_dados d LEFT JOIN banco_pf.pf_telefones t ON d.cpf = t.{col_fk_tel} WHERE d.cpf LIKE %s OR t.numero LIKE %s"
-                params = [f"%{termo_limpo}%", f"%{termo_limpo}%"]
+            if termo_digitos and len(termo_digitos) > 6:
+                # Um ramo por índice (CPF e telefone só dígitos) em vez de OR sobre o LEFT JOIN
+                expr_tel = modulo_busca_indices.expr_digitos('t.numero') if modulo_busca_indices else "regexp_replace(t.numero::text, '[^0-9]', '', 'g')"
+                sql_base = f"""
+                    SELECT d.id, d.nome, d.cpf, d.data_nascimento FROM banco_pf.pf_dados d WHERE d.cpf LIKE %s
+                    UNION
+                    SELECT d.id, d.nome, d.cpf, d.data_nascimento FROM banco_pf.pf_telefones t
+                    JOIN banco_pf.pf_dados d ON d.cpf = t.{col_fk_tel} WHERE {expr_tel} LIKE %s
+                """
+                params = [f"%{termo_digitos}%", f"%{termo_digitos}%"]
             else:
-                sql_base = "SELECT DISTINCT d.id, d.nome, d.cpf, d.data_nascimento FROM banco_pf.pf_dados d WHERE d.nome ILIKE %s"
-                params = [f"%{termo}%"]
+                sql_base = "SELECT d.id, d.nome, d.cpf, d.data_nascimento FROM banco_pf.pf_dados d WHERE d.nome ILIKE %s"
+                params = [f"%{termo.strip()}%"]
             
             cur = conn.cursor()
             cur.execute(f"SELECT COUNT(*) FROM ({sql_base}) as sub", tuple(params))
             total = cur.fetchone()[0]
             
             offset = (pagina-1)*itens_por_pagina
-            df = pd.read_sql(f"{sql_base} ORDER BY d.nome LIMIT {itens_por_pagina} OFFSET {offset}", conn, params=tuple(params))
+            df = pd.read_sql(f"SELECT * FROM ({sql_base}) as sub ORDER BY nome LIMIT {itens_por_pagina} OFFSET {offset}", conn, params=tuple(params))
             conn.close()
             return df, total
         except Exception as e:
@@ -445,16 +476,7 @@ def listar_tabelas_filtro(conn):
     return ['banco_pf.pf_dados', 'banco_pf.pf_enderecos', 'banco_pf.pf_telefones', 'banco_pf.pf_emprego_renda', 'banco_pf.cpf_convenio']
 
 def get_colunas_filtro(tabela):
-    conn = get_conn(); cols = []
-    if conn:
-        try:
-            schema = 'banco_pf'; nome = tabela.split('.')[-1]
-            cur = conn.cursor()
-            cur.execute("SELECT column_name FROM information_schema.columns WHERE table_name = %s AND table_schema = %s ORDER BY column_name", (nome, schema))
-            cols = [r[0] for r in cur.fetchall()]
-            conn.close()
-        except: conn.close()
-    return cols
+    return sorted(catalogo.listar_colunas(tabela.split('.')[-1], 'banco_pf'))
 
 CONFIG_CADASTRO = {
     "Dados Cadastrais": [
@@ -797,6 +819,9 @@ def view_detalhes_cliente():
                 if emp.get('dados_extras'):
                     st.caption(f"ℹ️ {emp.get('dados_extras')}")
                 
+                if emp.get('dados_clt'):
+                    st.dataframe(pd.DataFrame(emp['dados_clt']), hide_index=True, use_container_width=True)
+                
                 if emp.get('contratos'):
                     st.dataframe(pd.DataFrame(emp['contratos']), hide_index=True, use_container_width=True)
                 else:
@@ -3,6 +3,8 @@ import pandas as pd
 import json
 import time
 import re
+import hashlib
+import io
 from datetime import date
 # Importações dos módulos ativos
 import modulo_pf_cadastro as pf_core
@@ -37,103 +39,131 @@ CAMPOS_CONFIG = {
 }
 
 # =============================================================================
-# 1. MOTOR DE BUSCA INTERNO
+# 1. MOTOR DE BUSCA INTERNO (COMPILADOR DE REGRAS -> EXISTS)
 # =============================================================================
 
-def executar_pesquisa_campanha_interna(regras_ativas, pagina=1, itens_por_pagina=50):
-    conn = pf_core.get_conn()
-    if conn:
-        try:
-            sql_select = "SELECT DISTINCT d.id, d.nome, d.cpf, d.data_nascimento "
-            sql_from = "FROM banco_pf.pf_dados d "
-            
-            # --- MAPA DE JOINS ---
-            joins_map = {
-                'banco_pf.pf_telefones': "JOIN banco_pf.pf_telefones tel ON d.cpf = tel.cpf",
-                'banco_pf.pf_emails': "JOIN banco_pf.pf_emails em ON d.cpf = em.cpf",
-                'banco_pf.pf_enderecos': "JOIN banco_pf.pf_enderecos ende ON d.cpf = ende.cpf",
-                'banco_pf.pf_emprego_renda': "JOIN banco_pf.pf_emprego_renda emp ON d.cpf = emp.cpf",
-                'banco_pf.pf_contratos': "JOIN banco_pf.pf_contratos ctr ON emp.matricula = ctr.matricula",
-                'banco_pf.pf_matricula_dados_clt': "LEFT JOIN banco_pf.pf_matricula_dados_clt clt ON emp.matricula = clt.matricula"
-            }
-            
-            tabelas_necessarias = set()
-            
-            for regra in regras_ativas:
-                tabela = regra['tabela']
-                if tabela == 'banco_pf.pf_contratos_clt': tabela = 'banco_pf.pf_matricula_dados_clt'
-                tabelas_necessarias.add(tabela)
+# Tabelas satélite: alias usado nas colunas das regras e correlação com o pai.
+# Contratos e dados CLT pendem da matrícula, então ficam aninhados no EXISTS de emprego.
+TABELAS_SATELITE = {
+    'banco_pf.pf_telefones': ("tel", "tel.cpf = d.cpf", None),
+    'banco_pf.pf_emails': ("em", "em.cpf = d.cpf", None),
+    'banco_pf.pf_enderecos': ("ende", "ende.cpf = d.cpf", None),
+    'banco_pf.pf_emprego_renda': ("emp", "emp.cpf = d.cpf", None),
+    'banco_pf.pf_contratos': ("ctr", "ctr.matricula_ref = emp.matricula", 'banco_pf.pf_emprego_renda'),
+    'banco_pf.pf_matricula_dados_clt': ("clt", "clt.matricula = emp.matricula", 'banco_pf.pf_emprego_renda'),
+}
 
-            if 'banco_pf.pf_matricula_dados_clt' in tabelas_necessarias or 'banco_pf.pf_contratos' in tabelas_necessarias:
-                tabelas_necessarias.add('banco_pf.pf_emprego_renda')
+def _normalizar_tabela_regra(tabela):
+    return 'banco_pf.pf_matricula_dados_clt' if tabela == 'banco_pf.pf_contratos_clt' else tabela
 
-            active_joins = []
-            
-            if 'banco_pf.pf_emprego_renda' in tabelas_necessarias:
-                active_joins.append(joins_map['banco_pf.pf_emprego_renda'])
-            
-            for tbl in tabelas_necessarias:
-                if tbl == 'banco_pf.pf_emprego_renda': continue 
-                if tbl in joins_map:
-                    active_joins.append(joins_map[tbl])
-
-            # --- CONSTRUÇÃO DO WHERE ---
-            conditions = []
-            params = []
-
-            for regra in regras_ativas:
-                tabela = regra['tabela']
-                if tabela == 'banco_pf.pf_contratos_clt': tabela = 'banco_pf.pf_matricula_dados_clt'
-                
-                coluna = regra['coluna']
-                op = regra['operador']
-                val_raw = regra['valor']
-                tipo = regra.get('tipo', 'texto')
-                
-                col_sql = f"{coluna}"
-                if coluna == 'virtual_idade':
-                    col_sql = "EXTRACT(YEAR FROM AGE(d.data_nascimento))"
+def _condicao_regra(regra):
+    """Traduz uma regra em (sql, params); sql None quando a regra não tem valor para filtrar."""
+    coluna = regra['coluna']
+    op = regra['operador']
+    val_raw = regra['valor']
+    tipo = regra.get('tipo', 'texto')
+    
+    col_sql = f"{coluna}"
+    if coluna == 'virtual_idade':
+        col_sql = "EXTRACT(YEAR FROM AGE(d.data_nascimento))"
 
-                if op == "∅" or op == "Vazio": 
-                    conditions.append(f"({col_sql} IS NULL OR {col_sql}::TEXT = '')"); continue
-                if val_raw is None or str(val_raw).strip() == "": continue
-                
-                valores = [v.strip() for v in str(val_raw).split(',') if v.strip()]
-                conds_or = []
-                for val in valores:
-                    if 'cpf' in coluna or 'cnpj' in coluna: val = pf_core.limpar_normalizar_cpf(val)
-                    if tipo == 'numero': val = re.sub(r'\D', '', val)
-
-                    if tipo == 'data':
-                        if op == "=": conds_or.append(f"{col_sql} = %s"); params.append(val)
-                        elif op == "≥" or op == "A Partir": conds_or.append(f"{col_sql} >= %s"); params.append(val)
-                        elif op == "≤" or op == "Até": conds_or.append(f"{col_sql} <= %s"); params.append(val)
-                        elif op == "≠": conds_or.append(f"{col_sql} <> %s"); params.append(val)
-                        continue 
-
-                    if op == "=>" or op == "Começa com": conds_or.append(f"{col_sql} ILIKE %s"); params.append(f"{val}%")
-                    elif op == "<=>" or op == "Contém": conds_or.append(f"{col_sql} ILIKE %s"); params.append(f"%{val}%")
-                    elif op == "=" or op == "Igual": 
-                        if tipo == 'numero': conds_or.append(f"{col_sql} = %s"); params.append(val)
-                        else: conds_or.append(f"{col_sql} ILIKE %s"); params.append(val)
-                    elif op == "≠" or op == "Diferente": conds_or.append(f"{col_sql} <> %s"); params.append(val)
-                    elif op == "<≠>" or op == "Não Contém": conds_or.append(f"{col_sql} NOT ILIKE %s"); params.append(f"%{val}%")
-                    elif op in [">", "<", "≥", "≤"]:
-                        sym = {">":">", "<":"<", "≥":">=", "≤":"<="}[op]
-                        conds_or.append(f"{col_sql} {sym} %s"); params.append(val)
-                
-                if conds_or: conditions.append(f"({' OR '.join(conds_or)})")
+    if op == "∅" or op == "Vazio": 
+        return f"({col_sql} IS NULL OR {col_sql}::TEXT = '')", []
+    if val_raw is None or str(val_raw).strip() == "": return None, []
+    
+    valores = [v.strip() for v in str(val_raw).split(',') if v.strip()]
+    conds_or = []
+    params = []
+    for val in valores:
+        if 'cpf' in coluna or 'cnpj' in coluna: val = pf_core.limpar_normalizar_cpf(val)
+        if tipo == 'numero': val = re.sub(r'\D', '', val)
+
+        if tipo == 'data':
+            if op == "=": conds_or.append(f"{col_sql} = %s"); params.append(val)
+            elif op == "≥" or op == "A Partir": conds_or.append(f"{col_sql} >= %s"); params.append(val)
+            elif op == "≤" or op == "Até": conds_or.append(f"{col_sql} <= %s"); params.append(val)
+            elif op == "≠": conds_or.append(f"{col_sql} <> %s"); params.append(val)
+            continue 
+
+        if op == "=>" or op == "Começa com": conds_or.append(f"{col_sql} ILIKE %s"); params.append(f"{val}%")
+        elif op == "<=>" or op == "Contém": conds_or.append(f"{col_sql} ILIKE %s"); params.append(f"%{val}%")
+        elif op == "=" or op == "Igual": 
+            if tipo == 'numero': conds_or.append(f"{col_sql} = %s"); params.append(val)
+            else: conds_or.append(f"{col_sql} ILIKE %s"); params.append(val)
+        elif op == "≠" or op == "Diferente": conds_or.append(f"{col_sql} <> %s"); params.append(val)
+        elif op == "<≠>" or op == "Não Contém": conds_or.append(f"{col_sql} NOT ILIKE %s"); params.append(f"%{val}%")
+        elif op in [">", "<", "≥", "≤"]:
+            sym = {">":">", "<":"<", "≥":">=", "≤":"<="}[op]
+            conds_or.append(f"{col_sql} {sym} %s"); params.append(val)
+    
+    if not conds_or: return None, []
+    return f"({' OR '.join(conds_or)})", params
+
+def _montar_exists(tabela, conds_por_tabela, filhos):
+    """EXISTS de uma tabela satélite com todas as suas regras (mesma linha) e os EXISTS dependentes."""
+    alias, correlacao, _ = TABELAS_SATELITE[tabela]
+    partes = [correlacao]
+    params = []
+    for sql, p in conds_por_tabela.get(tabela, []):
+        partes.append(sql); params.extend(p)
+    for filho in filhos.get(tabela, []):
+        sql_filho, p_filho = _montar_exists(filho, conds_por_tabela, filhos)
+        partes.append(sql_filho); params.extend(p_filho)
+    return f"EXISTS (SELECT 1 FROM {tabela} {alias} WHERE {' AND '.join(partes)})", params
+
+def compilar_filtro_campanha(regras_ativas):
+    """
+    Compila as regras da campanha num WHERE sobre banco_pf.pf_dados d.
+    Cada tabela satélite vira um único EXISTS (semi-join) com as regras dela, então
+    não há multiplicação de linhas e nem DISTINCT. Retorna (sql_where, params).
+    """
+    conds_dados = []
+    conds_por_tabela = {}
+    tabelas_necessarias = set()
+
+    for regra in regras_ativas:
+        tabela = _normalizar_tabela_regra(regra['tabela'])
+        sql, params = _condicao_regra(regra)
+        if tabela in TABELAS_SATELITE:
+            # A tabela entra mesmo sem valor na regra (mantém o comportamento do antigo INNER JOIN)
+            tabelas_necessarias.add(tabela)
+            if sql: conds_por_tabela.setdefault(tabela, []).append((sql, params))
+        elif sql:
+            conds_dados.append((sql, params))
+
+    filhos = {}
+    for tabela in list(tabelas_necessarias):
+        pai = TABELAS_SATELITE[tabela][2]
+        if pai:
+            tabelas_necessarias.add(pai)
+            filhos.setdefault(pai, []).append(tabela)
+    for lista in filhos.values(): lista.sort()
+
+    conditions = []
+    params = []
+    for sql, p in conds_dados:
+        conditions.append(sql); params.extend(p)
+    for tabela in sorted(tabelas_necessarias):
+        if TABELAS_SATELITE[tabela][2]: continue
+        sql, p = _montar_exists(tabela, conds_por_tabela, filhos)
+        conditions.append(sql); params.extend(p)
+
+    sql_where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return sql_where, params
 
-            full_joins = " ".join(active_joins)
-            sql_where = " WHERE " + " AND ".join(conditions) if conditions else ""
+def executar_pesquisa_campanha_interna(regras_ativas, pagina=1, itens_por_pagina=50):
+    conn = pf_core.get_conn()
+    if conn:
+        try:
+            sql_where, params = compilar_filtro_campanha(regras_ativas)
+            sql_from = "FROM banco_pf.pf_dados d"
             
-            count_sql = f"SELECT COUNT(DISTINCT d.id) {sql_from} {full_joins} {sql_where}"
             cur = conn.cursor()
-            cur.execute(count_sql, tuple(params))
+            cur.execute(f"SELECT COUNT(*) {sql_from} {sql_where}", tuple(params))
             total = cur.fetchone()[0]
             
             offset = (pagina - 1) * itens_por_pagina
-            query = f"{sql_select} {sql_from} {full_joins} {sql_where} ORDER BY d.nome LIMIT {itens_por_pagina} OFFSET {offset}"
+            query = f"SELECT d.id, d.nome, d.cpf, d.data_nascimento {sql_from} {sql_where} ORDER BY d.nome LIMIT {itens_por_pagina} OFFSET {offset}"
             df = pd.read_sql(query, conn, params=tuple(params))
             conn.close()
             return df.fillna(""), total
@@ -144,6 +174,182 @@ def executar_pesquisa_campanha_interna(regras_ativas, pagina=1, itens_por_pagina
             
     return pd.DataFrame(), 0
 
+# =============================================================================
+# 1.1 SNAPSHOT DO PÚBLICO (MATERIALIZADO POR CAMPANHA)
+# =============================================================================
+
+# CPFs alterados por importações posteriores à última atualização do snapshot
+SQL_CPFS_TOCADOS_IMPORTACAO = """
+    SELECT cpf FROM banco_pf.pf_telefones WHERE importacao_id > %(ult)s
+    UNION SELECT cpf FROM banco_pf.pf_emails WHERE importacao_id > %(ult)s
+    UNION SELECT cpf FROM banco_pf.pf_enderecos WHERE importacao_id > %(ult)s
+    UNION SELECT cpf FROM banco_pf.pf_emprego_renda WHERE importacao_id > %(ult)s
+    UNION SELECT emp.cpf FROM banco_pf.pf_contratos ctr
+          JOIN banco_pf.pf_emprego_renda emp ON emp.matricula = ctr.matricula_ref
+          WHERE ctr.importacao_id > %(ult)s
+    UNION SELECT emp.cpf FROM banco_pf.pf_matricula_dados_clt clt
+          JOIN banco_pf.pf_emprego_renda emp ON emp.matricula = clt.matricula
+          WHERE clt.importacao_id > %(ult)s
+    UNION SELECT cpf FROM banco_pf.pf_dados
+          WHERE (regexp_match(importacao_id, '(\\d+)\\s*$'))[1]::BIGINT > %(ult)s
+"""
+
+# Marca d'água do snapshot: nunca passa de uma importação em andamento (qtd_novos NULL
+# até os dados serem gravados), senão os CPFs dela ficariam de fora do incremental.
+# Linha em andamento há mais de HORAS_IMPORTACAO_ABANDONADA é importação que caiu no meio.
+SQL_ULTIMA_IMPORTACAO_CONCLUIDA = """
+    SELECT COALESCE(
+        (SELECT MIN(id) - 1 FROM banco_pf.pf_historico_importacoes
+         WHERE qtd_novos IS NULL AND data_importacao > NOW() - %(horas)s * INTERVAL '1 hour'),
+        (SELECT MAX(id) FROM banco_pf.pf_historico_importacoes),
+        0)
+"""
+HORAS_IMPORTACAO_ABANDONADA = 6
+# Idade máxima do snapshot antes de um recálculo completo
+HORAS_SNAPSHOT_COMPLETO = 24
+
+def _criar_tabelas_snapshot(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS banco_pf.pf_campanhas_publico (
+            id_campanha INTEGER NOT NULL, cpf VARCHAR(20) NOT NULL, nome VARCHAR(255),
+            PRIMARY KEY (id_campanha, cpf)
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_pf_campanhas_publico_nome ON banco_pf.pf_campanhas_publico (id_campanha, nome, cpf)")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS banco_pf.pf_campanhas_membros (
+            id_campanha INTEGER NOT NULL, cpf VARCHAR(20) NOT NULL,
+            data_vinculo TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id_campanha, cpf)
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_pf_campanhas_membros_cpf ON banco_pf.pf_campanhas_membros (cpf)")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS banco_pf.pf_campanhas_snapshot (
+            id_campanha INTEGER PRIMARY KEY, filtros_hash VARCHAR(64), ultima_importacao_id BIGINT,
+            total INTEGER, data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def _hash_filtros(regras):
+    chaves = [{k: r.get(k) for k in ('tabela', 'coluna', 'operador', 'valor', 'tipo')} for r in regras]
+    return hashlib.sha256(json.dumps(chaves, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def atualizar_snapshot_campanha(id_campanha, regras_ativas, forcar_completo=False):
+    """
+    Materializa o público da campanha em pf_campanhas_publico.
+    Se as regras não mudaram, reavalia só os CPFs tocados por importações novas.
+    Retorna (total, modo) com modo 'completo', 'incremental' ou 'atual'.
+    """
+    conn = pf_core.get_conn()
+    if not conn: return 0, None
+    try:
+        id_campanha = int(id_campanha)
+        cur = conn.cursor()
+        _criar_tabelas_snapshot(cur)
+
+        filtros_hash = _hash_filtros(regras_ativas)
+        sql_where, params = compilar_filtro_campanha(regras_ativas)
+        sql_where = sql_where or " WHERE TRUE"
+
+        # Lido antes de avaliar as regras: importações concorrentes entram no próximo refresh
+        cur.execute(SQL_ULTIMA_IMPORTACAO_CONCLUIDA, {'horas': HORAS_IMPORTACAO_ABANDONADA})
+        ult_importacao = cur.fetchone()[0]
+
+        cur.execute(f"""
+            SELECT filtros_hash, ultima_importacao_id,
+                   data_atualizacao < NOW() - INTERVAL '{int(HORAS_SNAPSHOT_COMPLETO)} hours'
+            FROM banco_pf.pf_campanhas_snapshot WHERE id_campanha = %s FOR UPDATE
+        """, (id_campanha,))
+        meta = cur.fetchone()
+
+        # Exclusões nas satélites não deixam rastro de importacao_id: o snapshot vencido é refeito inteiro
+        if forcar_completo or not meta or meta[0] != filtros_hash or meta[2]:
+            modo = 'completo'
+            cur.execute("DELETE FROM banco_pf.pf_campanhas_publico WHERE id_campanha = %s", (id_campanha,))
+            cur.execute(f"""
+                INSERT INTO banco_pf.pf_campanhas_publico (id_campanha, cpf, nome)
+                SELECT %s, d.cpf, d.nome FROM banco_pf.pf_dados d {sql_where}
+                ON CONFLICT DO NOTHING
+            """, tuple([id_campanha] + params))
+        elif (meta[1] or 0) < ult_importacao:
+            modo = 'incremental'
+            cur.execute(f"CREATE TEMP TABLE tmp_cpfs_tocados ON COMMIT DROP AS {SQL_CPFS_TOCADOS_IMPORTACAO}", {'ult': meta[1] or 0})
+            cur.execute("""
+                DELETE FROM banco_pf.pf_campanhas_publico p USING tmp_cpfs_tocados t
+                WHERE p.id_campanha = %s AND p.cpf = t.cpf
+            """, (id_campanha,))
+            cur.execute(f"""
+                INSERT INTO banco_pf.pf_campanhas_publico (id_campanha, cpf, nome)
+                SELECT %s, d.cpf, d.nome FROM banco_pf.pf_dados d {sql_where}
+                AND d.cpf IN (SELECT cpf FROM tmp_cpfs_tocados)
+                ON CONFLICT DO NOTHING
+            """, tuple([id_campanha] + params))
+        else:
+            modo = 'atual'
+
+        if modo != 'atual':
+            cur.execute("SELECT COUNT(*) FROM banco_pf.pf_campanhas_publico WHERE id_campanha = %s", (id_campanha,))
+            total = cur.fetchone()[0]
+            cur.execute("""
+                INSERT INTO banco_pf.pf_campanhas_snapshot (id_campanha, filtros_hash, ultima_importacao_id, total, data_atualizacao)
+                VALUES (%s, %s, %s, %s, NOW())
+                ON CONFLICT (id_campanha) DO UPDATE SET filtros_hash = EXCLUDED.filtros_hash,
+                    ultima_importacao_id = EXCLUDED.ultima_importacao_id, total = EXCLUDED.total, data_atualizacao = NOW()
+            """, (id_campanha, filtros_hash, ult_importacao, total))
+        else:
+            cur.execute("SELECT total FROM banco_pf.pf_campanhas_snapshot WHERE id_campanha = %s", (id_campanha,))
+            total = cur.fetchone()[0]
+
+        conn.commit(); conn.close()
+        return total, modo
+    except Exception as e:
+        st.error(f"Erro ao atualizar público da campanha: {e}")
+        conn.rollback(); conn.close()
+        return 0, None
+
+def listar_publico_campanha(id_campanha, pagina=1, itens_por_pagina=50):
+    """Página do snapshot (índice id_campanha, nome, cpf); CPFs excluídos da base somem pelo JOIN."""
+    conn = pf_core.get_conn()
+    if not conn: return pd.DataFrame()
+    try:
+        offset = (pagina - 1) * itens_por_pagina
+        df = pd.read_sql("""
+            SELECT d.id, d.nome, d.cpf, d.data_nascimento
+            FROM banco_pf.pf_campanhas_publico p
+            JOIN banco_pf.pf_dados d ON d.cpf = p.cpf
+            WHERE p.id_campanha = %s
+            ORDER BY p.nome, p.cpf LIMIT %s OFFSET %s
+        """, conn, params=(int(id_campanha), itens_por_pagina, offset))
+        conn.close()
+        return df.fillna("")
+    except Exception as e:
+        st.error(f"Erro ao listar público: {e}")
+        conn.close()
+        return pd.DataFrame()
+
+def exportar_publico_campanha_csv(id_campanha):
+    """CSV do público completo, gerado direto do snapshot via COPY."""
+    conn = pf_core.get_conn()
+    if not conn: return None
+    try:
+        cur = conn.cursor()
+        buffer = io.StringIO()
+        sql = cur.mogrify("""
+            SELECT d.id, d.nome, d.cpf, d.data_nascimento
+            FROM banco_pf.pf_campanhas_publico p
+            JOIN banco_pf.pf_dados d ON d.cpf = p.cpf
+            WHERE p.id_campanha = %s
+            ORDER BY p.nome, p.cpf
+        """, (int(id_campanha),)).decode('utf-8')
+        cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH CSV HEADER DELIMITER ';'", buffer)
+        conn.close()
+        return buffer.getvalue().encode('utf-8-sig')
+    except Exception as e:
+        st.error(f"Erro ao exportar público: {e}")
+        conn.close()
+        return None
+
 # =============================================================================
 # 2. FUNÇÕES DE BANCO DE DADOS (CRUD CAMPANHA)
 # =============================================================================
@@ -215,6 +421,56 @@ def vincular_campanha_aos_clientes(id_campanha, nome_campanha, lista_ids_cliente
         except Exception as e: st.error(f"Erro ao vincular: {e}"); conn.close()
     return 0
 
+def aplicar_campanha_ao_publico(id_campanha, tamanho_lote=20000, progresso=None):
+    """
+    Vincula a campanha a todo o público materializado, direto no banco.
+    Percorre o snapshot pela chave (id_campanha, cpf) em lotes, com commit por lote:
+    grava a associação em pf_campanhas_membros (um cliente pode estar em várias campanhas)
+    e mantém pf_dados.id_campanha com a última campanha aplicada.
+    progresso(processados, total) é chamado a cada lote. Retorna o total de clientes vinculados.
+    """
+    conn = pf_core.get_conn()
+    if not conn: return 0
+    try:
+        id_campanha = int(id_campanha)
+        cur = conn.cursor()
+        _criar_tabelas_snapshot(cur)
+        cur.execute("SELECT total FROM banco_pf.pf_campanhas_snapshot WHERE id_campanha = %s", (id_campanha,))
+        res = cur.fetchone()
+        total = res[0] if res else 0
+        conn.commit()
+
+        ultimo_cpf, processados = '', 0
+        while True:
+            cur.execute("""
+                WITH lote AS (
+                    SELECT cpf FROM banco_pf.pf_campanhas_publico
+                    WHERE id_campanha = %(id)s AND cpf > %(ult)s
+                    ORDER BY cpf LIMIT %(lim)s
+                ), membros AS (
+                    INSERT INTO banco_pf.pf_campanhas_membros (id_campanha, cpf)
+                    SELECT %(id)s, cpf FROM lote
+                    ON CONFLICT (id_campanha, cpf) DO UPDATE SET data_vinculo = NOW()
+                ), dados AS (
+                    UPDATE banco_pf.pf_dados d SET id_campanha = %(id_txt)s
+                    FROM lote WHERE d.cpf = lote.cpf AND d.id_campanha IS DISTINCT FROM %(id_txt)s
+                )
+                SELECT MAX(cpf), COUNT(*) FROM lote
+            """, {'id': id_campanha, 'id_txt': str(id_campanha), 'ult': ultimo_cpf, 'lim': int(tamanho_lote)})
+            maior_cpf, qtd = cur.fetchone()
+            conn.commit()
+            if not qtd: break
+            ultimo_cpf, processados = maior_cpf, processados + qtd
+            if progresso: progresso(processados, total)
+            if qtd < tamanho_lote: break
+
+        conn.close()
+        return processados
+    except Exception as e:
+        st.error(f"Erro ao vincular público: {e}")
+        conn.rollback(); conn.close()
+        return 0
+
 # =============================================================================
 # 3. DIALOGS (POP-UPS)
 # =============================================================================
@@ -433,20 +689,31 @@ def app_campanhas(key_sufix="default"):
             cd1, cd2, cd3 = st.columns([1.5, 1.5, 3])
             data_ref = cd2.date_input("Data Referência", value=date.today(), min_value=date(1900, 1, 1), max_value=date(2050, 12, 31), format="DD/MM/YYYY", key=f"dt_ref_{key_sufix}")
 
-            if st.button("🔎 VISUALIZAR PÚBLICO ALVO", type="primary", use_container_width=True, key=f"btn_see_target_{key_sufix}"):
+            cb1, cb2 = st.columns([3, 1])
+            visualizar = cb1.button("🔎 VISUALIZAR PÚBLICO ALVO", type="primary", use_container_width=True, key=f"btn_see_target_{key_sufix}")
+            recalcular = cb2.button("🔄 Recalcular público", use_container_width=True, key=f"btn_recalc_target_{key_sufix}", help="Refaz o público inteiro (ignora o incremental)")
+            if visualizar or recalcular:
                 todos_filtros = filtros_db + st.session_state['filtros_extras']
                 with st.spinner("Analisando base de dados..."):
-                    df_res, total = executar_pesquisa_campanha_interna(todos_filtros, pagina=st.session_state['pag_campanha'], itens_por_pagina=50)
-                st.session_state['resultado_campanha_df'] = df_res
-                st.session_state['resultado_campanha_total'] = total
-
-            if 'resultado_campanha_df' in st.session_state and st.session_state['resultado_campanha_df'] is not None:
-                df_r = st.session_state['resultado_campanha_df']
+                    total, modo = atualizar_snapshot_campanha(campanha['id'], todos_filtros, forcar_completo=recalcular)
+                if modo:
+                    st.session_state['pag_campanha'] = 1
+                    st.session_state['resultado_campanha_id'] = int(campanha['id'])
+                    st.session_state['resultado_campanha_total'] = total
+                    st.session_state.pop('resultado_campanha_csv', None)
+                    if modo == 'incremental': st.toast("Público atualizado com as importações novas.")
+
+            if st.session_state.get('resultado_campanha_id') == int(campanha['id']):
                 tot = st.session_state['resultado_campanha_total']
+                df_r = listar_publico_campanha(campanha['id'], pagina=st.session_state['pag_campanha'], itens_por_pagina=50)
+                st.session_state['resultado_campanha_df'] = df_r
                 
                 st.markdown(f"### Resultados: {tot} encontrados")
-                csv = df_r.to_csv(index=False, sep=';', encoding='utf-8-sig')
-                st.download_button("⬇️ Exportar CSV", data=csv, file_name="campanha_resultado.csv", mime="text/csv", key=f"dl_csv_{key_sufix}")
+                if st.button("📦 Preparar CSV do público completo", key=f"prep_csv_{key_sufix}"):
+                    with st.spinner("Gerando arquivo..."):
+                        st.session_state['resultado_campanha_csv'] = exportar_publico_campanha_csv(campanha['id'])
+                if st.session_state.get('resultado_campanha_csv'):
+                    st.download_button("⬇️ Exportar CSV", data=st.session_state['resultado_campanha_csv'], file_name="campanha_resultado.csv", mime="text/csv", key=f"dl_csv_{key_sufix}")
                 
                 if not df_r.empty:
                     st.markdown("""<div style="background-color: #f0f0f0; padding: 8px; font-weight: bold; display: flex;"><div style="flex: 1;">Ações</div><div style="flex: 1;">ID</div><div style="flex: 2;">CPF</div><div style="flex: 4;">Nome</div></div>""", unsafe_allow_html=True)
@@ -472,11 +739,15 @@ def app_campanhas(key_sufix="default"):
                 st.divider()
                 st.info(f"Ao confirmar abaixo, o ID da campanha **{campanha['id']}** será aplicado no cadastro desses clientes.")
                 if st.button(f"✅ CONFIRMAR VÍNCULO ({tot} CLIENTES)", key=f"conf_vinc_{key_sufix}"):
-                    ids = df_r['id'].tolist()
-                    if ids:
-                        qtd = vincular_campanha_aos_clientes(campanha['id'], campanha['nome_campanha'], ids)
+                    if tot:
+                        barra = st.progress(0, text="Vinculando clientes...")
+                        qtd = aplicar_campanha_ao_publico(
+                            campanha['id'],
+                            progresso=lambda feitos, total: barra.progress(min(feitos / max(total, 1), 1.0), text=f"Vinculando clientes... {feitos}/{total}")
+                        )
+                        barra.empty()
                         st.balloons()
                         st.success(f"{qtd} clientes atualizados com a campanha '{campanha['nome_campanha']}'.")
-                        st.session_state['resultado_campanha_df'] = None
+                        st.session_state['resultado_campanha_id'] = None
                     else:
                         st.error("Lista vazia.")
\ No newline at end of file
@@ -5,6 +5,7 @@ import psycopg2
 import re
 from datetime import date, datetime
 import modulo_pf_cadastro as pf_core
+import modulo_catalogo as catalogo
 
 # =============================================================================
 # MAPEAMENTO DE TABELAS BRUTAS (Chave -> Tabela SQL)
@@ -300,12 +301,10 @@ def _motor_clt_matricula(conn, lista_cpfs):
 
 def _motor_tabela_bruta(conn, tabela_sql, lista_cpfs):
     try:
-        cur = conn.cursor()
         if '.' in tabela_sql: schema, table = tabela_sql.split('.')
         else: schema, table = 'public', tabela_sql
             
-        cur.execute("SELECT column_name FROM information_schema.columns WHERE table_schema = %s AND table_name = %s ORDER BY ordinal_position", (schema, table))
-        colunas = [r[0] for r in cur.fetchall()]
+        colunas = catalogo.listar_colunas(table, schema)
         if not colunas: return pd.DataFrame()
 
         cols_str = ", ".join(colunas)
@@ -6,6 +6,7 @@ import re
 import openpyxl
 from datetime import datetime
 import modulo_pf_cadastro as pf_core
+import modulo_catalogo as catalogo
 
 # --- CONFIGURAÇÕES DE DIRETÓRIO ---
 BASE_DIR_IMPORTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ARQUIVO IMPORTAÇÕES")
@@ -13,16 +14,7 @@ if not os.path.exists(BASE_DIR_IMPORTS):
     os.makedirs(BASE_DIR_IMPORTS)
 
 def get_table_columns(table_name):
-    conn = pf_core.get_conn()
-    cols = []
-    if conn:
-        try:
-            cur = conn.cursor()
-            cur.execute(f"SELECT column_name, data_type FROM information_schema.columns WHERE table_name = '{table_name}' AND table_schema = 'banco_pf'")
-            cols = cur.fetchall()
-            conn.close()
-        except: pass
-    return cols
+    return catalogo.listar_colunas_tipos(table_name, 'banco_pf')
 
 def validar_planilha_estrita(caminho_arquivo):
     """
@@ -327,9 +319,11 @@ def interface_importacao():
             conn = pf_core.get_conn()
             if conn:
                 with st.spinner("Processando dados..."):
+                    imp_id = None
                     try:
                         cur = conn.cursor()
-                        cur.execute("INSERT INTO banco_pf.pf_historico_importacoes (nome_arquivo) VALUES (%s) RETURNING id", (st.session_state['uploaded_file_name'],))
+                        # qtd_novos fica NULL enquanto os dados não são gravados (importação em andamento)
+                        cur.execute("INSERT INTO banco_pf.pf_historico_importacoes (nome_arquivo, qtd_novos) VALUES (%s, NULL) RETURNING id", (st.session_state['uploaded_file_name'],))
                         imp_id = cur.fetchone()[0]; conn.commit()
                         mapping = {k: v for k, v in st.session_state['csv_map'].items() if v and v != "IGNORAR"}
                         res = processar_importacao_lote(conn, df, tbl, mapping, imp_id, st.session_state['uploaded_file_path'])
@@ -337,7 +331,13 @@ def interface_importacao():
                         cur.execute("UPDATE banco_pf.pf_historico_importacoes SET qtd_novos=%s, qtd_atualizados=%s WHERE id=%s", (res[0], res[1], imp_id))
                         conn.commit(); conn.close()
                         st.session_state['import_stats'] = res; st.session_state['import_step'] = 3; st.rerun()
-                    except Exception as e: st.error(f"Erro: {e}")
+                    except Exception as e:
+                        st.error(f"Erro: {e}")
+                        # Fecha a linha do histórico: em andamento ela seguraria a marca d'água das campanhas
+                        try:
+                            conn.rollback()
+                            if imp_id: cur.execute("UPDATE banco_pf.pf_historico_importacoes SET qtd_novos=0, qtd_atualizados=0 WHERE id=%s", (imp_id,)); conn.commit()
+                        except Exception: pass
     elif st.session_state['import_step'] == 3:
         st.balloons(); st.success("✅ Importação Concluída!")
         res = st.session_state.get('import_stats', (0,0,[]))
@@ -2,7 +2,6 @@ import streamlit as st
 import pandas as pd
 import psycopg2
 from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError
 import sys
 import os
 
@@ -18,6 +17,9 @@ except ImportError:
         st.error("Arquivo 'conexao.py' não encontrado. Verifique a configuração.")
         conexao = None
 
+import modulo_catalogo as catalogo
+import modulo_salvamento_incremental as salvamento
+
 # --- CONFIGURAÇÕES ---
 # Lista de schemas permitidos para visualização/edição (Foco no banco_pf)
 SCHEMAS_PERMITIDOS = ['banco_pf', 'public']
@@ -31,66 +33,156 @@ def obter_lista_completa_tabelas(schemas):
     """
     Busca todas as tabelas dos schemas permitidos e retorna uma lista de tuplas (schema, tabela).
     """
-    if not conexao: return []
-    
+    return [(schema, tabela) for schema in sorted(schemas) for tabela in catalogo.listar_tabelas(schema, apenas_base=True)]
+
+@st.cache_resource
+def get_engine():
+    """Engine (com pool) única por processo; antes era criada a cada leitura."""
+    url = get_db_url()
+    return create_engine(url, pool_pre_ping=True, pool_size=5, max_overflow=5) if url else None
+
+# --- GRADE PAGINADA NO SERVIDOR ---
+# Cada página é um SELECT das colunas escolhidas com LIMIT, paginado por keyset:
+# ordena por (coluna de ordenação, PK) e a próxima página começa depois da
+# última linha da anterior, então abrir a página N custa o mesmo que a página 1.
+# Tabelas sem PK caem no OFFSET.
+
+TAMANHO_PAGINA = 100
+LIMITE_CONTAGEM = 100000
+TIPOS_NUMERICOS = ('smallint', 'integer', 'bigint', 'numeric', 'real', 'double precision')
+
+def _ident(nome):
+    return '"' + nome.replace('"', '""') + '"'
+
+def _valor_python(valor):
+    if isinstance(valor, pd.Timestamp): return valor.to_pydatetime()
     try:
-        conn = psycopg2.connect(
-            host=conexao.host, port=conexao.port, database=conexao.database,
-            user=conexao.user, password=conexao.password
-        )
-        cursor = conn.cursor()
-        
-        # Formata a lista para o SQL
-        schemas_str = "', '".join(schemas)
-        query = f"""
-            SELECT table_schema, table_name 
-            FROM information_schema.tables 
-            WHERE table_schema IN ('{schemas_str}')
-            AND table_type = 'BASE TABLE'
-            ORDER BY table_schema, table_name;
-        """
-        
-        cursor.execute(query)
-        resultados = cursor.fetchall() 
-        conn.close()
-        
-        return resultados
-    except Exception as e:
-        st.error(f"Erro ao buscar lista de tabelas: {e}")
-        return []
+        if pd.isna(valor): return None
+    except (TypeError, ValueError): pass
+    return valor.item() if hasattr(valor, 'item') else valor
+
+def _montar_filtro(tipos, filtro_col, filtro_val, params):
+    if not filtro_col or filtro_val in (None, '') or filtro_col not in tipos: return []
+    valor = str(filtro_val).strip()
+    if tipos[filtro_col] in TIPOS_NUMERICOS and valor.lstrip('-').replace('.', '', 1).isdigit():
+        params['filtro'] = valor
+        return [f"{_ident(filtro_col)} = CAST(:filtro AS {tipos[filtro_col]})"]
+    params['filtro'] = f"%{valor}%"
+    return [f"{_ident(filtro_col)}::text ILIKE :filtro"]
+
+def carregar_dados(schema, tabela, colunas=None, filtro_col=None, filtro_val=None, ordem_col=None,
+                   decrescente=False, tamanho_pagina=TAMANHO_PAGINA, cursor=None, pagina=1):
+    """
+    Lê uma página da tabela. Retorna (df, proximo_cursor).
+    colunas: projeção (a PK é sempre incluída, o salvamento depende dela).
+    cursor: o proximo_cursor da página anterior (None = primeira página).
+    Sem PK, pagina/OFFSET são usados no lugar do cursor.
+    """
+    engine = get_engine()
+    if engine is None: return None, None
+    tipos = dict(catalogo.listar_colunas_tipos(tabela, schema))
+    pk = catalogo.listar_chave_primaria(tabela, schema)
+
+    selecionadas = [c for c in (colunas or list(tipos)) if c in tipos]
+    selecionadas = pk + [c for c in selecionadas if c not in pk]
+    if ordem_col not in tipos or ordem_col in pk: ordem_col = None
+
+    params = {'limite': tamanho_pagina}
+    condicoes = _montar_filtro(tipos, filtro_col, filtro_val, params)
+    direcao = "DESC" if decrescente else "ASC"
+
+    if pk:
+        chave = ", ".join(_ident(c) for c in pk)
+        ordem = [f"{_ident(ordem_col)} {direcao} NULLS LAST"] if ordem_col else []
+        ordem += [f"{_ident(c)} {direcao if not ordem_col else 'ASC'}" for c in pk]
+        if cursor is not None:
+            for i, v in enumerate(cursor['pk']): params[f"pk{i}"] = v
+            ref_pk = ", ".join(f":pk{i}" for i in range(len(pk)))
+            apos_pk = f"({chave}) {'<' if decrescente and not ordem_col else '>'} ({ref_pk})"
+            if not ordem_col:
+                condicoes.append(apos_pk)
+            elif cursor['ordem'] is None:
+                # Já estamos no bloco dos NULLs (que vem por último)
+                condicoes.append(f"{_ident(ordem_col)} IS NULL AND {apos_pk}")
+            else:
+                params['ordem'] = cursor['ordem']
+                col = _ident(ordem_col)
+                condicoes.append(f"({col} {'<' if decrescente else '>'} :ordem OR ({col} = :ordem AND {apos_pk}) OR {col} IS NULL)")
+        offset = ""
+    else:
+        ordem = [f"{_ident(ordem_col)} {direcao} NULLS LAST" if ordem_col else "1 ASC"]
+        params['offset'] = (pagina - 1) * tamanho_pagina
+        offset = " OFFSET :offset"
 
-def carregar_dados(schema, tabela):
-    """Lê os dados da tabela para um DataFrame"""
+    where = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    query = (f"SELECT {', '.join(_ident(c) for c in selecionadas)} FROM {_ident(schema)}.{_ident(tabela)}"
+             f"{where} ORDER BY {', '.join(ordem)} LIMIT :limite{offset}")
     try:
-        engine = create_engine(get_db_url())
-        query = f'SELECT * FROM "{schema}"."{tabela}" ORDER BY 1 ASC' # Ordena pela primeira coluna (geralmente ID)
-        df = pd.read_sql(query, engine)
-        return df
+        with engine.connect() as conn:
+            df = pd.read_sql(text(query), conn, params=params)
     except Exception as e:
         st.error(f"Erro ao ler tabela: {e}")
-        return None
+        return None, None
 
-def salvar_alteracoes(df, schema, tabela):
+    proximo = None
+    if pk and len(df) == tamanho_pagina:
+        ultima = df.iloc[-1]
+        proximo = {'pk': [_valor_python(ultima[c]) for c in pk],
+                   'ordem': _valor_python(ultima[ordem_col]) if ordem_col else None}
+    elif not pk and len(df) == tamanho_pagina:
+        proximo = {'pagina': pagina + 1}
+    return df, proximo
+
+@st.cache_data(ttl=60, show_spinner=False)
+def contar_registros(schema, tabela, filtro_col=None, filtro_val=None):
     """
-    Substitui a tabela inteira pelos dados novos (Truncate + Insert).
-    Atenção: Isso reinicia a tabela com os dados do DataFrame.
+    Total para a legenda da grade. Sem filtro usa a estimativa do planner (pg_class.reltuples),
+    que é instantânea; com filtro conta até LIMITE_CONTAGEM. Retorna (total, aproximado).
     """
+    engine = get_engine()
+    if engine is None: return 0, False
+    tipos = dict(catalogo.listar_colunas_tipos(tabela, schema))
+    params = {}
+    condicoes = _montar_filtro(tipos, filtro_col, filtro_val, params)
     try:
-        engine = create_engine(get_db_url())
-        with engine.begin() as conn:
-            # 1. Truncate (Limpa a tabela mantendo a estrutura)
-            # RESTART IDENTITY reinicia os contadores de ID Serial
-            # CASCADE permite limpar mesmo se houver dependências (cuidado!)
-            conn.execute(text(f'TRUNCATE TABLE "{schema}"."{tabela}" RESTART IDENTITY CASCADE'))
-            
-            # 2. Insert (Insere os dados do DataFrame)
-            df.to_sql(tabela, conn, schema=schema, if_exists='append', index=False)
-            
-        return True, "Dados salvos com sucesso (Tabela substituída)!"
-    except SQLAlchemyError as e:
+        with engine.connect() as conn:
+            if not condicoes:
+                res = conn.execute(text("""
+                    SELECT c.reltuples::bigint FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+                    WHERE n.nspname = :schema AND c.relname = :tabela
+                """), {'schema': schema, 'tabela': tabela}).scalar()
+                if res is not None and res >= 0: return int(res), True
+            params['teto'] = LIMITE_CONTAGEM + 1
+            where = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+            total = conn.execute(text(f"SELECT count(*) FROM (SELECT 1 FROM {_ident(schema)}.{_ident(tabela)}{where} LIMIT :teto) t"), params).scalar()
+            return (LIMITE_CONTAGEM, True) if total > LIMITE_CONTAGEM else (int(total), False)
+    except Exception:
+        return 0, False
+
+def salvar_alteracoes(df, schema, tabela, df_original):
+    """
+    Grava só o que mudou em relação ao que foi carregado (inclusões, alterações e exclusões pela PK).
+    Não usa TRUNCATE: dependentes da tabela não são apagados em cascata.
+    """
+    try:
+        conn = psycopg2.connect(host=conexao.host, port=conexao.port, database=conexao.database, user=conexao.user, password=conexao.password)
+    except Exception as e:
+        return False, f"Erro de conexão: {str(e)}"
+    try:
+        resultado = salvamento.salvar_diff(conn, schema, tabela, df_original, df)
+        conn.commit()
+        return True, f"Dados salvos com sucesso: {salvamento.resumo_diff(resultado)}"
+    except ValueError as e:
+        conn.rollback()
+        return False, str(e)
+    except psycopg2.Error as e:
+        conn.rollback()
         return False, f"Erro de banco de dados: {str(e)}"
     except Exception as e:
+        conn.rollback()
         return False, f"Erro genérico: {str(e)}"
+    finally:
+        conn.close()
 
 # --- FUNÇÃO PRINCIPAL DO MÓDULO ---
 def app_config_planilhas():
@@ -146,35 +238,79 @@ def app_config_planilhas():
     # 5. Lógica de Edição
     if tabela_selecionada:
         schema_atual, nome_tabela_atual = tabela_selecionada.split('.')
-        
-        # Gerenciamento de estado para carregar dados apenas quando muda a tabela
-        if 'df_editor_pf' not in st.session_state or st.session_state.get('tabela_atual_pf') != tabela_selecionada:
+        colunas_tabela = catalogo.listar_colunas(nome_tabela_atual, schema_atual)
+        pk = catalogo.listar_chave_primaria(nome_tabela_atual, schema_atual)
+
+        # 5.1 Controles da grade (projeção, filtro e ordenação rodam no banco)
+        with st.expander("🔎 Colunas, Filtro e Ordenação", expanded=False):
+            colunas_sel = st.multiselect("Colunas exibidas", colunas_tabela, default=colunas_tabela, key=f"cols_pf_{tabela_selecionada}")
+            c_fcol, c_fval = st.columns([1, 2])
+            filtro_col = c_fcol.selectbox("Filtrar por coluna", ["(Sem Filtro)"] + colunas_tabela, key=f"fcol_pf_{tabela_selecionada}")
+            filtro_val = c_fval.text_input("Valor", key=f"fval_pf_{tabela_selecionada}")
+            c_ord, c_dir, c_tam = st.columns([2, 1, 1])
+            ordem_col = c_ord.selectbox("Ordenar por", ["(Chave primária)"] + [c for c in colunas_tabela if c not in pk], key=f"ord_pf_{tabela_selecionada}")
+            decrescente = c_dir.toggle("Decrescente", key=f"desc_pf_{tabela_selecionada}")
+            tamanho = c_tam.selectbox("Linhas/página", [50, 100, 250, 500], index=1, key=f"tam_pf_{tabela_selecionada}")
+
+        filtro_col = filtro_col if filtro_col != "(Sem Filtro)" and filtro_val else None
+        filtro_val = filtro_val if filtro_col else None
+        ordem_col = ordem_col if ordem_col != "(Chave primária)" else None
+        config = (tabela_selecionada, tuple(colunas_sel), filtro_col, filtro_val, ordem_col, decrescente, tamanho)
+
+        # Mudou tabela/filtro/ordem: volta para a primeira página
+        if st.session_state.get('config_grade_pf') != config:
+            st.session_state['config_grade_pf'] = config
+            st.session_state['cursores_pf'] = [None]
+            st.session_state.pop('df_base_pf', None)
+
+        cursores = st.session_state['cursores_pf']
+        pagina = len(cursores)
+        if 'df_base_pf' not in st.session_state:
             with st.spinner(f"Carregando {tabela_selecionada}..."):
-                st.session_state['df_base_pf'] = carregar_dados(schema_atual, nome_tabela_atual)
-                st.session_state['tabela_atual_pf'] = tabela_selecionada
+                df, proximo = carregar_dados(
+                    schema_atual, nome_tabela_atual, colunas_sel, filtro_col, filtro_val, ordem_col,
+                    decrescente, tamanho, cursor=cursores[-1], pagina=pagina)
+                st.session_state['df_base_pf'] = df
+                st.session_state['proximo_cursor_pf'] = proximo
                 # Limpa chave do editor para forçar recarregamento visual
                 if 'editor_tabelas_sql_pf' in st.session_state:
                     del st.session_state['editor_tabelas_sql_pf']
-        
+
         # USA CÓPIA PARA NÃO AFETAR REFERÊNCIA EM MEMÓRIA
         df_original = st.session_state.get('df_base_pf').copy() if st.session_state.get('df_base_pf') is not None else None
 
         if df_original is not None:
-            st.caption(f"Visualizando: **{len(df_original)}** registros.")
-            
+            total, aproximado = contar_registros(schema_atual, nome_tabela_atual, filtro_col, filtro_val)
+            st.caption(f"Página **{pagina}** · {len(df_original)} linhas exibidas de {'~' if aproximado else ''}{total:,} registros.".replace(",", "."))
+            if not pk:
+                st.info("Tabela sem chave primária: paginação por OFFSET e edição indisponível.")
+
             # Editor de Dados
             df_editado = st.data_editor(
                 df_original, 
                 use_container_width=True, 
                 num_rows="dynamic",
+                disabled=not pk,
                 key="editor_tabelas_sql_pf"
             )
 
+            # Paginação (keyset: guarda o cursor de início de cada página visitada)
+            c_prev, c_page, c_next = st.columns([1, 2, 1])
+            if c_prev.button("◀ Anterior", disabled=pagina == 1):
+                cursores.pop()
+                st.session_state.pop('df_base_pf', None)
+                st.rerun()
+            c_page.markdown(f"<div style='text-align: center'>Página <b>{pagina}</b></div>", unsafe_allow_html=True)
+            if c_next.button("Próxima ▶", disabled=st.session_state.get('proximo_cursor_pf') is None):
+                cursores.append(st.session_state['proximo_cursor_pf'])
+                st.session_state.pop('df_base_pf', None)
+                st.rerun()
+
             # Botão de Salvar
             st.markdown("---")
             col_save, col_info = st.columns([1, 4])
             with col_save:
-                if st.button("💾 Salvar Alterações", type="primary"):
+                if st.button("💾 Salvar Alterações", type="primary", disabled=not pk):
                     # LÓGICA DE COMPARAÇÃO ROBUSTA (Correção aplicada aqui)
                     # 1. Verifica se tamanhos são diferentes (Inclusão/Exclusão)
                     mudou_tamanho = df_editado.shape != df_original.shape
@@ -192,12 +328,13 @@ def app_config_planilhas():
                     if not mudou_tamanho and not mudou_conteudo:
                         st.warning("Nenhuma alteração detectada.")
                     else:
-                        with st.spinner("Substituindo dados da tabela..."):
-                            sucesso, msg = salvar_alteracoes(df_editado, schema_atual, nome_tabela_atual)
+                        with st.spinner("Gravando alterações..."):
+                            sucesso, msg = salvar_alteracoes(df_editado, schema_atual, nome_tabela_atual, df_original)
                             if sucesso:
                                 st.success(msg)
-                                # Atualiza o estado base com o novo dataframe
-                                st.session_state['df_base_pf'] = df_editado
+                                # Recarrega a página do banco para trazer ids/defaults das linhas novas
+                                st.session_state.pop('df_base_pf', None)
+                                contar_registros.clear()
                                 import time
                                 time.sleep(1) # Pequena pausa para visualização
                                 st.rerun()
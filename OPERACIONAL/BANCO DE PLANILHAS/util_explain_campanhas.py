@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.abspath(os.path.join(BASE_DIR, "..", ".."))
+for caminho in (BASE_DIR, RAIZ):
+    if caminho not in sys.path: sys.path.append(caminho)
+
+import modulo_pf_cadastro as pf_core
+import modulo_pf_campanhas as campanhas
+
+# =============================================================================
+# REGRESSÃO DO COMPILADOR DE REGRAS DAS CAMPANHAS (EXPLAIN)
+# Uso: python util_explain_campanhas.py [--cpfs 200000] [--manter]
+# Cria uma base sintética no schema bench_campanhas com as tabelas satélite de
+# banco_pf (vários telefones/e-mails/vínculos/contratos por CPF), compila
+# cenários de regras com compilar_filtro_campanha e confere, via EXPLAIN ANALYZE:
+#   - o SQL compilado não tem DISTINCT;
+#   - o COUNT(*) recebe exatamente uma linha por CPF (sem multiplicação);
+#   - o total bate com o da consulta antiga (JOINs + COUNT(DISTINCT d.id)).
+# Sai com código 1 se algum cenário falhar. O schema é apagado no final, a
+# menos que --manter seja usado.
+# =============================================================================
+
+SCHEMA = "bench_campanhas"
+
+CENARIOS = [
+    ("Só pf_dados", [
+        {'tabela': 'banco_pf.pf_dados', 'coluna': 'd.nome', 'operador': 'Começa com', 'valor': 'MARIA', 'tipo': 'texto'},
+    ]),
+    ("Telefone + e-mail", [
+        {'tabela': 'banco_pf.pf_telefones', 'coluna': 'tel.numero', 'operador': 'Começa com', 'valor': '319', 'tipo': 'texto'},
+        {'tabela': 'banco_pf.pf_emails', 'coluna': 'em.email', 'operador': 'Contém', 'valor': 'gmail', 'tipo': 'texto'},
+    ]),
+    ("Duas regras na mesma satélite", [
+        {'tabela': 'banco_pf.pf_enderecos', 'coluna': 'ende.uf', 'operador': 'Igual', 'valor': 'MG', 'tipo': 'texto'},
+        {'tabela': 'banco_pf.pf_enderecos', 'coluna': 'ende.cidade', 'operador': 'Começa com', 'valor': 'BELO', 'tipo': 'texto'},
+    ]),
+    ("Convênio + contrato + CLT", [
+        {'tabela': 'banco_pf.pf_emprego_renda', 'coluna': 'emp.convenio', 'operador': 'Igual', 'valor': 'INSS', 'tipo': 'texto'},
+        {'tabela': 'banco_pf.pf_contratos', 'coluna': 'ctr.valor_parcela', 'operador': '>', 'valor': '300', 'tipo': 'numero'},
+        {'tabela': 'banco_pf.pf_contratos_clt', 'coluna': 'clt.cnpj_nome', 'operador': 'Contém', 'valor': 'LTDA', 'tipo': 'texto'},
+    ]),
+    ("Tudo junto", [
+        {'tabela': 'banco_pf.pf_dados', 'coluna': 'virtual_idade', 'operador': '≥', 'valor': '40', 'tipo': 'numero'},
+        {'tabela': 'banco_pf.pf_telefones', 'coluna': 'tel.numero', 'operador': 'Começa com', 'valor': '3', 'tipo': 'texto'},
+        {'tabela': 'banco_pf.pf_emails', 'coluna': 'em.email', 'operador': 'Contém', 'valor': '@', 'tipo': 'texto'},
+        {'tabela': 'banco_pf.pf_enderecos', 'coluna': 'ende.uf', 'operador': 'Igual', 'valor': 'MG,SP', 'tipo': 'texto'},
+        {'tabela': 'banco_pf.pf_contratos', 'coluna': 'ctr.banco', 'operador': 'Igual', 'valor': '001', 'tipo': 'texto'},
+    ]),
+]
+
+def criar_base_sintetica(cur, cpfs):
+    s = SCHEMA
+    cur.execute(f"DROP SCHEMA IF EXISTS {s} CASCADE")
+    cur.execute(f"CREATE SCHEMA {s}")
+    nomes = "ARRAY['MARIA','JOSE','ANA','JOAO','ANTONIO','FRANCISCA','CARLOS','PAULO','LUCIA','PEDRO']"
+    cur.execute(f"""
+        CREATE TABLE {s}.pf_dados AS
+        SELECT g AS id, lpad((g * 7919 % 99999999999)::text, 11, '0')::varchar(20) AS cpf,
+               (({nomes})[1 + g % 10] || ' ' || md5(g::text)::varchar(8))::varchar(255) AS nome,
+               DATE '1950-01-01' + (g % 20000) AS data_nascimento, (g % 50 + 1)::text AS importacao_id
+        FROM generate_series(1, %s) g
+    """, (cpfs,))
+    cur.execute(f"ALTER TABLE {s}.pf_dados ADD PRIMARY KEY (cpf)")
+    # 0 a 4 linhas por CPF em cada satélite: é isso que multiplicava as linhas no JOIN antigo
+    cur.execute(f"""
+        CREATE TABLE {s}.pf_telefones AS
+        SELECT d.cpf, ((11 + (d.id + k) % 80)::text || '9' || lpad(((d.id * 104729 + k) % 100000000)::text, 8, '0'))::varchar(20) AS numero,
+               (d.id % 50 + 1) AS importacao_id
+        FROM {s}.pf_dados d CROSS JOIN generate_series(1, 4) k WHERE k <= 1 + d.id % 4
+    """)
+    cur.execute(f"""
+        CREATE TABLE {s}.pf_emails AS
+        SELECT d.cpf, (md5(d.id::text || k)::varchar(8) || CASE WHEN k % 2 = 0 THEN '@gmail.com' ELSE '@hotmail.com' END)::varchar(255) AS email,
+               (d.id % 50 + 1) AS importacao_id
+        FROM {s}.pf_dados d CROSS JOIN generate_series(1, 3) k WHERE k <= 1 + d.id % 3
+    """)
+    cur.execute(f"""
+        CREATE TABLE {s}.pf_enderecos AS
+        SELECT d.cpf, (ARRAY['BELO HORIZONTE','BETIM','SAO PAULO','CAMPINAS','RIO DE JANEIRO'])[1 + (d.id + k) % 5]::varchar(100) AS cidade,
+               (ARRAY['MG','MG','SP','SP','RJ'])[1 + (d.id + k) % 5]::varchar(2) AS uf, 'CENTRO'::varchar(100) AS bairro,
+               lpad(((d.id * 31 + k) % 99999999)::text, 8, '0')::varchar(10) AS cep, (d.id % 50 + 1) AS importacao_id
+        FROM {s}.pf_dados d CROSS JOIN generate_series(1, 2) k WHERE k <= 1 + d.id % 2
+    """)
+    cur.execute(f"""
+        CREATE TABLE {s}.pf_emprego_renda AS
+        SELECT d.cpf, (d.cpf || '-' || k)::varchar(100) AS matricula,
+               (ARRAY['INSS','SIAPE','GOV MG','CLT'])[1 + (d.id + k) % 4]::varchar(100) AS convenio, (d.id % 50 + 1) AS importacao_id
+        FROM {s}.pf_dados d CROSS JOIN generate_series(1, 2) k WHERE k <= 1 + d.id % 2
+    """)
+    cur.execute(f"ALTER TABLE {s}.pf_emprego_renda ADD PRIMARY KEY (matricula)")
+    cur.execute(f"""
+        CREATE TABLE {s}.pf_contratos AS
+        SELECT emp.matricula AS matricula_ref, lpad(((length(emp.matricula) * 7 + k) % 5 + 1)::text, 3, '0')::varchar(10) AS banco,
+               (100 + (hashtext(emp.matricula || k) & 1023))::numeric(12, 2) AS valor_parcela, emp.importacao_id
+        FROM {s}.pf_emprego_renda emp CROSS JOIN generate_series(1, 3) k
+    """)
+    cur.execute(f"""
+        CREATE TABLE {s}.pf_matricula_dados_clt AS
+        SELECT emp.matricula, ('EMPRESA ' || md5(emp.matricula)::varchar(6) || ' LTDA')::varchar(255) AS cnpj_nome, emp.importacao_id
+        FROM {s}.pf_emprego_renda emp WHERE emp.convenio = 'CLT'
+    """)
+    for tabela, coluna in (("pf_telefones", "cpf"), ("pf_emails", "cpf"), ("pf_enderecos", "cpf"), ("pf_emprego_renda", "cpf"),
+                           ("pf_contratos", "matricula_ref"), ("pf_matricula_dados_clt", "matricula")):
+        cur.execute(f"CREATE INDEX ON {s}.{tabela} ({coluna})")
+    for tabela in ("pf_dados", "pf_telefones", "pf_emails", "pf_enderecos", "pf_emprego_renda", "pf_contratos", "pf_matricula_dados_clt"):
+        cur.execute(f"ANALYZE {s}.{tabela}")
+
+def _no_schema(sql):
+    return sql.replace("banco_pf.", f"{SCHEMA}.")
+
+def consulta_antiga(regras):
+    """Implementação anterior (INNER JOIN de cada satélite + COUNT(DISTINCT)), mantida só para comparação."""
+    tabelas, conds, params = set(), [], []
+    for regra in regras:
+        tabela = campanhas._normalizar_tabela_regra(regra['tabela'])
+        sql, p = campanhas._condicao_regra(regra)
+        if tabela in campanhas.TABELAS_SATELITE:
+            tabelas.add(tabela)
+            pai = campanhas.TABELAS_SATELITE[tabela][2]
+            if pai: tabelas.add(pai)
+        if sql: conds.append(sql); params.extend(p)
+    joins = []
+    for tabela in sorted(tabelas, key=lambda t: (campanhas.TABELAS_SATELITE[t][2] is not None, t)):
+        alias, correlacao, _ = campanhas.TABELAS_SATELITE[tabela]
+        joins.append(f"JOIN {tabela} {alias} ON {correlacao}")
+    where = " WHERE " + " AND ".join(conds) if conds else ""
+    return _no_schema(f"SELECT COUNT(DISTINCT d.id) FROM banco_pf.pf_dados d {' '.join(joins)}{where}"), params
+
+def _nos(plano):
+    yield plano
+    for filho in plano.get("Plans", []):
+        yield from _nos(filho)
+
+def conferir_cenario(cur, nome, regras):
+    sql_where, params = campanhas.compilar_filtro_campanha(regras)
+    sql = _no_schema(f"SELECT COUNT(*) FROM banco_pf.pf_dados d {sql_where}")
+    problemas = []
+    if "DISTINCT" in sql.upper(): problemas.append("DISTINCT no SQL compilado")
+
+    cur.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", tuple(params))
+    plano = cur.fetchone()[0]
+    if isinstance(plano, str): plano = json.loads(plano)
+    raiz = plano[0]["Plan"]
+    tempo_novo = plano[0].get("Execution Time", 0.0)
+    # Sem paralelismo a raiz é o Aggregate do COUNT(*) e o filho dela entrega as linhas contadas
+    entrada = raiz["Plans"][0] if raiz["Node Type"] == "Aggregate" and raiz.get("Plans") else None
+    linhas_contadas = entrada["Actual Rows"] * entrada.get("Actual Loops", 1) if entrada else None
+
+    cur.execute(sql, tuple(params))
+    total_novo = cur.fetchone()[0]
+    if linhas_contadas is None: problemas.append(f"raiz do plano inesperada: {raiz['Node Type']}")
+    elif linhas_contadas != total_novo:
+        juncoes = [f"{no['Node Type']} ({no['Join Type']})" for no in _nos(raiz) if "Join Type" in no]
+        problemas.append(f"COUNT(*) recebeu {linhas_contadas:,} linhas para {total_novo:,} CPFs: {', '.join(juncoes)}")
+    sql_antigo, params_antigos = consulta_antiga(regras)
+    inicio = time.perf_counter()
+    cur.execute(sql_antigo, tuple(params_antigos))
+    total_antigo = cur.fetchone()[0]
+    tempo_antigo = (time.perf_counter() - inicio) * 1000
+    if total_novo != total_antigo: problemas.append(f"contagem {total_novo:,} ≠ consulta antiga {total_antigo:,}")
+
+    print(f"{'✅' if not problemas else '❌'} {nome:<32} {total_novo:>10,} CPFs | EXISTS {tempo_novo:>8.1f} ms | JOIN+DISTINCT {tempo_antigo:>8.1f} ms")
+    for p in problemas: print(f"     - {p}")
+    return not problemas
+
+def executar(cpfs, manter):
+    conn = pf_core.get_conn()
+    if not conn:
+        print("❌ Sem conexão com o banco (verifique conexao.py)")
+        return False
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        print(f"⏳ Gerando base sintética com {cpfs:,} CPFs em {SCHEMA}...")
+        criar_base_sintetica(cur, cpfs)
+        cur.execute("SET max_parallel_workers_per_gather = 0")
+        return all([conferir_cenario(cur, nome, regras) for nome, regras in CENARIOS])
+    finally:
+        if not manter: cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Confere via EXPLAIN que as regras de campanha viram semi-joins sem multiplicar linhas.")
+    ap.add_argument("--cpfs", type=int, default=200_000)
+    ap.add_argument("--manter", action="store_true", help="Não apaga o schema sintético no final")
+    args = ap.parse_args()
+    sys.exit(0 if executar(args.cpfs, args.manter) else 1)
@@ -21,6 +21,9 @@ except ImportError:
     st.error("Arquivo 'conexao.py' não encontrado na raiz.")
     conexao = None
 
+import modulo_catalogo as catalogo
+import modulo_salvamento_incremental as salvamento
+
 # ==============================================================================
 # 1. CONFIGURAÇÕES DE PROTEÇÃO E FILTROS
 # ==============================================================================
@@ -31,7 +34,8 @@ TABELAS_READ_ONLY = [
     'admin.wapi_logs',
     'admin.pedidos_historico',
     'admin.tarefas_historico',
-    'cliente.extrato_carteira_por_produto'
+    'cliente.extrato_carteira_por_produto',
+    'cliente.saldo_carteira_cliente'
 ]
 
 # (AJUSTE) Schemas de sistema que devem ser ocultados. O restante aparecerá livremente.
@@ -77,34 +81,10 @@ def get_conn():
 
 def listar_schemas_filtrados():
     """Retorna TODOS os schemas, exceto os de sistema do Postgres"""
-    with get_conn() as conn:
-        if not conn: return []
-        try:
-            with conn.cursor() as cur:
-                # (AJUSTE) Query alterada para listar tudo que NÃO for de sistema
-                cur.execute("""
-                    SELECT schema_name 
-                    FROM information_schema.schemata 
-                    WHERE schema_name NOT IN %s
-                    AND schema_name NOT LIKE 'pg_temp_%%'
-                    ORDER BY schema_name
-                """, (SCHEMAS_SISTEMA,))
-                return [r[0] for r in cur.fetchall()]
-        except: return []
+    return [sch for sch in catalogo.listar_schemas() if sch not in SCHEMAS_SISTEMA]
 
 def listar_tabelas(schema):
-    with get_conn() as conn:
-        if not conn: return []
-        try:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT table_name 
-                    FROM information_schema.tables 
-                    WHERE table_schema = %s 
-                    ORDER BY table_name
-                """, (schema,))
-                return [r[0] for r in cur.fetchall()]
-        except: return []
+    return catalogo.listar_tabelas(schema)
 
 def carregar_dados_paginados(schema, tabela, pagina, linhas_por_pagina, filtro_col=None, filtro_val=None):
     with get_conn() as conn:
@@ -140,27 +120,17 @@ def carregar_dados_paginados(schema, tabela, pagina, linhas_por_pagina, filtro_c
             st.error(f"Erro ao ler tabela: {e}")
             return pd.DataFrame(), 0
 
-def salvar_edicao_pequena(schema, tabela, df_alterado):
+def salvar_edicao_pequena(schema, tabela, df_alterado, df_original):
+    """Grava só o diff da página editada contra df_original (pela PK); o resto da tabela fica intacto."""
     with get_conn() as conn:
         if not conn: return False
         try:
-            cur = conn.cursor()
-            # ⚠️ DELETE + INSERT (Seguro apenas para tabelas de configuração pequenas)
-            cur.execute(f"DELETE FROM {schema}.{tabela}")
-            
-            colunas = list(df_alterado.columns)
-            # Converte para lista de tuplas para inserção em massa
-            vals = [tuple(x) for x in df_alterado.to_numpy()]
-            
-            placeholders = ",".join(["%s"] * len(colunas))
-            cols_str = ",".join(colunas)
-            
-            insert_query = f"INSERT INTO {schema}.{tabela} ({cols_str}) VALUES ({placeholders})"
-            cur.executemany(insert_query, vals)
-            
+            resultado = salvamento.salvar_diff(conn, schema, tabela, df_original, df_alterado)
             conn.commit()
+            st.toast(salvamento.resumo_diff(resultado))
             return True
         except Exception as e:
+            conn.rollback()
             st.error(f"Erro ao salvar: {e}")
             return False
 
@@ -193,14 +163,7 @@ def app_tabelas():
             if 'pagina_atual' not in st.session_state: st.session_state['pagina_atual'] = 1
             
             # --- Filtros Dinâmicos ---
-            cols_filtro = []
-            with get_conn() as conn:
-                if conn:
-                    try:
-                        cur = conn.cursor()
-                        cur.execute(f"SELECT column_name FROM information_schema.columns WHERE table_name = '{tabela_sel}' AND table_schema = '{schema_sel}'")
-                        cols_filtro = [r[0] for r in cur.fetchall()]
-                    except: pass
+            cols_filtro = catalogo.listar_colunas(tabela_sel, schema_sel)
 
             with st.expander("🔎 Filtros Avançados", expanded=False):
                 c_filtro_col, c_filtro_val = st.columns([1, 2])
@@ -217,18 +180,19 @@ def app_tabelas():
             
             # --- Bloqueio de Segurança ---
             nome_completo = f"{schema_sel}.{tabela_sel}"
-            # Bloqueia se estiver na lista negra OU se tiver mais de 10k registros (para não quebrar o DELETE/INSERT)
-            is_read_only = nome_completo in TABELAS_READ_ONLY or total > 10000 
+            # Salvamento é incremental (só a página editada), então o tamanho da tabela não bloqueia mais a edição
+            # Partições mensais de admin.wapi_logs (admin.wapi_logs_AAAA_MM) seguem a tabela-mãe
+            is_read_only = nome_completo in TABELAS_READ_ONLY or nome_completo.startswith('admin.wapi_logs_')
             
             if is_read_only:
-                st.info(f"🔒 Modo Leitura (Tabela Protegida ou Muito Grande para Edição Direta)")
+                st.info(f"🔒 Modo Leitura (Tabela Protegida)")
                 st.dataframe(df, use_container_width=True)
             else:
                 # Editor Interativo
                 df_editado = st.data_editor(df, num_rows="dynamic", use_container_width=True, key=f"edit_{schema_sel}_{tabela_sel}")
                 
-                if st.button("💾 Salvar Alterações (Sobrescrever Tabela)"):
-                    if salvar_edicao_pequena(schema_sel, tabela_sel, df_editado):
+                if st.button("💾 Salvar Alterações"):
+                    if salvar_edicao_pequena(schema_sel, tabela_sel, df_editado, df):
                         st.success("Tabela atualizada com sucesso!")
                         time.sleep(1)
                         st.rerun()
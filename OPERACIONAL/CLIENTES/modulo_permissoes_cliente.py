@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import psycopg2
 import time
+import threading
 
 # Tenta importar conexao
 try:
@@ -21,7 +22,127 @@ def get_conn():
         return None
 
 # =============================================================================
-# 1. FUNÇÃO CORE DE VERIFICAÇÃO (USADA POR TODO O SISTEMA)
+# 1. ÍNDICE DE REGRAS EM MEMÓRIA (COMPARTILHADO PELO PROCESSO)
+# =============================================================================
+
+# Edições feitas neste processo invalidam na hora; edições de outros processos
+# (ou pelo editor genérico de tabelas) são percebidas pela versão no banco,
+# consultada no máximo a cada INTERVALO_VERIFICACAO_VERSAO segundos.
+INTERVALO_VERIFICACAO_VERSAO = 30
+
+@st.cache_resource
+def _estado_cache_permissoes():
+    return {"lock": threading.Lock(), "indice": None, "versao": None, "verificado_em": 0.0, "estrutura_ok": False}
+
+def criar_estrutura_versao_permissoes(cur):
+    """Tabela de versão + triggers que incrementam a versão a cada alteração de regras ou níveis."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS permissão.permissão_regras_versao (
+            id INTEGER PRIMARY KEY DEFAULT 1,
+            versao BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("INSERT INTO permissão.permissão_regras_versao (id, versao) VALUES (1, 0) ON CONFLICT (id) DO NOTHING")
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION permissão.fn_incrementar_versao_regras() RETURNS trigger AS $$
+        BEGIN
+            UPDATE permissão.permissão_regras_versao SET versao = versao + 1 WHERE id = 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    # caminho_bloqueio é gravado pela própria verificação e não muda o resultado, por isso fica de fora
+    cur.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trg_versao_regras_nivel') THEN
+                CREATE TRIGGER trg_versao_regras_nivel
+                AFTER INSERT OR DELETE OR TRUNCATE OR UPDATE OF chave, nivel, status, nome_regra
+                ON permissão.permissão_usuario_regras_nível
+                FOR EACH STATEMENT EXECUTE FUNCTION permissão.fn_incrementar_versao_regras();
+            END IF;
+            IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trg_versao_grupo_nivel') THEN
+                CREATE TRIGGER trg_versao_grupo_nivel
+                AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+                ON permissão.permissão_grupo_nivel
+                FOR EACH STATEMENT EXECUTE FUNCTION permissão.fn_incrementar_versao_regras();
+            END IF;
+        END $$
+    """)
+
+def _compilar_indice_permissoes(cur):
+    """Lê níveis e regras ativas uma vez e monta: chave -> {id_nivel: regra} (primeira regra por id vence)."""
+    cur.execute("SELECT id, nivel FROM permissão.permissão_grupo_nivel ORDER BY id")
+    niveis = {}
+    for id_nivel, nome in cur.fetchall():
+        niveis.setdefault(nome, str(id_nivel))
+
+    cur.execute("""
+        SELECT id, chave, nivel, caminho_bloqueio, nome_regra
+        FROM permissão.permissão_usuario_regras_nível 
+        WHERE status = 'SIM'
+        ORDER BY id
+    """)
+    bloqueios = {}
+    for rid, r_chave_db, r_niveis_bloqueados, r_caminho, r_nome in cur.fetchall():
+        regra = {"id": rid, "nome": r_nome, "caminho": r_caminho}
+        lista_niveis = [n.strip() for n in str(r_niveis_bloqueados).split(';') if n.strip()]
+        for k in [k.strip() for k in str(r_chave_db).split(';') if k.strip()]:
+            por_nivel = bloqueios.setdefault(k, {})
+            for id_nivel in lista_niveis:
+                por_nivel.setdefault(id_nivel, regra)
+    return {"niveis": niveis, "bloqueios": bloqueios}
+
+def invalidar_cache_permissoes():
+    estado = _estado_cache_permissoes()
+    with estado["lock"]:
+        estado["indice"] = None
+        estado["verificado_em"] = 0.0
+
+def obter_indice_permissoes():
+    """Retorna o índice compilado; só vai ao banco quando não há cache ou a versão pode ter mudado."""
+    estado = _estado_cache_permissoes()
+    agora = time.monotonic()
+    if estado["indice"] is not None and agora - estado["verificado_em"] < INTERVALO_VERIFICACAO_VERSAO:
+        return estado["indice"]
+
+    with estado["lock"]:
+        if estado["indice"] is not None and agora - estado["verificado_em"] < INTERVALO_VERIFICACAO_VERSAO:
+            return estado["indice"]
+
+        conn = get_conn()
+        if not conn: return estado["indice"]
+        try:
+            cur = conn.cursor()
+            if not estado["estrutura_ok"]:
+                try:
+                    criar_estrutura_versao_permissoes(cur)
+                    conn.commit()
+                    estado["estrutura_ok"] = True
+                except Exception as e:
+                    # Sem a tabela de versão o índice é recompilado a cada intervalo
+                    print(f"Aviso: versão das regras de permissão indisponível: {e}")
+                    conn.rollback()
+
+            versao = None
+            if estado["estrutura_ok"]:
+                cur.execute("SELECT versao FROM permissão.permissão_regras_versao WHERE id = 1")
+                res = cur.fetchone()
+                versao = res[0] if res else None
+
+            if estado["indice"] is None or versao is None or versao != estado["versao"]:
+                estado["indice"] = _compilar_indice_permissoes(cur)
+                estado["versao"] = versao
+            estado["verificado_em"] = time.monotonic()
+            conn.close()
+            return estado["indice"]
+        except Exception as e:
+            print(f"Erro ao carregar regras de permissão: {e}")
+            conn.close()
+            return estado["indice"]
+
+# =============================================================================
+# 2. FUNÇÃO CORE DE VERIFICAÇÃO (USADA POR TODO O SISTEMA)
 # =============================================================================
 
 def verificar_bloqueio_de_acesso(chave, caminho_atual="Desconhecido", parar_se_bloqueado=False, nome_regra_codigo=None):
@@ -37,82 +158,46 @@ def verificar_bloqueio_de_acesso(chave, caminho_atual="Desconhecido", parar_se_b
     if not st.session_state.get('logado'):
         return True 
 
-    conn = get_conn()
-    if not conn: return False # Se falhar conexão, libera ou bloqueia? (Aqui libera para não travar erro)
-    
-    try:
-        cur = conn.cursor()
-        
-        nivel_usuario_nome = st.session_state.get('usuario_cargo', '') 
-        if not nivel_usuario_nome:
-            nivel_usuario_nome = 'Cliente sem permissão'
+    indice = obter_indice_permissoes()
+    if indice is None: return False # Se falhar conexão, libera ou bloqueia? (Aqui libera para não travar erro)
 
-        # Busca ID do nível do usuário
-        cur.execute("SELECT id FROM permissão.permissão_grupo_nivel WHERE nivel = %s", (nivel_usuario_nome,))
-        res_nivel = cur.fetchone()
-        
-        if not res_nivel:
-            conn.close(); return False 
-            
-        id_nivel_usuario = str(res_nivel[0])
+    nivel_usuario_nome = st.session_state.get('usuario_cargo', '') 
+    if not nivel_usuario_nome:
+        nivel_usuario_nome = 'Cliente sem permissão'
 
-        # Busca regras ativas
-        cur.execute("""
-            SELECT id, chave, nivel, status, caminho_bloqueio, nome_regra
-            FROM permissão.permissão_usuario_regras_nível 
-            WHERE status = 'SIM'
-        """)
-        regras_ativas = cur.fetchall()
-        
-        bloqueado = False
-        regra_aplicada = None
-        id_regra_aplicada = None
-        caminho_registrado = None
+    id_nivel_usuario = indice["niveis"].get(nivel_usuario_nome)
+    if not id_nivel_usuario: return False
 
-        for row in regras_ativas:
-            rid, r_chave_db, r_niveis_bloqueados, r_status, r_caminho, r_nome = row
-            
-            lista_chaves_db = [k.strip() for k in str(r_chave_db).split(';') if k.strip()]
-            
-            if chave in lista_chaves_db:
-                lista_niveis = [n.strip() for n in str(r_niveis_bloqueados).split(';') if n.strip()]
-                
-                if id_nivel_usuario in lista_niveis:
-                    bloqueado = True
-                    regra_aplicada = r_nome
-                    id_regra_aplicada = rid
-                    caminho_registrado = r_caminho
-                    break 
-        
-        if bloqueado:
-            # Registra onde ocorreu o bloqueio se ainda não tiver registrado
-            if not caminho_registrado and id_regra_aplicada:
+    regra = indice["bloqueios"].get(chave, {}).get(id_nivel_usuario)
+    if not regra: return False
+
+    # Registra onde ocorreu o bloqueio se ainda não tiver registrado
+    if not regra["caminho"]:
+        regra["caminho"] = caminho_atual
+        conn = get_conn()
+        if conn:
+            try:
+                cur = conn.cursor()
                 cur.execute("""
                     UPDATE permissão.permissão_usuario_regras_nível 
                     SET caminho_bloqueio = %s 
-                    WHERE id = %s
-                """, (caminho_atual, id_regra_aplicada))
+                    WHERE id = %s AND (caminho_bloqueio IS NULL OR caminho_bloqueio = '')
+                """, (caminho_atual, regra["id"]))
                 conn.commit()
-            
-            conn.close()
-            
-            if parar_se_bloqueado:
-                st.error("🚫 ACESSO NEGADO / PERMISSÃO INSUFICIENTE")
-                st.caption(f"Regra de bloqueio: {regra_aplicada}")
-                st.stop()
-                
-            return True
-            
-        conn.close()
-        return False
-
-    except Exception as e:
-        print(f"Erro verificação permissão: {e}")
-        if conn: conn.close()
-        return False
+            except Exception as e:
+                print(f"Erro verificação permissão: {e}")
+            finally:
+                conn.close()
+
+    if parar_se_bloqueado:
+        st.error("🚫 ACESSO NEGADO / PERMISSÃO INSUFICIENTE")
+        st.caption(f"Regra de bloqueio: {regra['nome']}")
+        st.stop()
+        
+    return True
 
 # =============================================================================
-# 2. CRUDs DE ESTRUTURA (NÍVEIS, CHAVES, CATEGORIAS)
+# 3. CRUDs DE ESTRUTURA (NÍVEIS, CHAVES, CATEGORIAS)
 # =============================================================================
 
 def listar_permissoes_nivel():
@@ -128,7 +213,7 @@ def salvar_permissao_nivel(nome):
     if not conn: return False
     try:
         cur = conn.cursor(); cur.execute("INSERT INTO permissão.permissão_grupo_nivel (nivel) VALUES (%s)", (nome,))
-        conn.commit(); conn.close(); return True
+        conn.commit(); conn.close(); invalidar_cache_permissoes(); return True
     except: conn.close(); return False
 
 def atualizar_permissao_nivel(id_reg, novo_nome):
@@ -136,7 +221,7 @@ def atualizar_permissao_nivel(id_reg, novo_nome):
     if not conn: return False
     try:
         cur = conn.cursor(); cur.execute("UPDATE permissão.permissão_grupo_nivel SET nivel = %s WHERE id = %s", (novo_nome, id_reg))
-        conn.commit(); conn.close(); return True
+        conn.commit(); conn.close(); invalidar_cache_permissoes(); return True
     except: conn.close(); return False
 
 def excluir_permissao_nivel(id_reg):
@@ -144,7 +229,7 @@ def excluir_permissao_nivel(id_reg):
     if not conn: return False
     try:
         cur = conn.cursor(); cur.execute("DELETE FROM permissão.permissão_grupo_nivel WHERE id = %s", (id_reg,))
-        conn.commit(); conn.close(); return True
+        conn.commit(); conn.close(); invalidar_cache_permissoes(); return True
     except: conn.close(); return False
 
 # --- CHAVES ---
@@ -214,7 +299,7 @@ def excluir_permissao_categoria(id_reg):
     except: conn.close(); return False
 
 # =============================================================================
-# 3. CRUDs DE REGRAS DE BLOQUEIO
+# 4. CRUDs DE REGRAS DE BLOQUEIO
 # =============================================================================
 
 def listar_regras_bloqueio():
@@ -235,7 +320,7 @@ def salvar_regra_bloqueio(nome, chave, niveis_ids_str, categoria, status, descri
             (nome_regra, chave, nivel, categoria, status, descricao) 
             VALUES (%s, %s, %s, %s, %s, %s)
         """, (nome, chave, niveis_ids_str, categoria, status, descricao))
-        conn.commit(); conn.close(); return True
+        conn.commit(); conn.close(); invalidar_cache_permissoes(); return True
     except: conn.close(); return False
 
 def atualizar_regra_bloqueio(id_reg, nome, chave, niveis_ids_str, categoria, status, descricao):
@@ -248,7 +333,7 @@ def atualizar_regra_bloqueio(id_reg, nome, chave, niveis_ids_str, categoria, sta
             SET nome_regra=%s, chave=%s, nivel=%s, categoria=%s, status=%s, descricao=%s
             WHERE id=%s
         """, (nome, chave, niveis_ids_str, categoria, status, descricao, id_reg))
-        conn.commit(); conn.close(); return True
+        conn.commit(); conn.close(); invalidar_cache_permissoes(); return True
     except: conn.close(); return False
 
 def excluir_regra_bloqueio(id_reg):
@@ -257,7 +342,7 @@ def excluir_regra_bloqueio(id_reg):
     try:
         cur = conn.cursor()
         cur.execute("DELETE FROM permissão.permissão_usuario_regras_nível WHERE id=%s", (id_reg,))
-        conn.commit(); conn.close(); return True
+        conn.commit(); conn.close(); invalidar_cache_permissoes(); return True
     except: conn.close(); return False
 
 # --- DIALOGS DE EDIÇÃO ---
@@ -304,7 +389,7 @@ def dialog_editar_generico(tipo, id_reg, valor_atual):
             else: st.error("Erro.")
 
 # =============================================================================
-# 4. APP PRINCIPAL DO MÓDULO
+# 5. APP PRINCIPAL DO MÓDULO
 # =============================================================================
 
 def app_permissoes():
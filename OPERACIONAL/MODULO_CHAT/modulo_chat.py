@@ -2,10 +2,20 @@ import streamlit as st
 import pandas as pd
 import psycopg2
 import time
-from datetime import datetime
+import json
+import select
+import threading
+from datetime import datetime, timedelta
 import modulo_wapi  # Reutiliza suas funções de envio
 import conexao
 
+INTERVALO_FRAGMENTO = 2      # segundos entre checagens da conversa aberta (só memória, sem banco)
+INTERVALO_SEM_OUVINTE = 15   # sem LISTEN ativo, consulta o banco a cada N segundos
+LIMITE_HISTORICO = 200       # mensagens carregadas ao abrir a conversa (mais antigas sob demanda)
+# id e data_hora nascem no INSERT, mas o commit pode vir fora de ordem (threads/workers do webhook):
+# a busca incremental relê esta janela antes da última mensagem exibida e descarta os ids já na tela
+JANELA_SOBREPOSICAO_SEG = 120
+
 # --- CONEXÃO ---
 def get_conn():
     try:
@@ -17,7 +27,76 @@ def get_conn():
         st.error(f"Erro de conexão: {e}")
         return None
 
+# --- OUVINTE DE MENSAGENS NOVAS (LISTEN) ---
+class OuvinteMensagens:
+    """
+    Uma conexão LISTEN por processo do Streamlit (compartilhada por todas as abas abertas).
+    Guarda quantos avisos chegaram por telefone (o NOTIFY sai no commit, então cada log
+    commitado conta, mesmo fora da ordem dos ids) e um contador geral; as telas comparam
+    com o que já viram e só vão ao banco quando há algo novo.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.avisos = {}
+        self.versao = 0
+        self.conectado = False
+        self.thread = threading.Thread(target=self._loop, name="chat-listen", daemon=True)
+        self.thread.start()
+
+    def _loop(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(
+                    host=conexao.host, port=conexao.port, database=conexao.database,
+                    user=conexao.user, password=conexao.password
+                )
+                conn.autocommit = True
+                with conn.cursor() as cur: cur.execute(f"LISTEN {modulo_wapi.CANAL_MENSAGENS}")
+                self.conectado = True
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        with conn.cursor() as cur: cur.execute("SELECT 1")  # mantém a conexão viva
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._registrar(conn.notifies.pop(0).payload)
+            except Exception as e:
+                print(f"Ouvinte do chat desconectado: {e}")
+            finally:
+                self.conectado = False
+                if conn is not None:
+                    try: conn.close()
+                    except Exception: pass
+            time.sleep(5)
+
+    def _registrar(self, payload):
+        try: aviso = json.loads(payload)
+        except ValueError: return
+        with self.lock:
+            self.versao += 1
+            tel = aviso.get('telefone')
+            if tel and aviso.get('id'):
+                self.avisos[tel] = self.avisos.get(tel, 0) + 1
+
+    def avisos_de(self, telefone):
+        with self.lock: return self.avisos.get(telefone, 0)
+
+    def avisos_fora_de(self, telefone):
+        """Quantos avisos chegaram para outros telefones (compara com o valor guardado na tela)."""
+        with self.lock: return self.versao - self.avisos.get(telefone, 0)
+
+@st.cache_resource
+def obter_ouvinte():
+    return OuvinteMensagens()
+
 # --- FUNÇÕES DE BUSCA ---
+@st.cache_data(ttl=300, show_spinner=False)
+def listar_contatos_cache(versao):
+    """Lista de contatos reaproveitada entre reruns até chegar mensagem nova (versao do ouvinte)."""
+    return listar_contatos_recentes()
+
 def listar_contatos_recentes():
     """Busca números com interação recente na tabela wapi_numeros"""
     conn = get_conn()
@@ -27,7 +106,7 @@ def listar_contatos_recentes():
             query = """
                 SELECT id, telefone, nome_cliente, data_ultima_interacao 
                 FROM wapi_numeros 
-                ORDER BY data_ultima_interacao DESC 
+                ORDER BY data_ultima_interacao DESC NULLS LAST
                 LIMIT 50
             """
             df = pd.read_sql(query, conn)
@@ -37,25 +116,111 @@ def listar_contatos_recentes():
             conn.close()
     return pd.DataFrame()
 
-def buscar_mensagens(telefone):
-    """Busca histórico de mensagens (Enviadas e Recebidas)"""
+def buscar_mensagens(telefone, limite=LIMITE_HISTORICO):
+    """Busca as últimas `limite` mensagens (Enviadas e Recebidas), em ordem cronológica"""
     conn = get_conn()
     if conn:
         try:
-            # Busca logs vinculados a este telefone
+            # Busca logs vinculados a este telefone (índice telefone + data_hora)
             query = """
-                SELECT data_hora, tipo, mensagem, nome_contato, status 
-                FROM wapi_logs 
-                WHERE telefone = %s 
-                ORDER BY data_hora ASC
+                SELECT * FROM (
+                    SELECT id, data_hora, tipo, mensagem, nome_contato, status 
+                    FROM wapi_logs 
+                    WHERE telefone = %s 
+                    ORDER BY data_hora DESC, id DESC
+                    LIMIT %s
+                ) ultimas ORDER BY data_hora ASC, id ASC
             """
-            df = pd.read_sql(query, conn, params=(str(telefone),))
+            df = pd.read_sql(query, conn, params=(str(telefone), int(limite)))
             conn.close()
             return df
         except: 
             conn.close()
     return pd.DataFrame()
 
+def buscar_mensagens_novas(telefone, depois_de_data, ids_exibidos):
+    """
+    Linhas a partir de JANELA_SOBREPOSICAO_SEG antes da última exibida (a data limita as
+    partições lidas), sem as que já estão na tela: pega também os commits atrasados.
+    """
+    conn = get_conn()
+    if conn:
+        try:
+            query = """
+                SELECT id, data_hora, tipo, mensagem, nome_contato, status 
+                FROM wapi_logs 
+                WHERE telefone = %s AND data_hora >= %s
+                ORDER BY data_hora ASC, id ASC
+            """
+            desde = depois_de_data - timedelta(seconds=JANELA_SOBREPOSICAO_SEG)
+            df = pd.read_sql(query, conn, params=(str(telefone), desde))
+            conn.close()
+            return df[~df['id'].isin(ids_exibidos)]
+        except: 
+            conn.close()
+    return pd.DataFrame()
+
+# --- JANELA DE MENSAGENS (FRAGMENTO) ---
+def _carregar_conversa(telefone, limite):
+    # Lido antes da busca: aviso que chegar durante ela dispara a busca incremental
+    st.session_state['chat_avisos_vistos'] = obter_ouvinte().avisos_de(telefone)
+    df = buscar_mensagens(telefone, limite)
+    st.session_state['chat_msgs'] = df
+    st.session_state['chat_msgs_tel'] = telefone
+    st.session_state['chat_msgs_limite'] = limite
+    st.session_state['chat_msgs_checado'] = time.monotonic()
+
+@st.fragment(run_every=INTERVALO_FRAGMENTO)
+def janela_mensagens(telefone):
+    """
+    Reexecuta sozinha a cada INTERVALO_FRAGMENTO s sem rerun da página. Só consulta o banco
+    quando o ouvinte avisou mensagem nova deste telefone (ou, sem ouvinte, a cada INTERVALO_SEM_OUVINTE s),
+    e então busca apenas as linhas novas.
+    """
+    ouvinte = obter_ouvinte()
+    if st.session_state.get('chat_msgs_tel') != telefone:
+        _carregar_conversa(telefone, LIMITE_HISTORICO)
+
+    df_msgs = st.session_state['chat_msgs']
+    avisos = ouvinte.avisos_de(telefone)
+    if ouvinte.conectado:
+        tem_novas = avisos != st.session_state.get('chat_avisos_vistos')
+    else:
+        tem_novas = time.monotonic() - st.session_state['chat_msgs_checado'] > INTERVALO_SEM_OUVINTE
+    if tem_novas:
+        st.session_state['chat_msgs_checado'] = time.monotonic()
+        st.session_state['chat_avisos_vistos'] = avisos
+        ultima_data = df_msgs['data_hora'].max() if not df_msgs.empty else datetime(1970, 1, 1)
+        df_novas = buscar_mensagens_novas(telefone, ultima_data, df_msgs['id'] if not df_msgs.empty else [])
+        if not df_novas.empty:
+            # Commit atrasado pode ser mais antigo que a última exibida: reordena
+            df_msgs = pd.concat([df_msgs, df_novas], ignore_index=True).sort_values(['data_hora', 'id'], ignore_index=True)
+            st.session_state['chat_msgs'] = df_msgs
+
+    # Área de Mensagens (Container com scroll)
+    chat_container = st.container(height=400)
+    with chat_container:
+        if len(df_msgs) >= st.session_state['chat_msgs_limite']:
+            if st.button("⬆️ Mensagens anteriores", key="chat_anteriores"):
+                _carregar_conversa(telefone, st.session_state['chat_msgs_limite'] + LIMITE_HISTORICO)
+                st.rerun(scope="fragment")
+        if not df_msgs.empty:
+            for _, row in df_msgs.iterrows():
+                # Define quem enviou (User = Nós/Atendente, Assistant = Cliente)
+                # Ajuste conforme sua lógica: 'ENVIADA' somos nós, 'RECEBIDA' é o cliente
+                role = "user" if row['tipo'] == 'ENVIADA' else "assistant"
+                avatar = "👤" if role == "assistant" else "🎧"
+                
+                with st.chat_message(role, avatar=avatar):
+                    st.write(row['mensagem'])
+                    st.caption(f"{row['data_hora'].strftime('%d/%m %H:%M')} - {row['nome_contato'] or ''}")
+        else:
+            st.caption("Nenhuma mensagem trocada ainda.")
+
+    # Mensagem nova de outro contato: a lista da esquerda só muda no próximo rerun da página
+    if ouvinte.conectado and ouvinte.avisos_fora_de(telefone) != st.session_state.get('chat_avisos_lista'):
+        st.caption("🔔 Há mensagens novas em outras conversas — clique em **Atualizar Lista**.")
+
 # --- INTERFACE DO CHAT ---
 def app_chat_screen():
     # CSS para ajustar altura e visual
@@ -78,7 +243,10 @@ def app_chat_screen():
         if st.button("🔄 Atualizar Lista"):
             st.rerun()
             
-        df_contatos = listar_contatos_recentes()
+        # Só consulta de novo quando o ouvinte recebeu mensagem desde a última leitura
+        ouvinte = obter_ouvinte()
+        versao = ouvinte.versao if ouvinte.conectado else int(time.time() // 30)
+        df_contatos = listar_contatos_cache(versao)
         
         if not df_contatos.empty:
             # Seletor de contato (usando radio para simular lista clicável)
@@ -100,6 +268,8 @@ def app_chat_screen():
     # --- COLUNA DA DIREITA: JANELA DE MENSAGENS ---
     with col_chat:
         telefone = st.session_state.get('chat_telefone_atual')
+        # Referência para o aviso de "mensagens novas em outras conversas"
+        st.session_state['chat_avisos_lista'] = obter_ouvinte().avisos_fora_de(telefone)
         
         if telefone:
             # Cabeçalho da conversa
@@ -107,25 +277,8 @@ def app_chat_screen():
             st.markdown(f"#### 👤 {nome_cli} ({telefone})")
             st.divider()
 
-            # Área de Mensagens (Container com scroll)
-            chat_container = st.container(height=400)
-            
-            # Carrega mensagens
-            df_msgs = buscar_mensagens(telefone)
-            
-            with chat_container:
-                if not df_msgs.empty:
-                    for _, row in df_msgs.iterrows():
-                        # Define quem enviou (User = Nós/Atendente, Assistant = Cliente)
-                        # Ajuste conforme sua lógica: 'ENVIADA' somos nós, 'RECEBIDA' é o cliente
-                        role = "user" if row['tipo'] == 'ENVIADA' else "assistant"
-                        avatar = "👤" if role == "assistant" else "🎧"
-                        
-                        with st.chat_message(role, avatar=avatar):
-                            st.write(row['mensagem'])
-                            st.caption(f"{row['data_hora'].strftime('%d/%m %H:%M')} - {row['nome_contato'] or ''}")
-                else:
-                    st.caption("Nenhuma mensagem trocada ainda.")
+            # Mensagens: fragmento que se atualiza sozinho com as linhas novas
+            janela_mensagens(telefone)
 
             # Área de Envio
             with st.container():
@@ -143,16 +296,14 @@ def app_chat_screen():
                         msg_final += f"\n\n~ {usuario_logado}"
 
                     # Busca instância ativa para envio
-                    instancia = modulo_wapi.buscar_instancia_ativa()
+                    instancia = modulo_wapi.buscar_instancia_ativa(telefone)
                     if instancia:
                         with st.spinner("Enviando..."):
                             res = modulo_wapi.enviar_msg_api(instancia[0], instancia[1], telefone, msg_final)
                             
                             if res.get('success') or res.get('messageId'):
-                                # O Webhook deve salvar o log, mas para garantir feedback visual rápido:
-                                st.success("Enviada!")
-                                time.sleep(1)
-                                st.rerun()
+                                # O Webhook salva o log e avisa; a janela de mensagens mostra sozinha
+                                st.toast("Enviada!")
                             else:
                                 st.error(f"Erro no envio: {res}")
                     else:
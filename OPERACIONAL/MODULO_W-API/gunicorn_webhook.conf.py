@@ -0,0 +1,94 @@
+import os
+import sys
+import fcntl
+import threading
+import multiprocessing
+
+# =============================================================================
+# GUNICORN - WEBHOOK W-API (PRODUÇÃO)
+# Antes do primeiro deploy (migrações únicas, podem demorar; o webhook não as roda):
+#            python modulo_wapi.py migrar_numeros
+#            python modulo_whats_logs_particao.py migrar
+# Subir:     gunicorn -c gunicorn_webhook.conf.py
+# Recarregar sem derrubar requisições (código novo / workers travados):
+#            kill -HUP $(cat webhook.pid)
+# Parar drenando a fila:  kill -TERM $(cat webhook.pid)
+# Cada worker tem sua fila em memória (webhook_wapi.fila_eventos); ao sair, o
+# gancho worker_exit espera a fila esvaziar (webhook_wapi.encerrar).
+# Janela de saída: o master manda SIGKILL graceful_timeout segundos depois do
+# TERM/HUP. Nela cabem as requisições em andamento (até `timeout`), a drenagem
+# da fila (até TIMEOUT_DRENAGEM) e uma folga; por isso graceful_timeout é a soma.
+# Manutenção das partições de wapi_logs: roda em um worker só (o que pega a trava
+# ARQUIVO_TRAVA_MANUTENCAO); os outros esperam a trava e um deles assume quando
+# esse worker sair (HUP, max_requests). Nada roda no master.
+# Ajustes por variável de ambiente: WEBHOOK_BIND, WEBHOOK_WORKERS, WEBHOOK_THREADS,
+# WEBHOOK_DRENAGEM.
+# =============================================================================
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+wsgi_app = "webhook_wapi:app"
+chdir = BASE_DIR
+bind = os.environ.get("WEBHOOK_BIND", "0.0.0.0:5001")
+
+# gthread: cada worker atende várias conexões keep-alive; o trabalho pesado vai para a fila
+worker_class = "gthread"
+workers = int(os.environ.get("WEBHOOK_WORKERS", min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get("WEBHOOK_THREADS", "4"))
+
+# Rajadas da W-API (disparos em massa geram um evento por mensagem enviada)
+backlog = 2048
+keepalive = 15
+timeout = 30
+TIMEOUT_DRENAGEM = int(os.environ.get("WEBHOOK_DRENAGEM", "20"))
+FOLGA_SAIDA = 5
+graceful_timeout = timeout + TIMEOUT_DRENAGEM + FOLGA_SAIDA
+# Recicla workers aos poucos (evita acúmulo de memória) sem reiniciar todos juntos
+max_requests = 5000
+max_requests_jitter = 500
+
+pidfile = os.path.join(BASE_DIR, "webhook.pid")
+errorlog = os.path.join(BASE_DIR, "webhook.log")
+accesslog = None
+loglevel = "info"
+capture_output = True  # prints do webhook vão para o errorlog
+
+ARQUIVO_TRAVA_MANUTENCAO = os.path.join(BASE_DIR, "webhook_manutencao.lock")
+_trava_manutencao = {"arquivo": None}
+
+def _tempo_drenagem(cfg):
+    """Quanto da janela de saída sobra para a fila depois das requisições em andamento e da folga."""
+    return min(TIMEOUT_DRENAGEM, cfg.graceful_timeout - cfg.timeout - FOLGA_SAIDA)
+
+def when_ready(server):
+    """No master, antes dos workers: só confere a janela de saída (nada de banco aqui)."""
+    drenagem = _tempo_drenagem(server.cfg)
+    if drenagem < TIMEOUT_DRENAGEM:
+        server.log.warning(
+            f"graceful_timeout={server.cfg.graceful_timeout}s não comporta timeout={server.cfg.timeout}s "
+            f"+ drenagem={TIMEOUT_DRENAGEM}s + folga={FOLGA_SAIDA}s: a fila terá só {max(drenagem, 0)}s "
+            f"para esvaziar antes do SIGKILL (use graceful_timeout >= {server.cfg.timeout + TIMEOUT_DRENAGEM + FOLGA_SAIDA})"
+        )
+
+def _assumir_manutencao(log, pid):
+    """Espera a trava (bloqueia só esta thread); quem a pegar roda a manutenção até o processo sair."""
+    arquivo = open(ARQUIVO_TRAVA_MANUTENCAO, "a")
+    fcntl.flock(arquivo, fcntl.LOCK_EX)
+    # Fica aberto enquanto o worker viver; a trava some junto com o processo
+    _trava_manutencao["arquivo"] = arquivo
+    import modulo_whats_logs_particao
+    modulo_whats_logs_particao.iniciar_manutencao()
+    log.info(f"Worker {pid} assumiu a manutenção das partições de wapi_logs")
+
+def post_worker_init(worker):
+    """Cada worker fica na fila da trava; um por vez roda a manutenção das partições de wapi_logs."""
+    threading.Thread(target=_assumir_manutencao, args=(worker.log, worker.pid),
+                     name="wapi-logs-trava", daemon=True).start()
+
+def worker_exit(server, worker):
+    """Worker parando (HUP, TERM, max_requests): grava o que ainda está na fila."""
+    webhook = sys.modules.get("webhook_wapi")
+    if webhook is not None:
+        # O worker não avisa o master enquanto drena; o notify evita ser morto por `timeout` no HUP
+        pendentes = webhook.encerrar(timeout=max(_tempo_drenagem(server.cfg), 0), ao_aguardar=worker.notify)
+        if pendentes: server.log.warning(f"Worker {worker.pid} saiu com {pendentes} evento(s) na fila")
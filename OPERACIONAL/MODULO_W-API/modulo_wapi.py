@@ -1,5 +1,8 @@
+import os
+import sys
+import time
 import psycopg2
-import requests
+from psycopg2.extras import execute_values
 import re
 import json # Importante para tratar erros de JSON
 
@@ -8,6 +11,16 @@ try:
 except ImportError:
     print("Erro crítico: Arquivo conexao.py não localizado no servidor.")
 
+# Cliente HTTP compartilhado (raiz do projeto): sessão keep-alive por host, retries e métricas
+try:
+    import modulo_http as cliente_http
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    import modulo_http as cliente_http
+
+import modulo_whats_midia as midia_cache
+import modulo_whats_roteador as roteador
+
 def get_conn():
     """Estabelece conexão com o banco de dados usando as configurações do arquivo conexao.py"""
     try:
@@ -52,22 +65,41 @@ def limpar_telefone(telefone_bruto):
 # ==========================================================
 # 1. FUNÇÕES DE API (W-API)
 # ==========================================================
-BASE_URL = "https://api.w-api.app/v1"
+# WAPI_BASE_URL permite apontar para um servidor stub local (util_stub_wapi.py) em testes de carga
+BASE_URL = os.environ.get("WAPI_BASE_URL", "https://api.w-api.app/v1")
+
+def _contabilizar(instance_id, inicio, dados):
+    """Alimenta os contadores de vazão/falha do roteador (envios avulsos e do disparo em massa) e devolve a resposta."""
+    sucesso = isinstance(dados, dict) and bool(dados.get('messageId') or dados.get('success'))
+    roteador.registrar_envio(instance_id, sucesso, (time.perf_counter() - inicio) * 1000)
+    return dados
 
-def enviar_msg_api(instance_id, token, to, message):
-    """Envia mensagem de texto via API"""
+def enviar_msg_api(instance_id, token, to, message, telefone_limpo=False):
+    """
+    Envia mensagem de texto via API.
+    Em resposta HTTP de erro o dicionário retornado traz também 'status_code'.
+    telefone_limpo=True: `to` já passou por limpar_telefone (fila do disparo em massa);
+    limpar de novo estragaria o DDD 55 ("55999998888" viraria "999998888").
+    """
     url = f"{BASE_URL}/message/send-text?instanceId={instance_id}"
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
     
     # Usa a função padronizada de limpeza
-    contato_limpo = limpar_telefone(to)
+    contato_limpo = to if telefone_limpo else limpar_telefone(to)
     
     payload = {"phone": contato_limpo, "message": message, "delayMessage": 3}
+    inicio = time.perf_counter()
     try:
-        res = requests.post(url, json=payload, headers=headers, timeout=10)
-        return res.json()
+        res = cliente_http.post(url, "wapi.send-text", json=payload, headers=headers)
+        try:
+            dados = res.json()
+        except ValueError:
+            dados = {"success": False, "error": f"Erro API (Não JSON): {res.text[:200]}"}
+        if res.status_code >= 400 and isinstance(dados, dict):
+            dados.setdefault("status_code", res.status_code)
+        return _contabilizar(instance_id, inicio, dados)
     except Exception as e: 
-        return {"success": False, "error": str(e)}
+        return _contabilizar(instance_id, inicio, {"success": False, "error": str(e)})
 
 def enviar_midia_api(instance_id, token, to, base64_data, file_name, caption=""):
     """Envia arquivo/mídia via API (Base64)"""
@@ -85,14 +117,40 @@ def enviar_midia_api(instance_id, token, to, base64_data, file_name, caption="")
         "delayMessage": 3
     }
     
+    inicio = time.perf_counter()
     try:
-        res = requests.post(url, json=payload, headers=headers, timeout=60)
+        res = cliente_http.post(url, "wapi.send-media", json=payload, headers=headers)
         try:
-            return res.json()
+            return _contabilizar(instance_id, inicio, res.json())
         except ValueError:
-            return {"success": False, "error": f"Erro API (Não JSON): {res.text} - Code: {res.status_code}"}
+            return _contabilizar(instance_id, inicio, {"success": False, "error": f"Erro API (Não JSON): {res.text} - Code: {res.status_code}"})
     except Exception as e:
-        return {"success": False, "error": str(e)}
+        return _contabilizar(instance_id, inicio, {"success": False, "error": str(e)})
+
+def enviar_midia_preparada(instance_id, token, to, midia, caption="", telefone_limpo=False):
+    """
+    Envia mídia já preparada por modulo_whats_midia.preparar_midia (base64 em cache no disco).
+    O corpo JSON é transmitido em blocos a partir do arquivo, sem montar a string em memória.
+    telefone_limpo: como em enviar_msg_api.
+    """
+    url = f"{BASE_URL}/message/send-media?instanceId={instance_id}"
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    campos = {"phone": to if telefone_limpo else limpar_telefone(to), "caption": caption, "fileName": midia['nome'], "delayMessage": 3}
+    corpo = midia_cache.CorpoMidiaStream(midia, campos)
+    inicio = time.perf_counter()
+    try:
+        res = cliente_http.post(url, "wapi.send-media", data=corpo, headers=headers)
+        try:
+            dados = res.json()
+        except ValueError:
+            dados = {"success": False, "error": f"Erro API (Não JSON): {res.text[:200]} - Code: {res.status_code}"}
+        if res.status_code >= 400 and isinstance(dados, dict):
+            dados.setdefault("status_code", res.status_code)
+        return _contabilizar(instance_id, inicio, dados)
+    except Exception as e:
+        return _contabilizar(instance_id, inicio, {"success": False, "error": str(e)})
+    finally:
+        corpo.close()
 
 def obter_qrcode_api(instance_id, token):
     """Obtém o buffer da imagem do QR Code"""
@@ -100,7 +158,7 @@ def obter_qrcode_api(instance_id, token):
     headers = {"Authorization": f"Bearer {token}"}
     params = {"instanceId": instance_id, "image": "enable"}
     try:
-        res = requests.get(url, headers=headers, params=params, timeout=10)
+        res = cliente_http.get(url, "wapi.qr-code", headers=headers, params=params)
         return res.content if res.status_code == 200 else None
     except: return None
 
@@ -110,7 +168,7 @@ def obter_otp_api(instance_id, token, phone):
     headers = {"Authorization": f"Bearer {token}"}
     payload = {"instanceId": instance_id, "phone": phone}
     try:
-        res = requests.post(url, json=payload, headers=headers, timeout=10)
+        res = cliente_http.post(url, "wapi.connect-phone", json=payload, headers=headers)
         return res.json()
     except: return None
 
@@ -120,7 +178,7 @@ def checar_status_api(instance_id, token):
     headers = {"Authorization": f"Bearer {token}"}
     params = {"instanceId": instance_id}
     try:
-        res = requests.get(url, headers=headers, params=params, timeout=10)
+        res = cliente_http.get(url, "wapi.status-instance", headers=headers, params=params)
         if res.status_code == 200:
             return res.json()
         return {"state": "erro_api", "details": res.text}
@@ -132,7 +190,7 @@ def obter_info_instancia(instance_id, token):
     headers = {"Authorization": f"Bearer {token}"}
     params = {"instanceId": instance_id}
     try:
-        res = requests.get(url, headers=headers, params=params, timeout=10)
+        res = cliente_http.get(url, "wapi.info", headers=headers, params=params)
         
         # Se sucesso, retorna o JSON
         if res.status_code == 200:
@@ -151,20 +209,13 @@ def obter_info_instancia(instance_id, token):
 # 2. FUNÇÕES DE SUPORTE (BANCO DE DADOS)
 # ==========================================================
 
-def buscar_instancia_ativa():
-    """Retorna a primeira instância configurada no banco"""
-    conn = get_conn()
-    if conn:
-        try:
-            cur = conn.cursor()
-            cur.execute("SELECT api_instance_id, api_token FROM wapi_instancias LIMIT 1")
-            res = cur.fetchone()
-            conn.close()
-            return res 
-        except: 
-            conn.close()
-            return None
-    return None
+def buscar_instancia_ativa(destino=None):
+    """
+    Retorna (api_instance_id, api_token) da instância que deve enviar para `destino`,
+    escolhida pelo roteador entre as conectadas (mesma instância para o mesmo contato).
+    Sem destino, só balanceia. None se não houver instância cadastrada.
+    """
+    return roteador.escolher_instancia(get_conn, limpar_telefone(destino) if destino else None)
 
 def buscar_template(modulo, chave):
     """Busca o texto de um modelo de mensagem no banco"""
@@ -179,4 +230,134 @@ def buscar_template(modulo, chave):
         except:
             conn.close()
             return ""
-    return ""
\ No newline at end of file
+    return ""
+# ==========================================================
+# 3. CONCILIAÇÃO DE NÚMEROS (admin.wapi_numeros)
+# O webhook grava cada número (já limpo) e a última interação na mesma
+# transação do log (registrar_numero). As telas só leem a tabela pelos
+# índices, sem aplicar limpar_telefone linha a linha.
+# ==========================================================
+_estrutura_numeros = {"ok": False}
+
+def _normalizar_coluna_telefone(cur, tabela):
+    """Reescreve com limpar_telefone os valores fora do padrão (dados antigos). Uma vez só, na migração."""
+    cur.execute(f"""
+        SELECT DISTINCT telefone FROM {tabela}
+        WHERE telefone IS NOT NULL AND telefone !~ '^[0-9]{{10,11}}$' AND telefone NOT LIKE '%@g.us'
+    """)
+    trocas = [(t, limpar_telefone(t)) for (t,) in cur.fetchall()]
+    trocas = [(antigo, novo) for antigo, novo in trocas if novo and novo != antigo]
+    if trocas:
+        # Um UPDATE só (uma varredura da tabela) para todos os valores
+        execute_values(cur, f"UPDATE {tabela} t SET telefone = v.novo FROM (VALUES %s) AS v(antigo, novo) WHERE t.telefone = v.antigo", trocas, page_size=len(trocas))
+    return len(trocas)
+
+def criar_estrutura_numeros(cur):
+    """
+    Migração de wapi_numeros para o upsert do webhook: normaliza telefones antigos
+    (números e logs), junta duplicados, cria a chave única e semeia a tabela com
+    os números que só existem em wapi_logs. Não faz nada se a chave já existir.
+    """
+    cur.execute("SELECT to_regclass('admin.uq_wapi_numeros_telefone')")
+    if cur.fetchone()[0]: return
+
+    _normalizar_coluna_telefone(cur, "admin.wapi_numeros")
+    _normalizar_coluna_telefone(cur, "admin.wapi_logs")
+
+    # Duplicados: fica a linha vinculada (ou a mais recente), com o período completo
+    cur.execute("""
+        UPDATE admin.wapi_numeros n
+        SET data_registro = a.primeira, data_ultima_interacao = a.ultima
+        FROM (
+            SELECT telefone, MIN(data_registro) AS primeira, MAX(data_ultima_interacao) AS ultima
+            FROM admin.wapi_numeros GROUP BY telefone HAVING COUNT(*) > 1
+        ) a
+        WHERE n.telefone = a.telefone
+    """)
+    cur.execute("""
+        DELETE FROM admin.wapi_numeros WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY telefone
+                    ORDER BY (id_cliente IS NULL), data_ultima_interacao DESC NULLS LAST, id
+                ) AS ordem
+                FROM admin.wapi_numeros
+            ) d WHERE ordem > 1
+        )
+    """)
+    cur.execute("CREATE UNIQUE INDEX uq_wapi_numeros_telefone ON admin.wapi_numeros (telefone)")
+
+    cur.execute("""
+        INSERT INTO admin.wapi_numeros (telefone, id_cliente, nome_cliente, data_registro, data_ultima_interacao)
+        SELECT telefone,
+               (ARRAY_AGG(id_cliente ORDER BY data_hora DESC) FILTER (WHERE id_cliente IS NOT NULL))[1],
+               (ARRAY_AGG(nome_cliente ORDER BY data_hora DESC) FILTER (WHERE id_cliente IS NOT NULL))[1],
+               MIN(data_hora), MAX(data_hora)
+        FROM admin.wapi_logs
+        WHERE telefone IS NOT NULL AND telefone <> '' AND telefone NOT LIKE '%@g.us'
+        GROUP BY telefone
+        ON CONFLICT (telefone) DO UPDATE
+        SET data_ultima_interacao = GREATEST(wapi_numeros.data_ultima_interacao, EXCLUDED.data_ultima_interacao)
+    """)
+
+def estrutura_numeros_pronta(cur):
+    """Só confere (no cursor de quem chama) se a migração já rodou. Não migra: é o que o webhook usa."""
+    if not _estrutura_numeros["ok"]:
+        cur.execute("SELECT to_regclass('admin.uq_wapi_numeros_telefone')")
+        _estrutura_numeros["ok"] = cur.fetchone()[0] is not None
+    return _estrutura_numeros["ok"]
+
+def garantir_estrutura_numeros():
+    """
+    Roda a migração uma vez por processo (tela de conciliação ao abrir). Antes de subir o
+    webhook rode pela linha de comando: python modulo_wapi.py migrar_numeros
+    """
+    if _estrutura_numeros["ok"]: return True
+    conn = get_conn()
+    if not conn: return False
+    try:
+        with conn.cursor() as cur: criar_estrutura_numeros(cur)
+        conn.commit()
+        _estrutura_numeros["ok"] = True
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro ao preparar wapi_numeros: {e}")
+    finally:
+        conn.close()
+    return _estrutura_numeros["ok"]
+
+def registrar_numero(cur, telefone, id_grupo=None, grupo=None, id_cliente=None, nome_cliente=None):
+    """
+    Upsert do número (já limpo) com a interação de agora, no cursor/transação de quem chama.
+    Vínculo com cliente só é preenchido quando ainda não existe (não desfaz vínculo manual).
+    """
+    cur.execute("""
+        INSERT INTO admin.wapi_numeros (telefone, id_grupo, grupo, id_cliente, nome_cliente, data_registro, data_ultima_interacao)
+        VALUES (%s, %s, %s, %s, %s, NOW(), NOW())
+        ON CONFLICT (telefone) DO UPDATE SET
+            data_ultima_interacao = EXCLUDED.data_ultima_interacao,
+            id_grupo = COALESCE(EXCLUDED.id_grupo, wapi_numeros.id_grupo),
+            grupo = COALESCE(EXCLUDED.grupo, wapi_numeros.grupo),
+            id_cliente = COALESCE(wapi_numeros.id_cliente, EXCLUDED.id_cliente),
+            nome_cliente = CASE WHEN wapi_numeros.id_cliente IS NULL THEN EXCLUDED.nome_cliente ELSE wapi_numeros.nome_cliente END
+    """, (telefone, id_grupo, grupo, id_cliente, nome_cliente))
+
+# ==========================================================
+# 4. AVISO DE MENSAGEM NOVA (LISTEN/NOTIFY)
+# O webhook avisa no canal CANAL_MENSAGENS a cada log gravado; o chat
+# (modulo_chat) escuta e só consulta o banco quando a conversa aberta muda.
+# ==========================================================
+CANAL_MENSAGENS = "wapi_mensagens"
+
+def notificar_mensagem(cur, id_log, telefone, tipo):
+    """pg_notify na transação de quem chama: o aviso só sai no COMMIT do log."""
+    cur.execute("SELECT pg_notify(%s, %s)", (CANAL_MENSAGENS, json.dumps({"id": id_log, "telefone": telefone, "tipo": tipo})))
+
+if __name__ == "__main__":
+    # Migração única de wapi_numeros, antes de subir o webhook (que só confere se ela já rodou)
+    if sys.argv[1:] != ["migrar_numeros"]:
+        print("Uso: python modulo_wapi.py migrar_numeros"); sys.exit(2)
+    t0 = time.monotonic()
+    ok = garantir_estrutura_numeros()
+    print(f"{'✅ wapi_numeros pronta' if ok else '❌ Falha na migração de wapi_numeros'} ({time.monotonic() - t0:.1f}s)", flush=True)
+    sys.exit(0 if ok else 1)
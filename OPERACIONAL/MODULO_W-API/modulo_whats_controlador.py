@@ -8,11 +8,14 @@ import modulo_whats_numeros as nums # Novo import
 def app_wapi():
     st.markdown("## 📱 Módulo W-API")
     # Adicionada a aba "📒 Números"
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📤 Disparador", "🤖 Instâncias", "📒 Números", "📝 Modelos", "📋 Logs"])
+    tab1, tab_massa, tab2, tab3, tab4, tab5 = st.tabs(["📤 Disparador", "📦 Em Massa", "🤖 Instâncias", "📒 Números", "📝 Modelos", "📋 Logs"])
 
     with tab1:
         disp.app_disparador()
 
+    with tab_massa:
+        disp.app_disparo_massa()
+
     with tab2:
         inst.app_instancias()
         
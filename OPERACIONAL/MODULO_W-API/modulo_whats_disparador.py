@@ -4,9 +4,10 @@ import psycopg2
 import requests
 import re
 import conexao
-import base64
 # Importa o módulo WAPI para usar a função de envio e limpeza
 import modulo_wapi 
+import modulo_whats_disparo_massa as massa
+import modulo_whats_midia as midia_cache
 
 def get_conn():
     try:
@@ -67,21 +68,16 @@ def app_disparador():
                         # Processo de envio de Mídia
                         with st.spinner("Processando arquivo..."):
                             try:
-                                # Converte o arquivo para Base64
-                                bytes_data = arquivo.getvalue()
-                                b64_encoded = base64.b64encode(bytes_data).decode('utf-8')
-                                mime_type = arquivo.type
-                                
-                                # Monta a string Data URI scheme
-                                base64_full = f"data:{mime_type};base64,{b64_encoded}"
+                                # Grava em disco e codifica em base64 uma vez (cache por hash);
+                                # o envio lê o corpo do arquivo em blocos
+                                midia = midia_cache.preparar_midia(arquivo, arquivo.name, arquivo.type)
                                 
                                 # O modulo_wapi já faz a limpeza novamente por segurança
-                                res = modulo_wapi.enviar_midia_api(
+                                res = modulo_wapi.enviar_midia_preparada(
                                     row_inst['api_instance_id'], 
                                     row_inst['api_token'], 
                                     destino, 
-                                    base64_full, 
-                                    arquivo.name, 
+                                    midia, 
                                     msg
                                 )
                             except Exception as e:
@@ -109,4 +105,115 @@ def app_disparador():
         else: 
             st.warning("Nenhuma instância configurada.")
     except Exception as e: 
-        st.error(f"Erro ao carregar dados: {e}")
\ No newline at end of file
+        st.error(f"Erro ao carregar dados: {e}")
+
+# ==========================================================
+# DISPARO EM MASSA
+# ==========================================================
+@st.cache_resource
+def obter_disparador():
+    """Um disparador (alimentador + workers) por processo do Streamlit."""
+    return massa.DisparadorMassa()
+
+def _listar_campanhas():
+    conn = get_conn()
+    if not conn: return pd.DataFrame()
+    try:
+        return pd.read_sql("SELECT c.id, c.nome_campanha AS nome, s.total FROM banco_pf.pf_campanhas c JOIN banco_pf.pf_campanhas_snapshot s ON s.id_campanha = c.id ORDER BY c.nome_campanha", conn)
+    except: return pd.DataFrame()
+    finally: conn.close()
+
+def _listar_templates():
+    conn = get_conn()
+    if not conn: return pd.DataFrame()
+    try:
+        return pd.read_sql("SELECT modulo, chave_status, conteudo_mensagem FROM wapi_templates ORDER BY modulo, chave_status", conn)
+    except: return pd.DataFrame()
+    finally: conn.close()
+
+def app_disparo_massa():
+    st.markdown("### 📦 Disparo em Massa")
+    massa.garantir_estrutura()
+
+    conn = get_conn()
+    try:
+        df_inst = pd.read_sql("SELECT nome, api_instance_id FROM admin.wapi_instancias", conn)
+    except Exception as e:
+        st.error(f"Erro ao carregar instâncias: {e}"); return
+    finally:
+        if conn: conn.close()
+    if df_inst.empty:
+        st.warning("Nenhuma instância configurada."); return
+
+    with st.expander("➕ Novo Lote", expanded=True):
+        c1, c2 = st.columns(2)
+        inst_sel = c1.selectbox("Instância", df_inst['nome'].tolist(), key="massa_inst")
+        instance_id = df_inst[df_inst['nome'] == inst_sel].iloc[0]['api_instance_id']
+        origem = c2.radio("Público", ["Clientes", "Campanha PF"], horizontal=True, key="massa_origem")
+
+        destinatarios = []
+        if origem == "Clientes":
+            f1, f2 = st.columns([3, 1])
+            filtro_nome = f1.text_input("Filtrar clientes por nome (vazio = todos)", key="massa_filtro")
+            so_ativos = f2.checkbox("Só ativos", value=True, key="massa_ativos")
+            destinatarios = massa.listar_destinatarios_clientes(filtro_nome or None, so_ativos)
+            nome_padrao = f"Clientes {filtro_nome}".strip()
+        else:
+            df_camp = _listar_campanhas()
+            if df_camp.empty:
+                st.info("Nenhuma campanha com público gerado (gere o snapshot na tela de Campanhas)."); nome_padrao = ""
+            else:
+                camp_sel = st.selectbox("Campanha", df_camp['nome'].tolist(), key="massa_camp")
+                id_camp = int(df_camp[df_camp['nome'] == camp_sel].iloc[0]['id'])
+                destinatarios = massa.listar_destinatarios_campanha(id_camp)
+                nome_padrao = f"Campanha {camp_sel}"
+
+        df_tpl = _listar_templates()
+        opcoes_tpl = ["(Texto livre)"] + [f"{r['modulo']} / {r['chave_status']}" for _, r in df_tpl.iterrows()]
+        tpl_sel = st.selectbox("Modelo", opcoes_tpl, key="massa_tpl")
+        texto_base = "" if tpl_sel == "(Texto livre)" else df_tpl.iloc[opcoes_tpl.index(tpl_sel) - 1]['conteudo_mensagem']
+        modelo = st.text_area("Mensagem", value=texto_base, height=150, key=f"massa_msg_{tpl_sel}")
+        st.caption("Tags: {nome} (primeiro nome), {nome_completo}, {telefone}, {cpf}, {id_cliente}")
+
+        st.write(f"**{len(destinatarios)}** destinatário(s) com telefone.")
+        if destinatarios and modelo:
+            st.text_area("Prévia (1º destinatário)", massa.renderizar_mensagem(modelo, destinatarios[0]), disabled=True, key="massa_previa")
+
+        arquivo = st.file_uploader("Anexo (opcional) — a mensagem vira a legenda", type=['png', 'jpg', 'jpeg', 'pdf', 'mp3', 'mp4', 'ogg', 'wav'], key="massa_arquivo")
+
+        nome_lote = st.text_input("Nome do lote", value=nome_padrao, key="massa_nome")
+        if st.button("📥 Enfileirar Envio", type="primary", disabled=not (destinatarios and (modelo or arquivo))):
+            midia = midia_cache.preparar_midia(arquivo, arquivo.name, arquivo.type) if arquivo else None
+            id_lote, total = massa.enfileirar_lote(nome_lote, instance_id, modelo, destinatarios, st.session_state.get('usuario_nome'), midia=midia)
+            if id_lote:
+                st.success(f"Lote #{id_lote} criado com {total} mensagem(ns) na fila.")
+            else:
+                st.error("Não foi possível criar o lote.")
+
+    # --- Processamento ---
+    st.markdown("##### ⚙️ Processamento da Fila")
+    disparador = obter_disparador()
+    c_st, c_bt = st.columns([3, 1])
+    if disparador.em_execucao:
+        est = disparador.estatisticas
+        c_st.success(f"Em execução · enviados {est['enviados']} · reagendados {est['reagendados']} · falhas {est['falhas']}")
+        if c_bt.button("⏹️ Parar"):
+            disparador.parar(); st.rerun()
+    else:
+        c_st.info("Parado. Os lotes ficam na fila até o disparador ser iniciado (aqui ou pelo processo dedicado).")
+        if c_bt.button("▶️ Iniciar"):
+            if disparador.iniciar(): st.rerun()
+            else: st.error("Falha ao iniciar o disparador.")
+
+    lotes = massa.resumo_lotes()
+    if lotes:
+        df_lotes = pd.DataFrame(lotes, columns=["Lote", "Nome", "Instância", "Criado em", "Total", "Pendentes", "Enviando", "Enviados", "Falhas", "Cancelados"])
+        st.dataframe(df_lotes, use_container_width=True, hide_index=True)
+        c_l, c_r, c_c = st.columns([2, 1, 1])
+        lote_sel = c_l.selectbox("Lote", df_lotes['Lote'].tolist(), key="massa_lote_sel")
+        if c_r.button("🔁 Reenviar falhas"):
+            st.toast(f"{massa.reenfileirar_falhas(int(lote_sel))} item(ns) de volta à fila.")
+        if c_c.button("🚫 Cancelar pendentes"):
+            st.toast(f"{massa.cancelar_lote(int(lote_sel))} item(ns) cancelado(s).")
+        if st.button("🔄 Atualizar"): st.rerun()
+
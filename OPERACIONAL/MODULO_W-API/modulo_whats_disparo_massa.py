@@ -0,0 +1,618 @@
+import os
+import sys
+import time
+import queue
+import random
+import threading
+from collections import deque
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+import conexao
+import modulo_wapi
+import modulo_whats_midia as midia_cache
+
+# =============================================================================
+# DISPARO EM MASSA (FILA PERSISTENTE + WORKERS)
+# 1. enfileirar_lote() grava um lote em admin.wapi_fila_envio (mensagem já renderizada).
+# 2. DisparadorMassa reserva itens PENDENTES com FOR UPDATE SKIP LOCKED (vários
+#    processos podem rodar ao mesmo tempo sem enviar duas vezes o mesmo item).
+# 3. O alimentador só libera um item para os workers quando o balde de tokens
+#    da instância permite (limite_msg_minuto em admin.wapi_instancias). O balde
+#    fica no banco (admin.wapi_balde_envio, linha travada a cada consumo), então
+#    o limite vale para a instância inteira mesmo com vários processos disparando.
+# 4. Os workers fazem o POST (sessão keep-alive compartilhada do modulo_http) e gravam o
+#    resultado na fila e em admin.wapi_logs. Falha temporária volta para PENDENTE
+#    com backoff exponencial; falha definitiva (4xx) ou tentativas esgotadas = FALHA.
+#    Lote cancelado = CANCELADO (não volta com "Reenviar falhas").
+# Lote com anexo guarda só o hash da mídia (modulo_whats_midia); o base64 é lido
+# do cache em disco a cada envio, então o worker precisa rodar no mesmo servidor.
+# Uso fora do Streamlit: python modulo_whats_disparo_massa.py [--workers 4]
+# =============================================================================
+
+MAX_TENTATIVAS = 5
+BACKOFF_BASE_SEG = 30
+BACKOFF_MAX_SEG = 1800
+LIMITE_MINUTO_PADRAO = 20
+RAJADA_PADRAO = 5
+NUM_WORKERS = 4
+RESERVA_POR_INSTANCIA = 20
+INTERVALO_CONSULTA_FILA = 2.0
+INTERVALO_RECARGA_INSTANCIAS = 60
+MINUTOS_RESERVA_EXPIRADA = 10
+# Tamanhos das colunas de admin.wapi_logs gravadas pelo disparador
+TAM_NOME_CONTATO = 100
+TAM_STATUS_LOG = 50
+
+_estrutura_ok = False
+
+def get_conn():
+    try:
+        return psycopg2.connect(
+            host=conexao.host, port=conexao.port, database=conexao.database,
+            user=conexao.user, password=conexao.password
+        )
+    except Exception as e:
+        print(f"Erro de conexão DB: {e}")
+        return None
+
+# ==========================================================
+# 1. ESTRUTURA
+# ==========================================================
+def criar_tabelas_fila(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS admin.wapi_lotes_envio (
+            id SERIAL PRIMARY KEY,
+            nome VARCHAR(255),
+            instance_id VARCHAR(100),
+            mensagem_modelo TEXT,
+            total INTEGER DEFAULT 0,
+            criado_por VARCHAR(255),
+            data_criacao TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS admin.wapi_fila_envio (
+            id BIGSERIAL PRIMARY KEY,
+            id_lote INTEGER REFERENCES admin.wapi_lotes_envio(id) ON DELETE CASCADE,
+            instance_id VARCHAR(100) NOT NULL,
+            telefone VARCHAR(50) NOT NULL,
+            id_cliente TEXT,
+            nome_destino VARCHAR(255),
+            mensagem TEXT NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'PENDENTE',
+            tentativas INTEGER NOT NULL DEFAULT 0,
+            proxima_tentativa TIMESTAMP NOT NULL DEFAULT NOW(),
+            data_reserva TIMESTAMP,
+            data_envio TIMESTAMP,
+            message_id VARCHAR(255),
+            ultimo_erro TEXT,
+            id_log BIGINT,
+            UNIQUE (id_lote, telefone)
+        )
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_wapi_fila_pendentes
+        ON admin.wapi_fila_envio (instance_id, proxima_tentativa, id) WHERE status = 'PENDENTE'
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_wapi_fila_lote_status ON admin.wapi_fila_envio (id_lote, status)")
+    cur.execute("""
+        ALTER TABLE admin.wapi_fila_envio
+            ADD COLUMN IF NOT EXISTS midia_hash VARCHAR(64),
+            ADD COLUMN IF NOT EXISTS midia_nome VARCHAR(255),
+            ADD COLUMN IF NOT EXISTS midia_mime VARCHAR(100)
+    """)
+    cur.execute(f"ALTER TABLE admin.wapi_instancias ADD COLUMN IF NOT EXISTS limite_msg_minuto INTEGER DEFAULT {LIMITE_MINUTO_PADRAO}")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS admin.wapi_balde_envio (
+            instance_id VARCHAR(100) PRIMARY KEY,
+            tokens DOUBLE PRECISION NOT NULL,
+            atualizado TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+        )
+    """)
+
+def garantir_estrutura():
+    """Cria as tabelas da fila uma vez por processo."""
+    global _estrutura_ok
+    if _estrutura_ok: return True
+    conn = get_conn()
+    if not conn: return False
+    try:
+        with conn.cursor() as cur:
+            criar_tabelas_fila(cur)
+        conn.commit()
+        _estrutura_ok = True
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro ao criar estrutura da fila de envio: {e}")
+    finally:
+        conn.close()
+    return _estrutura_ok
+
+# ==========================================================
+# 2. DESTINATÁRIOS E MODELOS
+# ==========================================================
+def renderizar_mensagem(modelo, dados):
+    """Substitui as tags {chave} do modelo (mesmo padrão dos módulos de pedidos/tarefas); {nome} vira o primeiro nome."""
+    texto = modelo or ""
+    nome = str(dados.get('nome') or "").strip()
+    texto = texto.replace("{nome}", nome.split()[0].title() if nome else "")
+    texto = texto.replace("{nome_completo}", nome)
+    for chave, valor in dados.items():
+        if chave != 'nome': texto = texto.replace("{" + str(chave) + "}", "" if valor is None else str(valor))
+    return texto
+
+def listar_destinatarios_clientes(filtro_nome=None, apenas_ativos=True):
+    """Clientes de admin.clientes com telefone, no formato de enfileirar_lote."""
+    conn = get_conn()
+    if not conn: return []
+    try:
+        condicoes, params = ["COALESCE(TRIM(telefone), '') <> ''"], []
+        if apenas_ativos: condicoes.append("status = 'ATIVO'")
+        if filtro_nome:
+            condicoes.append("nome ILIKE %s")
+            params.append(f"%{filtro_nome}%")
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT id, nome, telefone FROM admin.clientes WHERE {' AND '.join(condicoes)} ORDER BY nome", params)
+            return [{'id_cliente': str(r[0]), 'nome': r[1], 'telefone': r[2]} for r in cur.fetchall()]
+    except Exception as e:
+        print(f"Erro ao listar clientes: {e}")
+        return []
+    finally:
+        conn.close()
+
+def listar_destinatarios_campanha(id_campanha):
+    """Público do snapshot da campanha PF (banco_pf.pf_campanhas_publico) com um telefone por CPF."""
+    conn = get_conn()
+    if not conn: return []
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT p.cpf, p.nome, t.numero
+                FROM banco_pf.pf_campanhas_publico p
+                JOIN LATERAL (
+                    SELECT numero FROM banco_pf.pf_telefones
+                    WHERE cpf = p.cpf AND COALESCE(TRIM(numero), '') <> ''
+                    ORDER BY id DESC LIMIT 1
+                ) t ON TRUE
+                WHERE p.id_campanha = %s
+            """, (id_campanha,))
+            return [{'cpf': r[0], 'nome': r[1], 'telefone': r[2]} for r in cur.fetchall()]
+    except Exception as e:
+        print(f"Erro ao listar público da campanha: {e}")
+        return []
+    finally:
+        conn.close()
+
+def enfileirar_lote(nome_lote, instance_id, modelo, destinatarios, criado_por=None, midia=None):
+    """
+    Grava o lote e os itens PENDENTES (um por telefone; repetidos são ignorados).
+    midia: retorno de modulo_whats_midia.preparar_midia (a mensagem vira a legenda).
+    Retorna (id_lote, total_enfileirado).
+    """
+    garantir_estrutura()
+    dados_midia = (midia['hash'], midia['nome'], midia['mime']) if midia else (None, None, None)
+    itens, vistos = [], set()
+    for dest in destinatarios:
+        telefone = modulo_wapi.limpar_telefone(dest.get('telefone'))
+        if not telefone or telefone in vistos: continue
+        vistos.add(telefone)
+        itens.append((instance_id, telefone, dest.get('id_cliente'), dest.get('nome'), renderizar_mensagem(modelo, dest)) + dados_midia)
+    if not itens: return None, 0
+
+    conn = get_conn()
+    if not conn: return None, 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO admin.wapi_lotes_envio (nome, instance_id, mensagem_modelo, total, criado_por)
+                VALUES (%s, %s, %s, %s, %s) RETURNING id
+            """, (nome_lote, instance_id, modelo, len(itens), criado_por))
+            id_lote = cur.fetchone()[0]
+            execute_values(cur, """
+                INSERT INTO admin.wapi_fila_envio (id_lote, instance_id, telefone, id_cliente, nome_destino, mensagem, midia_hash, midia_nome, midia_mime)
+                VALUES %s ON CONFLICT (id_lote, telefone) DO NOTHING
+            """, [(id_lote,) + item for item in itens], page_size=1000)
+        conn.commit()
+        return id_lote, len(itens)
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro ao enfileirar lote: {e}")
+        return None, 0
+    finally:
+        conn.close()
+
+def resumo_lotes(limite=20):
+    """[(id, nome, instance_id, data_criacao, total, pendentes, enviando, enviados, falhas, cancelados)] dos últimos lotes."""
+    conn = get_conn()
+    if not conn: return []
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT l.id, l.nome, l.instance_id, l.data_criacao, l.total,
+                       COUNT(*) FILTER (WHERE f.status = 'PENDENTE'),
+                       COUNT(*) FILTER (WHERE f.status = 'ENVIANDO'),
+                       COUNT(*) FILTER (WHERE f.status = 'ENVIADO'),
+                       COUNT(*) FILTER (WHERE f.status = 'FALHA'),
+                       COUNT(*) FILTER (WHERE f.status = 'CANCELADO')
+                FROM admin.wapi_lotes_envio l
+                LEFT JOIN admin.wapi_fila_envio f ON f.id_lote = l.id
+                GROUP BY l.id ORDER BY l.id DESC LIMIT %s
+            """, (limite,))
+            return cur.fetchall()
+    except Exception as e:
+        print(f"Erro ao resumir lotes: {e}")
+        return []
+    finally:
+        conn.close()
+
+def reenfileirar_falhas(id_lote):
+    """Volta os itens com FALHA do lote para PENDENTE, zerando as tentativas."""
+    conn = get_conn()
+    if not conn: return 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE admin.wapi_fila_envio SET status = 'PENDENTE', tentativas = 0, proxima_tentativa = NOW()
+                WHERE id_lote = %s AND status = 'FALHA'
+            """, (id_lote,))
+            n = cur.rowcount
+        conn.commit()
+        return n
+    finally:
+        conn.close()
+
+def cancelar_lote(id_lote):
+    """Marca como CANCELADO os itens do lote que ainda não saíram (reenfileirar_falhas não os traz de volta)."""
+    conn = get_conn()
+    if not conn: return 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE admin.wapi_fila_envio SET status = 'CANCELADO', ultimo_erro = 'Cancelado pelo usuário'
+                WHERE id_lote = %s AND status = 'PENDENTE'
+            """, (id_lote,))
+            n = cur.rowcount
+        conn.commit()
+        return n
+    finally:
+        conn.close()
+
+# ==========================================================
+# 3. LIMITE DE TAXA E CLASSIFICAÇÃO DE ERROS
+# ==========================================================
+class BaldeTokens:
+    """
+    Token bucket da instância guardado em admin.wapi_balde_envio: rajada de até `capacidade`
+    envios e reposição de `por_minuto` tokens por minuto. O consumo trava a linha da
+    instância (FOR UPDATE), então processos diferentes dividem o mesmo limite.
+    """
+
+    def __init__(self, instance_id, por_minuto, capacidade):
+        self.instance_id = instance_id
+        self.taxa = max(por_minuto, 1) / 60.0
+        self.capacidade = max(capacidade, 1)
+        self.disponivel = 0.0
+        self.consultado = time.monotonic()
+
+    def ajustar(self, por_minuto, capacidade):
+        self.taxa = max(por_minuto, 1) / 60.0
+        self.capacidade = max(capacidade, 1)
+
+    def tentar_consumir(self, conn):
+        """Repõe e consome um token no banco (transação própria). True se o envio pode sair."""
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO admin.wapi_balde_envio (instance_id, tokens) VALUES (%s, %s)
+                ON CONFLICT (instance_id) DO NOTHING
+            """, (self.instance_id, float(self.capacidade)))
+            cur.execute("""
+                SELECT LEAST(%s, tokens + EXTRACT(EPOCH FROM clock_timestamp() - atualizado) * %s)
+                FROM admin.wapi_balde_envio WHERE instance_id = %s FOR UPDATE
+            """, (float(self.capacidade), self.taxa, self.instance_id))
+            disponivel = float(cur.fetchone()[0])
+            liberado = disponivel >= 1
+            if liberado: disponivel -= 1
+            cur.execute("UPDATE admin.wapi_balde_envio SET tokens = %s, atualizado = clock_timestamp() WHERE instance_id = %s",
+                        (disponivel, self.instance_id))
+        conn.commit()
+        self.disponivel, self.consultado = disponivel, time.monotonic()
+        return liberado
+
+    def espera_proximo(self):
+        """Segundos até o próximo token (estimado pela última leitura do banco)."""
+        decorrido = time.monotonic() - self.consultado
+        return max(0.0, (1 - self.disponivel) / self.taxa - decorrido)
+
+def envio_ok(res):
+    return isinstance(res, dict) and bool(res.get('messageId') or res.get('success'))
+
+def erro_definitivo(res):
+    """4xx (exceto 408/429) não adianta repetir: número inválido, token errado etc."""
+    codigo = res.get('status_code') if isinstance(res, dict) else None
+    return codigo is not None and 400 <= codigo < 500 and codigo not in (408, 429)
+
+def calcular_backoff(tentativas):
+    """Backoff exponencial com jitter (evita que todos os itens voltem juntos)."""
+    base = min(BACKOFF_MAX_SEG, BACKOFF_BASE_SEG * (2 ** max(tentativas - 1, 0)))
+    return base / 2 + random.uniform(0, base / 2)
+
+# ==========================================================
+# 4. DISPARADOR
+# ==========================================================
+class DisparadorMassa:
+    """
+    Alimentador (1 thread) + workers (num_workers threads).
+    O alimentador reserva itens no banco por instância, segura cada item até o
+    balde da instância liberar e então o entrega aos workers pela fila em memória.
+    """
+
+    def __init__(self, num_workers=NUM_WORKERS, reserva_por_instancia=RESERVA_POR_INSTANCIA):
+        self.num_workers = num_workers
+        self.reserva_por_instancia = reserva_por_instancia
+        self.parar_evento = threading.Event()
+        self.fila_trabalho = queue.Queue(maxsize=num_workers * 2)
+        self.buffers = {}
+        self.baldes = {}
+        self.instancias = {}
+        self.limites = {}
+        self.instancias_em = 0.0
+        self.threads = []
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.estatisticas = {'enviados': 0, 'reagendados': 0, 'falhas': 0}
+
+    # --- ciclo de vida ---
+    @property
+    def em_execucao(self):
+        return any(t.is_alive() for t in self.threads)
+
+    def iniciar(self):
+        if self.em_execucao: return False
+        if not garantir_estrutura(): return False
+        self.parar_evento.clear()
+        self._liberar_reservas_expiradas()
+        em_uso = self._midias_em_uso()
+        if em_uso is not None: midia_cache.limpar_cache_antigo(preservar=em_uso)
+        self.threads = [threading.Thread(target=self._loop_alimentador, name="wapi-alimentador", daemon=True)]
+        self.threads += [threading.Thread(target=self._loop_worker, name=f"wapi-worker-{i}", daemon=True) for i in range(self.num_workers)]
+        for t in self.threads: t.start()
+        return True
+
+    def parar(self, aguardar=True):
+        self.parar_evento.set()
+        if aguardar:
+            for t in self.threads: t.join(timeout=15)
+
+    def _contar(self, chave):
+        with self.lock: self.estatisticas[chave] += 1
+
+    # --- banco ---
+    def _conn_thread(self):
+        """Conexão persistente por thread (reaberta se cair)."""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or conn.closed:
+            conn = self.local.conn = get_conn()
+        return conn
+
+    def _liberar_reservas_expiradas(self):
+        """Itens presos em ENVIANDO (processo derrubado no meio do envio) voltam para a fila."""
+        conn = get_conn()
+        if not conn: return
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    UPDATE admin.wapi_fila_envio SET status = 'PENDENTE', proxima_tentativa = NOW()
+                    WHERE status = 'ENVIANDO' AND data_reserva < NOW() - INTERVAL '{MINUTOS_RESERVA_EXPIRADA} minutes'
+                """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _midias_em_uso(self):
+        """Hashes de mídia de itens que ainda vão sair (None se o banco não respondeu: aí não se limpa nada)."""
+        conn = get_conn()
+        if not conn: return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT DISTINCT midia_hash FROM admin.wapi_fila_envio
+                    WHERE status IN ('PENDENTE', 'ENVIANDO') AND midia_hash IS NOT NULL
+                """)
+                return {r[0] for r in cur.fetchall()}
+        except Exception as e:
+            print(f"Erro ao listar mídias da fila: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def _recarregar_instancias(self, cur):
+        cur.execute(f"""
+            SELECT api_instance_id, api_token, COALESCE(limite_msg_minuto, {LIMITE_MINUTO_PADRAO})
+            FROM admin.wapi_instancias WHERE api_instance_id IS NOT NULL
+        """)
+        self.instancias, self.limites = {}, {}
+        for instance_id, token, limite in cur.fetchall():
+            self.instancias[instance_id] = token
+            self.limites[instance_id] = limite
+            rajada = min(RAJADA_PADRAO, max(limite, 1))
+            if instance_id in self.baldes: self.baldes[instance_id].ajustar(limite, rajada)
+            else: self.baldes[instance_id] = BaldeTokens(instance_id, limite, rajada)
+        self.instancias_em = time.monotonic()
+
+    def _reservar(self, cur, instance_id, limite):
+        cur.execute("""
+            UPDATE admin.wapi_fila_envio f
+            SET status = 'ENVIANDO', tentativas = f.tentativas + 1, data_reserva = NOW()
+            FROM (
+                SELECT id FROM admin.wapi_fila_envio
+                WHERE status = 'PENDENTE' AND instance_id = %s AND proxima_tentativa <= NOW()
+                ORDER BY proxima_tentativa, id
+                LIMIT %s FOR UPDATE SKIP LOCKED
+            ) s
+            WHERE f.id = s.id
+            RETURNING f.id, f.instance_id, f.telefone, f.mensagem, f.tentativas, f.id_cliente, f.nome_destino,
+                      f.midia_hash, f.midia_nome, f.midia_mime
+        """, (instance_id, limite))
+        return cur.fetchall()
+
+    def _devolver_buffers(self):
+        """Na parada, o que foi reservado e não saiu volta para PENDENTE sem contar tentativa."""
+        ids = [item[0] for buf in self.buffers.values() for item in buf]
+        while True:
+            try: ids.append(self.fila_trabalho.get_nowait()[0])
+            except queue.Empty: break
+        self.buffers = {}
+        if not ids: return
+        conn = get_conn()
+        if not conn: return
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE admin.wapi_fila_envio SET status = 'PENDENTE', tentativas = GREATEST(tentativas - 1, 0)
+                    WHERE id = ANY(%s) AND status = 'ENVIANDO'
+                """, (ids,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    # --- threads ---
+    def _loop_alimentador(self):
+        ultima_consulta = 0.0
+        while not self.parar_evento.is_set():
+            try:
+                conn = self._conn_thread()
+                if conn is None:
+                    self.parar_evento.wait(5); continue
+
+                agora = time.monotonic()
+                if agora - self.instancias_em > INTERVALO_RECARGA_INSTANCIAS:
+                    with conn.cursor() as cur: self._recarregar_instancias(cur)
+                    conn.commit()
+
+                if agora - ultima_consulta >= INTERVALO_CONSULTA_FILA:
+                    ultima_consulta = agora
+                    with conn.cursor() as cur:
+                        for instance_id in self.instancias:
+                            buf = self.buffers.setdefault(instance_id, deque())
+                            # No máximo ~1 minuto de envios reservado por instância (itens parados em
+                            # ENVIANDO por muito tempo seriam tomados como reserva expirada)
+                            falta = min(self.reserva_por_instancia, max(self.limites.get(instance_id, 1), 1)) - len(buf)
+                            if falta > 0: buf.extend(self._reservar(cur, instance_id, falta))
+                    conn.commit()
+
+                espera = INTERVALO_CONSULTA_FILA
+                for instance_id, buf in self.buffers.items():
+                    balde = self.baldes.get(instance_id)
+                    while buf and balde and not self.fila_trabalho.full() and balde.tentar_consumir(conn):
+                        self.fila_trabalho.put(buf.popleft())
+                    if buf and balde: espera = min(espera, balde.espera_proximo())
+                self.parar_evento.wait(max(espera, 0.05))
+            except Exception as e:
+                print(f"Erro no alimentador da fila W-API: {e}")
+                try: self.local.conn.close()
+                except Exception: pass
+                self.local.conn = None
+                self.parar_evento.wait(5)
+        self._devolver_buffers()
+
+    def _loop_worker(self):
+        while not self.parar_evento.is_set():
+            try:
+                item = self.fila_trabalho.get(timeout=1)
+            except queue.Empty:
+                continue
+            id_item = item[0]
+            res = self._enviar(item)
+            try:
+                self._registrar_resultado(item, res)
+            except Exception as e:
+                print(f"Erro ao registrar envio {id_item}: {e}")
+                try: self.local.conn.close()
+                except Exception: pass
+                self.local.conn = None
+
+    def _enviar(self, item):
+        """POST de um item reservado. O telefone da fila já está limpo (enfileirar_lote): não limpa de novo."""
+        _, instance_id, telefone, mensagem, _, _, _, midia_hash, midia_nome, midia_mime = item
+        token = self.instancias.get(instance_id)
+        if token is None:
+            return {'success': False, 'error': f'Instância {instance_id} não cadastrada', 'status_code': 404}
+        if midia_hash:
+            midia = midia_cache.obter_midia(midia_hash, midia_nome, midia_mime)
+            if midia is None:
+                return {'success': False, 'error': f'Mídia {midia_nome} não está no cache deste servidor', 'status_code': 404}
+            return modulo_wapi.enviar_midia_preparada(instance_id, token, telefone, midia, mensagem, telefone_limpo=True)
+        return modulo_wapi.enviar_msg_api(instance_id, token, telefone, mensagem, telefone_limpo=True)
+
+    def _registrar_resultado(self, item, res):
+        """Grava o resultado na fila (commit próprio) e só depois o log: falha no log não reenvia a mensagem."""
+        id_item, instance_id, telefone, mensagem, tentativas, id_cliente, nome_destino, midia_hash, midia_nome, _ = item
+        if midia_hash: mensagem = f"[Mídia: {midia_nome}] {mensagem}".strip()
+        conn = self._conn_thread()
+        if conn is None: raise RuntimeError("sem conexão com o banco")
+
+        status_log = None
+        with conn.cursor() as cur:
+            if envio_ok(res):
+                cur.execute("""
+                    UPDATE admin.wapi_fila_envio SET status = 'ENVIADO', data_envio = NOW(), message_id = %s, ultimo_erro = NULL
+                    WHERE id = %s
+                """, (str(res.get('messageId') or ''), id_item))
+                status_log = 'Sucesso'
+                self._contar('enviados')
+            else:
+                erro = str(res.get('error') or res.get('message') or res)[:500] if isinstance(res, dict) else str(res)[:500]
+                if erro_definitivo(res) or tentativas >= MAX_TENTATIVAS:
+                    cur.execute("UPDATE admin.wapi_fila_envio SET status = 'FALHA', ultimo_erro = %s WHERE id = %s", (erro, id_item))
+                    status_log = f"Falha: {erro}"
+                    self._contar('falhas')
+                else:
+                    cur.execute("""
+                        UPDATE admin.wapi_fila_envio
+                        SET status = 'PENDENTE', ultimo_erro = %s, proxima_tentativa = NOW() + make_interval(secs => %s)
+                        WHERE id = %s
+                    """, (erro, calcular_backoff(tentativas), id_item))
+                    self._contar('reagendados')
+        conn.commit()
+        if status_log: self._gravar_log(conn, id_item, instance_id, telefone, nome_destino, mensagem, status_log, id_cliente)
+
+    def _gravar_log(self, conn, id_item, instance_id, telefone, nome_destino, mensagem, status_log, id_cliente):
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    WITH log AS (
+                        INSERT INTO admin.wapi_logs (data_hora, instance_id, telefone, nome_contato, mensagem, tipo, status, id_cliente)
+                        VALUES (NOW(), %s, %s, %s, %s, 'ENVIADA', %s, %s) RETURNING id
+                    )
+                    UPDATE admin.wapi_fila_envio SET id_log = (SELECT id FROM log) WHERE id = %s
+                """, (instance_id, telefone, (nome_destino or "")[:TAM_NOME_CONTATO] or None, mensagem,
+                      status_log[:TAM_STATUS_LOG], id_cliente, id_item))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Erro ao gravar log do envio {id_item} (resultado já gravado na fila): {e}")
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Processa a fila de disparo em massa da W-API até ser interrompido (Ctrl+C).")
+    ap.add_argument("--workers", type=int, default=NUM_WORKERS)
+    args = ap.parse_args()
+
+    disparador = DisparadorMassa(num_workers=args.workers)
+    if not disparador.iniciar():
+        print("❌ Não foi possível iniciar (verifique a conexão com o banco).")
+        sys.exit(1)
+    print(f"🚀 Disparador iniciado com {args.workers} workers. Ctrl+C para parar.", flush=True)
+    try:
+        while True:
+            time.sleep(30)
+            print(f"📊 {disparador.estatisticas}", flush=True)
+    except KeyboardInterrupt:
+        print("⏹️ Parando...", flush=True)
+        disparador.parar()
@@ -2,10 +2,16 @@ import streamlit as st
 import pandas as pd
 import psycopg2
 import time
-import requests
 import conexao
 # Importa o módulo central da W-API para usar a limpeza
 import modulo_wapi
+import modulo_whats_saude as saude
+import modulo_whats_roteador as roteador
+
+try:
+    import modulo_busca_indices
+except ImportError:
+    modulo_busca_indices = None
 
 def get_conn():
     try:
@@ -53,6 +59,7 @@ def dialog_editar(id_db, nome, inst_id, token):
             conn = get_conn(); cur = conn.cursor()
             cur.execute("UPDATE admin.wapi_instancias SET nome=%s, api_instance_id=%s, api_token=%s WHERE id=%s", (new_nome, new_id, new_token, id_db))
             conn.commit(); conn.close()
+            roteador.invalidar()
             st.success("Configurações atualizadas!")
             time.sleep(1); st.rerun()
         except Exception as e: st.error(f"Erro ao salvar: {e}")
@@ -60,18 +67,49 @@ def dialog_editar(id_db, nome, inst_id, token):
 # --- INTERFACE ---
 def app_instancias():
     st.markdown("### 🤖 Gerenciar Instâncias")
+    # Status vem do monitor em segundo plano (modulo_whats_saude); a tela só lê o banco
+    saude.garantir_estrutura()
+    saude.iniciar_monitor()
+    # Índice da fixação destinatário -> instância usada pelo roteador
+    if modulo_busca_indices: modulo_busca_indices.garantir_indices_busca('admin')
     try:
         conn = get_conn()
-        df_list = pd.read_sql("SELECT id, nome, api_instance_id, api_token, status FROM admin.wapi_instancias", conn)
+        df_list = pd.read_sql("SELECT id, nome, api_instance_id, api_token, status, status_verificado_em, latencia_ms FROM admin.wapi_instancias ORDER BY nome", conn)
         conn.close()
 
+        c_resumo, c_botao = st.columns([3, 1])
+        if c_botao.button("🩺 Verificar todas agora"):
+            with st.spinner("Consultando todas as instâncias..."):
+                saude.verificar_todas()
+            st.rerun()
+
         if not df_list.empty:
+            disp_24h = saude.disponibilidade(24)
+            # Uma consulta para todas: o Streamlit executa o corpo dos expanders mesmo fechados
+            hist_24h = saude.historico_instancias(24)
+            online = int((df_list['status'] == 'conectado').sum())
+            c_resumo.markdown(f"**{online}/{len(df_list)}** instâncias conectadas · monitor {'ativo' if saude.monitor_ativo() else 'parado'} (a cada {saude.INTERVALO_VERIFICACAO}s)")
+            vazao = roteador.estatisticas_roteador()
+
             for _, inst in df_list.iterrows():
                 # Define cor do status para facilitar visualização
                 status_bd = inst.get('status', 'N/A')
                 cor_status = "green" if status_bd == 'conectado' else "red"
+                verificado = pd.to_datetime(inst['status_verificado_em']).strftime('%d/%m %H:%M:%S') if pd.notna(inst['status_verificado_em']) else "nunca"
+                latencia = f"{int(inst['latencia_ms'])} ms" if pd.notna(inst['latencia_ms']) else "-"
+                perc_24h = f" | 24h: {disp_24h[inst['id']][0]:.0f}%" if inst['id'] in disp_24h else ""
                 
-                with st.expander(f"Instância: **{inst['nome']}** | Status DB: :{cor_status}[{status_bd}]"):
+                with st.expander(f"Instância: **{inst['nome']}** | :{cor_status}[{status_bd}] | {latencia} | verificado {verificado}{perc_24h}"):
+                    hist = hist_24h.get(inst['id'])
+                    if hist:
+                        df_hist = pd.DataFrame(hist, columns=["data_hora", "status", "latencia_ms"]).set_index("data_hora")
+                        st.line_chart(df_hist[["latencia_ms"]], height=150)
+                        quedas = int((df_hist['status'] != 'conectado').sum())
+                        if quedas: st.caption(f"⚠️ {quedas} verificação(ões) sem conexão nas últimas 24h.")
+                    v = vazao.get(inst['api_instance_id'])
+                    if v:
+                        st.caption(f"📤 Envios deste processo (avulsos + disparo em massa): {v['enviados']} ok / {v['falhas']} falha(s) · "
+                                   f"{v['por_minuto']:.0f}/min · {v['latencia_media_ms']:.0f} ms em média · peso {v['peso']}")
                     
                     # --- BOTÃO CARREGAR INFO ---
                     if st.button("🔄 Carregar Info / Verificar Status", key=f"info_{inst['id']}"):
@@ -140,12 +178,12 @@ def app_instancias():
                         
                         if st.button("📊 Forçar Webhook", key=f"st_{inst['id']}"):
                             try:
-                                url = f"https://api.w-api.app/v1/webhook/update-webhook-message-status?instanceId={inst['api_instance_id']}"
+                                url = f"{modulo_wapi.BASE_URL}/webhook/update-webhook-message-status?instanceId={inst['api_instance_id']}"
                                 headers = {
                                     "Content-Type": "application/x-www-form-urlencoded",
                                     "Authorization": f"Bearer {inst['api_token']}"
                                 }
-                                response = requests.post(url, headers=headers)
+                                response = modulo_wapi.cliente_http.post(url, "wapi.update-webhook", headers=headers)
                                 try:
                                     res_json = response.json()
                                     if res_json.get("error") is False:
@@ -165,6 +203,7 @@ def app_instancias():
                             conn = get_conn(); cur = conn.cursor()
                             cur.execute("DELETE FROM admin.wapi_instancias WHERE id=%s", (inst['id'],))
                             conn.commit(); conn.close()
+                            roteador.invalidar()
                             st.warning("Removida."); time.sleep(1); st.rerun()
         else: st.info("Nenhuma instância cadastrada.")
     except Exception as e: 
@@ -0,0 +1,392 @@
+import os
+import re
+import sys
+import csv
+import gzip
+import time
+import threading
+from datetime import date
+
+import psycopg2
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+import conexao
+
+# =============================================================================
+# PARTICIONAMENTO MENSAL DE admin.wapi_logs
+# A tabela vira particionada por RANGE (data_hora), uma partição por mês
+# (admin.wapi_logs_AAAA_MM) e uma padrão (admin.wapi_logs_padrao) para datas
+# nulas ou fora das faixas criadas. Quem lê e grava continua usando
+# admin.wapi_logs; consultas por data_hora só abrem as partições do período.
+#
+# - migrar(): converte a tabela atual (uma vez). Copia os meses fechados sem
+#   travar o webhook; um gatilho temporário anota as linhas alteradas durante a
+#   cópia, que são ressincronizadas antes da trava. Com a tabela antiga travada
+#   para escrita rodam só a cópia do mês corrente, a ressincronização do que
+#   mudou desde a passada anterior e a troca de nomes. A antiga fica como
+#   wapi_logs_antiga.
+# - manter(): cria as partições dos próximos MESES_FUTUROS meses e arquiva
+#   as que passaram de MESES_RETENCAO meses.
+# - ATENÇÃO: arquivar APAGA a partição do banco. Por padrão não arquiva nada
+#   (MESES_RETENCAO = 0); só liga com WAPI_LOGS_MESES_RETENCAO=N definido no
+#   ambiente do webhook ou com --retencao N na linha de comando.
+# - arquivar: cada partição vira PASTA_ARQUIVO/wapi_logs_AAAA_MM.csv.gz
+#   (COPY ... CSV HEADER). O arquivo é relido e só com a mesma quantidade de
+#   linhas da partição ela é desanexada e apagada. Para consultar de
+#   novo: COPY admin.wapi_logs FROM ... WITH (FORMAT csv, HEADER) com o arquivo
+#   descompactado.
+# Uso fora do Streamlit: python modulo_whats_logs_particao.py migrar|manter [--retencao N]
+# =============================================================================
+
+TABELA = "admin.wapi_logs"
+PARTICAO_PADRAO = "wapi_logs_padrao"
+MESES_FUTUROS = 3
+# 0 = nunca arquivar/apagar (padrão); arquivamento só com a variável definida
+MESES_RETENCAO = int(os.environ.get("WAPI_LOGS_MESES_RETENCAO", "0"))
+PASTA_ARQUIVO = os.environ.get("WAPI_LOGS_PASTA_ARQUIVO", os.path.join(BASE_DIR, "ARQUIVO_WAPI_LOGS"))
+INTERVALO_MANUTENCAO = 6 * 3600
+# Colunas que as telas/webhook alteram depois do INSERT (ressincronizadas na troca)
+COLUNAS_ALTERAVEIS = ('telefone', 'id_cliente', 'nome_cliente', 'grupo')
+# Linhas alteradas durante a migração (preenchida pelo gatilho temporário)
+TABELA_ALTERADAS = "admin.wapi_logs_alteradas_migracao"
+# Índices recriados na tabela particionada (mesmos nomes do grupo 'admin' de modulo_busca_indices)
+INDICES_LOGS = [
+    ('idx_wapi_logs_telefone_data', 'telefone, data_hora DESC'),
+    ('idx_wapi_logs_data_hora', 'data_hora DESC'),
+]
+
+_estado = {"lock": threading.Lock(), "thread": None, "parar": threading.Event()}
+
+def get_conn():
+    try:
+        return psycopg2.connect(
+            host=conexao.host, port=conexao.port, database=conexao.database,
+            user=conexao.user, password=conexao.password
+        )
+    except Exception as e:
+        print(f"Erro de conexão DB: {e}")
+        return None
+
+# ==========================================================
+# AUXILIARES
+# ==========================================================
+def _somar_meses(inicio, meses):
+    total = inicio.year * 12 + inicio.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+def _nome_particao(inicio):
+    return f"wapi_logs_{inicio:%Y_%m}"
+
+def tabela_particionada(cur, tabela=TABELA):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (tabela,))
+    res = cur.fetchone()
+    return bool(res) and res[0] == 'p'
+
+def listar_particoes(cur, tabela=TABELA):
+    """[(nome, inicio_do_mes)] das partições mensais, em ordem (sem a padrão)."""
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (tabela,))
+    particoes = []
+    for (nome,) in cur.fetchall():
+        m = re.fullmatch(r"wapi_logs_(\d{4})_(\d{2})", nome)
+        if m: particoes.append((nome, date(int(m.group(1)), int(m.group(2)), 1)))
+    return sorted(particoes, key=lambda p: p[1])
+
+def criar_particao(cur, inicio, tabela=TABELA):
+    """
+    Cria a partição do mês de `inicio` (se não existir). Se a partição padrão já tiver
+    linhas desse mês, elas são movidas para a nova partição antes de anexá-la.
+    """
+    nome, fim = _nome_particao(inicio), _somar_meses(inicio, 1)
+    cur.execute("SELECT to_regclass(%s)", (f"admin.{nome}",))
+    if cur.fetchone()[0]: return False
+
+    cur.execute("SELECT to_regclass(%s)", (f"admin.{PARTICAO_PADRAO}",))
+    tem_padrao = cur.fetchone()[0] is not None
+    if tem_padrao:
+        cur.execute(f"SELECT EXISTS (SELECT 1 FROM admin.{PARTICAO_PADRAO} WHERE data_hora >= %s AND data_hora < %s)", (inicio, fim))
+        tem_padrao = cur.fetchone()[0]
+
+    if tem_padrao:
+        cur.execute(f"CREATE TABLE admin.{nome} (LIKE {tabela} INCLUDING DEFAULTS)")
+        cur.execute(f"""
+            WITH movidas AS (DELETE FROM admin.{PARTICAO_PADRAO} WHERE data_hora >= %s AND data_hora < %s RETURNING *)
+            INSERT INTO admin.{nome} SELECT * FROM movidas
+        """, (inicio, fim))
+        cur.execute(f"ALTER TABLE {tabela} ATTACH PARTITION admin.{nome} FOR VALUES FROM (%s) TO (%s)", (inicio, fim))
+    else:
+        cur.execute(f"CREATE TABLE admin.{nome} PARTITION OF {tabela} FOR VALUES FROM (%s) TO (%s)", (inicio, fim))
+    return True
+
+# ==========================================================
+# MIGRAÇÃO (TABELA COMUM -> PARTICIONADA)
+# ==========================================================
+def _criar_rastreio_alteracoes(cur):
+    """Gatilho temporário na tabela antiga: cada UPDATE anota (id, data_hora) em TABELA_ALTERADAS."""
+    cur.execute(f"DROP TABLE IF EXISTS {TABELA_ALTERADAS}")
+    cur.execute(f"CREATE UNLOGGED TABLE {TABELA_ALTERADAS} AS SELECT id, data_hora FROM {TABELA} WITH NO DATA")
+    cur.execute(f"ALTER TABLE {TABELA_ALTERADAS} ADD COLUMN seq BIGSERIAL")
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION admin.wapi_logs_anotar_alteracao() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO {TABELA_ALTERADAS} (id, data_hora) VALUES (NEW.id, NEW.data_hora);
+            RETURN NULL;
+        END $$
+    """)
+    cur.execute(f"DROP TRIGGER IF EXISTS trg_wapi_logs_migracao ON {TABELA}")
+    cur.execute(f"CREATE TRIGGER trg_wapi_logs_migracao AFTER UPDATE ON {TABELA} FOR EACH ROW EXECUTE FUNCTION admin.wapi_logs_anotar_alteracao()")
+
+def _remover_rastreio_alteracoes(cur, tabela=TABELA):
+    cur.execute(f"DROP TRIGGER IF EXISTS trg_wapi_logs_migracao ON {tabela}")
+    cur.execute("DROP FUNCTION IF EXISTS admin.wapi_logs_anotar_alteracao()")
+    cur.execute(f"DROP TABLE IF EXISTS {TABELA_ALTERADAS}")
+
+def _ressincronizar(cur, nova, apos_seq):
+    """Copia para a nova as COLUNAS_ALTERAVEIS das linhas anotadas depois de `apos_seq`. Retorna (linhas, último seq)."""
+    cur.execute(f"SELECT COALESCE(MAX(seq), %s) FROM {TABELA_ALTERADAS}", (apos_seq,))
+    ate_seq = cur.fetchone()[0]
+    if ate_seq <= apos_seq: return 0, apos_seq
+    atribuicoes = ", ".join(f"{c} = a.{c}" for c in COLUNAS_ALTERAVEIS)
+    valores_novos = ", ".join(f"n.{c}" for c in COLUNAS_ALTERAVEIS)
+    valores_antigos = ", ".join(f"a.{c}" for c in COLUNAS_ALTERAVEIS)
+    cur.execute(f"""
+        UPDATE {nova} n SET {atribuicoes}
+        FROM {TABELA} a
+        WHERE n.id = a.id AND n.data_hora = a.data_hora
+          AND (a.id, a.data_hora) IN (SELECT id, data_hora FROM {TABELA_ALTERADAS} WHERE seq > %s AND seq <= %s)
+          AND ({valores_novos}) IS DISTINCT FROM ({valores_antigos})
+    """, (apos_seq, ate_seq))
+    return cur.rowcount, ate_seq
+
+def migrar(meses_futuros=MESES_FUTUROS, log=print):
+    """
+    Converte admin.wapi_logs em tabela particionada por mês. Retorna True se converteu
+    (False se já era particionada ou se deu erro; a tabela original fica intacta em caso de erro).
+    Views que dependam de admin.wapi_logs continuam apontando para wapi_logs_antiga.
+    """
+    conn = get_conn()
+    if not conn: return False
+    nova = "admin.wapi_logs_nova"
+    try:
+        with conn.cursor() as cur:
+            if tabela_particionada(cur):
+                log("admin.wapi_logs já é particionada."); return False
+
+            cur.execute("""
+                SELECT column_name FROM information_schema.columns
+                WHERE table_schema = 'admin' AND table_name = 'wapi_logs' ORDER BY ordinal_position
+            """)
+            colunas = ", ".join(f'"{c}"' for (c,) in cur.fetchall())
+            cur.execute(f"SELECT MIN(data_hora)::date, pg_get_serial_sequence('{TABELA}', 'id') FROM {TABELA}")
+            menor_data, sequencia_antiga = cur.fetchone()
+
+            # Estrutura nova: mesmas colunas/defaults; unicidade de (id, data_hora) porque a
+            # chave de uma tabela particionada precisa conter a coluna de partição
+            cur.execute(f"DROP TABLE IF EXISTS {nova}")
+            cur.execute(f"CREATE TABLE {nova} (LIKE {TABELA} INCLUDING DEFAULTS INCLUDING IDENTITY) PARTITION BY RANGE (data_hora)")
+            cur.execute(f"CREATE UNIQUE INDEX wapi_logs_nova_id_data ON {nova} (id, data_hora)")
+            cur.execute(f"CREATE TABLE admin.{PARTICAO_PADRAO}_nova PARTITION OF {nova} DEFAULT")
+
+            mes_atual = date.today().replace(day=1)
+            inicio = (menor_data or mes_atual).replace(day=1)
+            while inicio <= _somar_meses(mes_atual, meses_futuros):
+                cur.execute(f"CREATE TABLE admin.{_nome_particao(inicio)}_nova PARTITION OF {nova} FOR VALUES FROM (%s) TO (%s)",
+                            (inicio, _somar_meses(inicio, 1)))
+                inicio = _somar_meses(inicio, 1)
+            for nome_idx, expressao in INDICES_LOGS:
+                cur.execute(f"CREATE INDEX {nome_idx}_nova ON {nova} ({expressao})")
+            # Antes da cópia: o que for alterado a partir daqui é anotado e ressincronizado
+            _criar_rastreio_alteracoes(cur)
+        conn.commit()
+
+        # Meses fechados: um mês por transação, com o webhook gravando normalmente
+        inicio = (menor_data or mes_atual).replace(day=1)
+        with conn.cursor() as cur:
+            while inicio < mes_atual:
+                t0 = time.monotonic()
+                cur.execute(f"INSERT INTO {nova} ({colunas}) SELECT {colunas} FROM {TABELA} WHERE data_hora >= %s AND data_hora < %s",
+                            (inicio, _somar_meses(inicio, 1)))
+                conn.commit()
+                log(f"   {inicio:%Y-%m}: {cur.rowcount} linha(s) em {time.monotonic() - t0:.1f}s")
+                inicio = _somar_meses(inicio, 1)
+
+        # Ressincroniza sem trava o que mudou durante a cópia dos meses fechados
+        with conn.cursor() as cur:
+            ressincronizadas, ult_seq = _ressincronizar(cur, nova, 0)
+        conn.commit()
+        log(f"   ressincronizadas (vínculo/telefone alterados durante a cópia): {ressincronizadas} linha(s)")
+
+        # Troca: trava escrita (leitura continua), copia o mês corrente e só o delta anotado desde a passada acima
+        with conn.cursor() as cur:
+            cur.execute(f"LOCK TABLE {TABELA} IN EXCLUSIVE MODE")
+            cur.execute(f"INSERT INTO {nova} ({colunas}) SELECT {colunas} FROM {TABELA} WHERE data_hora >= %s OR data_hora IS NULL", (mes_atual,))
+            log(f"   mês corrente e sem data: {cur.rowcount} linha(s)")
+            ressincronizadas, _ = _ressincronizar(cur, nova, ult_seq)
+            log(f"   ressincronizadas sob trava: {ressincronizadas} linha(s)")
+
+            cur.execute(f"ALTER TABLE {TABELA} RENAME TO wapi_logs_antiga")
+            _remover_rastreio_alteracoes(cur, "admin.wapi_logs_antiga")
+            cur.execute("""
+                SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE i.indrelid = 'admin.wapi_logs_antiga'::regclass
+            """)
+            for (nome_idx,) in cur.fetchall():
+                if nome_idx.startswith("wapi_logs_") or nome_idx.startswith("idx_wapi_logs_"):
+                    cur.execute(f'ALTER INDEX admin."{nome_idx}" RENAME TO "{nome_idx}_antiga"')
+
+            cur.execute(f"ALTER TABLE {nova} RENAME TO wapi_logs")
+            cur.execute("ALTER INDEX admin.wapi_logs_nova_id_data RENAME TO wapi_logs_id_data")
+            for nome_idx, _ in INDICES_LOGS:
+                cur.execute(f"ALTER INDEX admin.{nome_idx}_nova RENAME TO {nome_idx}")
+            cur.execute(f"SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = '{TABELA}'::regclass")
+            for (nome,) in cur.fetchall():
+                cur.execute(f"ALTER TABLE admin.{nome} RENAME TO {nome[:-len('_nova')]}")
+
+            # Sequência do id: serial continua a mesma (passa a pertencer à tabela nova);
+            # identity ganhou sequência própria e precisa começar depois do maior id
+            cur.execute(f"SELECT pg_get_serial_sequence('{TABELA}', 'id')")
+            sequencia_nova = cur.fetchone()[0]
+            if sequencia_nova:
+                cur.execute(f"SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {TABELA}), 1))", (sequencia_nova,))
+            elif sequencia_antiga:
+                cur.execute(f"ALTER SEQUENCE {sequencia_antiga} OWNED BY {TABELA}.id")
+        conn.commit()
+        log("✅ admin.wapi_logs particionada. A tabela original ficou em admin.wapi_logs_antiga (apague quando conferir).")
+        return True
+    except Exception as e:
+        conn.rollback()
+        log(f"❌ Erro na migração de wapi_logs: {e}")
+        try:
+            with conn.cursor() as cur: _remover_rastreio_alteracoes(cur)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+# ==========================================================
+# MANUTENÇÃO (PARTIÇÕES FUTURAS + RETENÇÃO)
+# ==========================================================
+def garantir_particoes_futuras(meses=MESES_FUTUROS):
+    """Cria as partições do mês corrente até `meses` à frente. Retorna quantas foram criadas."""
+    conn = get_conn()
+    if not conn: return 0
+    criadas = 0
+    try:
+        with conn.cursor() as cur:
+            if not tabela_particionada(cur): return 0
+            mes_atual = date.today().replace(day=1)
+            for i in range(meses + 1):
+                if criar_particao(cur, _somar_meses(mes_atual, i)): criadas += 1
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro ao criar partições de wapi_logs: {e}")
+    finally:
+        conn.close()
+    return criadas
+
+def _linhas_arquivo(caminho):
+    """Relê o .csv.gz inteiro e conta os registros (sem o cabeçalho). None se não tiver cabeçalho."""
+    with gzip.open(caminho, "rt", encoding="utf-8", newline="") as arquivo:
+        leitor = csv.reader(arquivo)
+        if next(leitor, None) is None: return None
+        return sum(1 for _ in leitor)
+
+def arquivar_particao(cur, nome, pasta=PASTA_ARQUIVO):
+    """
+    Exporta a partição para <pasta>/<nome>.csv.gz e confere o arquivo relendo-o.
+    Retorna o caminho; levanta erro se o arquivo estiver ilegível ou com linhas a menos.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    destino = os.path.join(pasta, f"{nome}.csv.gz")
+    temporario = destino + ".tmp"
+    # Sem escrita na partição entre a contagem e o DETACH/DROP de quem chama
+    cur.execute(f"LOCK TABLE admin.{nome} IN SHARE MODE")
+    cur.execute(f"SELECT COUNT(*) FROM admin.{nome}")
+    esperadas = cur.fetchone()[0]
+    with gzip.open(temporario, "wb") as arquivo:
+        cur.copy_expert(f"COPY (SELECT * FROM admin.{nome} ORDER BY data_hora, id) TO STDOUT WITH (FORMAT csv, HEADER)", arquivo)
+    gravadas = _linhas_arquivo(temporario)
+    if gravadas != esperadas:
+        os.remove(temporario)
+        raise ValueError(f"arquivo de {nome} com {gravadas} linha(s), partição com {esperadas}; partição mantida")
+    os.replace(temporario, destino)
+    return destino
+
+def arquivar_antigas(meses_retencao=MESES_RETENCAO, pasta=PASTA_ARQUIVO, log=print):
+    """
+    Arquiva e APAGA do banco as partições inteiramente mais antigas que `meses_retencao`
+    meses (0 = nada). Cada partição é exportada, conferida, desanexada e apagada na sua
+    própria transação; se o arquivo não conferir, a partição fica. Retorna os arquivos gerados.
+    """
+    if meses_retencao <= 0: return []
+    conn = get_conn()
+    if not conn: return []
+    arquivos = []
+    try:
+        with conn.cursor() as cur:
+            if not tabela_particionada(cur): return []
+            limite = _somar_meses(date.today().replace(day=1), -meses_retencao)
+            antigas = [nome for nome, inicio in listar_particoes(cur) if _somar_meses(inicio, 1) <= limite]
+        conn.commit()
+
+        for nome in antigas:
+            try:
+                with conn.cursor() as cur:
+                    caminho = arquivar_particao(cur, nome, pasta)
+                    cur.execute(f"ALTER TABLE {TABELA} DETACH PARTITION admin.{nome}")
+                    cur.execute(f"DROP TABLE admin.{nome}")
+                conn.commit()
+                arquivos.append(caminho)
+                log(f"   {nome} arquivada em {caminho}")
+            except Exception as e:
+                conn.rollback()
+                log(f"❌ Erro ao arquivar {nome}: {e}")
+    finally:
+        conn.close()
+    return arquivos
+
+def manter(meses_retencao=MESES_RETENCAO, meses_futuros=MESES_FUTUROS, log=print):
+    """Rotina periódica: partições futuras + retenção."""
+    criadas = garantir_particoes_futuras(meses_futuros)
+    if criadas: log(f"   {criadas} partição(ões) futura(s) criada(s) em wapi_logs")
+    return arquivar_antigas(meses_retencao, log=log)
+
+def _loop_manutencao(intervalo):
+    while not _estado["parar"].is_set():
+        try: manter()
+        except Exception as e: print(f"Erro na manutenção de wapi_logs: {e}")
+        _estado["parar"].wait(intervalo)
+
+def iniciar_manutencao(intervalo=INTERVALO_MANUTENCAO):
+    """Sobe a thread de manutenção uma vez por processo (chamado pelo webhook)."""
+    with _estado["lock"]:
+        if _estado["thread"] is not None and _estado["thread"].is_alive(): return False
+        _estado["parar"].clear()
+        _estado["thread"] = threading.Thread(target=_loop_manutencao, args=(intervalo,), name="wapi-logs-particao", daemon=True)
+        _estado["thread"].start()
+        return True
+
+def parar_manutencao():
+    _estado["parar"].set()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Particionamento mensal e retenção de admin.wapi_logs.")
+    ap.add_argument("acao", choices=["migrar", "manter"])
+    ap.add_argument("--retencao", type=int, default=MESES_RETENCAO,
+                    help="meses mantidos no banco; as partições mais antigas são arquivadas e APAGADAS (0 = não arquivar, padrão)")
+    ap.add_argument("--meses-futuros", type=int, default=MESES_FUTUROS)
+    args = ap.parse_args()
+    log = lambda msg: print(msg, flush=True)
+    if args.acao == "migrar":
+        sys.exit(0 if migrar(args.meses_futuros, log=log) else 1)
+    else:
+        manter(args.retencao, args.meses_futuros, log=log)
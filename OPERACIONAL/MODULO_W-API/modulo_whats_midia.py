@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import tempfile
+
+# =============================================================================
+# MÍDIAS PARA ENVIO (CACHE EM DISCO POR HASH)
+# O arquivo é copiado para disco em blocos (calculando o SHA-256 no caminho) e
+# codificado em base64 uma única vez, em <hash>.b64. O corpo JSON do send-media
+# é lido direto desse arquivo na hora do POST (CorpoMidiaStream), sem montar a
+# string base64 nem o JSON inteiro em memória. O mesmo panfleto enviado para
+# milhares de contatos é codificado uma vez só e reaproveitado pelo hash.
+# =============================================================================
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PASTA_CACHE = os.path.join(BASE_DIR, "MIDIA_CACHE")
+TAMANHO_BLOCO = 3 * 256 * 1024  # múltiplo de 3: os blocos codificados se concatenam sem padding no meio
+DIAS_RETENCAO = 7
+
+def _caminho_b64(hash_midia):
+    return os.path.join(PASTA_CACHE, f"{hash_midia}.b64")
+
+def obter_midia(hash_midia, nome_arquivo, mime):
+    """Dados da mídia já preparada (None se não estiver no cache deste servidor)."""
+    caminho = _caminho_b64(hash_midia)
+    if not os.path.exists(caminho): return None
+    os.utime(caminho)  # marca uso recente (a limpeza apaga pelo mtime)
+    return {'hash': hash_midia, 'nome': nome_arquivo, 'mime': mime or 'application/octet-stream',
+            'caminho_b64': caminho, 'tamanho_b64': os.path.getsize(caminho)}
+
+def preparar_midia(arquivo, nome_arquivo=None, mime=None):
+    """
+    Copia o arquivo (file-like, ex.: UploadedFile do Streamlit, ou caminho) para o cache e
+    retorna o dicionário de obter_midia(). Se o conteúdo já estiver no cache, só calcula o hash.
+    """
+    os.makedirs(PASTA_CACHE, exist_ok=True)
+    origem = open(arquivo, 'rb') if isinstance(arquivo, str) else arquivo
+    nome_arquivo = nome_arquivo or (os.path.basename(arquivo) if isinstance(arquivo, str) else getattr(arquivo, 'name', 'arquivo'))
+    mime = mime or getattr(arquivo, 'type', None)
+
+    fd, caminho_bruto = tempfile.mkstemp(dir=PASTA_CACHE, suffix=".tmp")
+    hasher = hashlib.sha256()
+    try:
+        if hasattr(origem, 'seek'): origem.seek(0)
+        with os.fdopen(fd, 'wb') as destino:
+            while True:
+                bloco = origem.read(TAMANHO_BLOCO)
+                if not bloco: break
+                hasher.update(bloco)
+                destino.write(bloco)
+        hash_midia = hasher.hexdigest()
+
+        if not os.path.exists(_caminho_b64(hash_midia)):
+            caminho_tmp = _caminho_b64(hash_midia) + f".{os.getpid()}.tmp"
+            with open(caminho_bruto, 'rb') as bruto, open(caminho_tmp, 'wb') as codificado:
+                while True:
+                    bloco = bruto.read(TAMANHO_BLOCO)
+                    if not bloco: break
+                    codificado.write(base64.b64encode(bloco))
+            os.replace(caminho_tmp, _caminho_b64(hash_midia))
+    finally:
+        if isinstance(arquivo, str): origem.close()
+        if os.path.exists(caminho_bruto): os.remove(caminho_bruto)
+
+    return obter_midia(hash_midia, nome_arquivo, mime)
+
+def limpar_cache_antigo(dias=DIAS_RETENCAO, preservar=()):
+    """
+    Apaga mídias sem uso há mais de `dias` dias, exceto os hashes em `preservar`
+    (itens de lote ainda na fila). Retorna quantos arquivos foram removidos.
+    """
+    if not os.path.isdir(PASTA_CACHE): return 0
+    limite = time.time() - dias * 86400
+    preservar = set(preservar)
+    removidos = 0
+    for nome in os.listdir(PASTA_CACHE):
+        if nome.split(".", 1)[0] in preservar: continue
+        caminho = os.path.join(PASTA_CACHE, nome)
+        try:
+            if os.path.getmtime(caminho) < limite:
+                os.remove(caminho); removidos += 1
+        except OSError: pass
+    return removidos
+
+class CorpoMidiaStream:
+    """
+    Corpo JSON do send-media lido sob demanda: prefixo com os campos, o base64 do
+    arquivo em cache e o fechamento. Tem __len__, então o requests manda
+    Content-Length e faz o upload lendo em blocos.
+    """
+
+    def __init__(self, midia, campos):
+        cabecalho = json.dumps(campos, ensure_ascii=False)[:-1]
+        separador = ", " if campos else ""
+        self.prefixo = f'{cabecalho}{separador}"media": "data:{midia["mime"]};base64,'.encode("utf-8")
+        self.sufixo = b'"}'
+        self.caminho = midia['caminho_b64']
+        self.tamanho = len(self.prefixo) + midia['tamanho_b64'] + len(self.sufixo)
+        self.partes = None
+
+    def __len__(self):
+        return self.tamanho
+
+    def _iniciar(self):
+        self.arquivo = open(self.caminho, 'rb')
+        self.partes = [self.prefixo, self.arquivo, self.sufixo]
+
+    def read(self, n=-1):
+        if self.partes is None: self._iniciar()
+        saida = b""
+        while self.partes and (n < 0 or len(saida) < n):
+            parte = self.partes[0]
+            falta = -1 if n < 0 else n - len(saida)
+            if isinstance(parte, bytes):
+                pedaco, resto = (parte, b"") if falta < 0 else (parte[:falta], parte[falta:])
+                saida += pedaco
+                if resto: self.partes[0] = resto
+                else: self.partes.pop(0)
+            else:
+                pedaco = parte.read(falta)
+                if pedaco: saida += pedaco
+                else:
+                    parte.close(); self.partes.pop(0)
+        return saida
+
+    def close(self):
+        if self.partes:
+            for parte in self.partes:
+                if not isinstance(parte, bytes): parte.close()
+        self.partes = []
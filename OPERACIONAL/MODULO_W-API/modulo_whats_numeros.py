@@ -2,10 +2,16 @@ import streamlit as st
 import pandas as pd
 import psycopg2
 import time
+import re
 import conexao
 # Importa o módulo central para padronização
 import modulo_wapi
 
+try:
+    import modulo_busca_indices
+except ImportError:
+    modulo_busca_indices = None
+
 def get_conn():
     try:
         return psycopg2.connect(
@@ -18,8 +24,8 @@ def get_conn():
 
 @st.dialog("📜 Histórico de Mensagens")
 def dialog_historico(telefone):
-    # Garante que busca pelo formato limpo (sem 55)
-    telefone_limpo = modulo_wapi.limpar_telefone(telefone)
+    # wapi_numeros e wapi_logs já guardam o formato limpo (sem 55), gravado pelo webhook
+    telefone_limpo = telefone
     st.write(f"Histórico para: **{telefone_limpo}**")
     
     conn = get_conn()
@@ -47,8 +53,8 @@ def dialog_historico(telefone):
 
 @st.dialog("✏️ Editar Vínculo")
 def dialog_editar_vinculo(id_registro, telefone_atual):
-    # Padroniza o telefone para operações de banco
-    telefone_clean = modulo_wapi.limpar_telefone(telefone_atual)
+    # Telefone já vem limpo de wapi_numeros
+    telefone_clean = telefone_atual
     st.write(f"Vinculando número: **{telefone_clean}**")
     
     conn = get_conn()
@@ -142,6 +148,10 @@ def dialog_excluir_numero(id_registro, telefone):
 def app_numeros():
     st.markdown("### 📒 Registro de Números (Conciliação)")
     
+    # Chave única / normalização (uma vez) e índices trigram da busca
+    modulo_wapi.garantir_estrutura_numeros()
+    if modulo_busca_indices: modulo_busca_indices.garantir_indices_busca('admin')
+
     conn = get_conn()
     if not conn: return
 
@@ -156,6 +166,7 @@ def app_numeros():
         FROM admin.wapi_numeros 
         WHERE 1=1
     """
+    params = []
     
     if filtro_tipo == "Vinculados": 
         sql += " AND id_cliente IS NOT NULL"
@@ -165,12 +176,15 @@ def app_numeros():
         sql += " AND id_cliente IS NULL"
     
     if busca: 
-        sql += f" AND (telefone ILIKE '%%{busca}%%' OR nome_cliente ILIKE '%%{busca}%%' OR grupo ILIKE '%%{busca}%%')"
+        # Telefone está gravado só com dígitos: busca pelos dígitos digitados (ex.: "(11) 9999-")
+        digitos = re.sub(r'[^0-9]', '', busca)
+        sql += " AND (nome_cliente ILIKE %s OR grupo ILIKE %s" + (" OR telefone LIKE %s)" if digitos else ")")
+        params += [f"%{busca}%", f"%{busca}%"] + ([f"%{digitos}%"] if digitos else [])
     
-    sql += " ORDER BY data_ultima_interacao DESC LIMIT 50"
+    sql += " ORDER BY data_ultima_interacao DESC NULLS LAST LIMIT 50"
 
     try:
-        df = pd.read_sql(sql, conn)
+        df = pd.read_sql(sql, conn, params=params or None)
     except Exception as e:
         st.error(f"Erro ao ler tabela (Verifique se as colunas id_grupo/grupo foram criadas): {e}")
         conn.close()
@@ -179,11 +193,6 @@ def app_numeros():
     conn.close()
 
     if not df.empty:
-        
-        # --- PADRONIZAÇÃO VISUAL ---
-        # Aplica a limpeza nos telefones carregados do banco
-        if 'telefone' in df.columns:
-            df['telefone'] = df['telefone'].apply(lambda x: modulo_wapi.limpar_telefone(x) if x else x)
 
         # Cabeçalho Ajustado com 5 Colunas
         # Telefone | Grupo | Cliente | Data | Ações
@@ -199,7 +208,7 @@ def app_numeros():
             with st.container():
                 c1, c2, c3, c4, c5 = st.columns([2, 2, 3, 2, 2])
                 
-                # 1. Telefone (Já limpo pelo apply acima)
+                # 1. Telefone (gravado limpo pelo webhook)
                 c1.write(row['telefone'])
                 
                 # 2. Grupo
@@ -5,6 +5,11 @@ import conexao
 # Importa o módulo central para usar a função de limpeza na exibição
 import modulo_wapi 
 
+try:
+    import modulo_busca_indices
+except ImportError:
+    modulo_busca_indices = None
+
 def get_conn():
     try:
         return psycopg2.connect(
@@ -18,8 +23,24 @@ def app_registros():
     Exibe o histórico de logs do banco de dados na interface Streamlit.
     """
     st.markdown("### 📋 Histórico de Logs (Webhook)")
+
+    # Métricas do cliente HTTP compartilhado (desde o início deste processo)
+    with st.expander("📈 Latência das chamadas à API", expanded=False):
+        stats = modulo_wapi.cliente_http.estatisticas_http()
+        if stats:
+            df_stats = pd.DataFrame([
+                {"Endpoint": e, "Chamadas": m['chamadas'], "Erros": m['erros'], "Repetições": m['repeticoes'],
+                 "Média ms": round(m['media_ms']), "p50 ≤ ms": m['p50_ms'], "p95 ≤ ms": m['p95_ms'], "p99 ≤ ms": m['p99_ms'], "Máx ms": round(m['max_ms'])}
+                for e, m in sorted(stats.items())
+            ])
+            st.dataframe(df_stats, use_container_width=True, hide_index=True)
+        else:
+            st.caption("Nenhuma chamada registrada neste processo.")
     st.markdown("---")
 
+    # Índice em data_hora para a listagem abaixo
+    if modulo_busca_indices: modulo_busca_indices.garantir_indices_busca('admin')
+
     conn = get_conn()
     if not conn:
         st.error("Erro ao conectar ao banco de dados.")
@@ -48,12 +69,8 @@ def app_registros():
         df = pd.read_sql_query(query, conn)
         
         if not df.empty:
-            
-            # --- PADRONIZAÇÃO VISUAL ---
-            # Aplica a função de limpeza na coluna telefone para garantir 
-            # que, mesmo dados antigos, apareçam sem o 55 na tela.
-            if 'telefone' in df.columns:
-                df['telefone'] = df['telefone'].apply(lambda x: modulo_wapi.limpar_telefone(x) if x else x)
+            # Telefone já vem limpo (sem 55): o webhook grava assim e a migração de
+            # wapi_numeros (modulo_wapi.garantir_estrutura_numeros) normalizou os antigos
 
             # Exibe a tabela formatada com as novas colunas
             st.dataframe(
@@ -0,0 +1,156 @@
+import time
+import threading
+from collections import deque
+
+# =============================================================================
+# ROTEADOR DE INSTÂNCIAS (ENVIO AVULSO)
+# Escolhe por qual instância sai cada mensagem em vez de usar sempre a
+# primeira linha de wapi_instancias:
+# - só entram instâncias conectadas segundo o monitor (modulo_whats_saude);
+#   se nenhuma estiver conectada, usa todas (melhor tentar do que não enviar);
+# - round-robin ponderado suave (o mesmo do nginx): peso maior para menor
+#   latência; FALHAS_PENALIDADE falhas seguidas dividem o peso por 10 até o
+#   próximo sucesso;
+# - o mesmo destinatário continua na mesma instância (conversa não troca de
+#   número) enquanto ela estiver disponível: memória do processo por
+#   HORAS_FIXACAO horas e, na falta, a última instância que falou com ele
+#   em admin.wapi_logs.
+# Contadores de vazão por instância ficam em memória (estatisticas_roteador()) e
+# contam todo envio do processo pelo modulo_wapi, inclusive o disparo em massa.
+# Fixação, contadores e round-robin só são alterados ou percorridos com _estado["lock"].
+# =============================================================================
+
+INTERVALO_RECARGA = 30
+HORAS_FIXACAO = 12
+DIAS_HISTORICO_FIXACAO = 7
+LATENCIA_PADRAO_MS = 500
+FALHAS_PENALIDADE = 3
+JANELA_VAZAO_SEG = 60
+
+_estado = {"lock": threading.Lock(), "instancias": [], "carregado_em": 0.0,
+           "atual": {}, "fixacao": {}, "contadores": {}}
+
+def _peso(inst):
+    latencia = inst['latencia_ms'] if inst['latencia_ms'] is not None else LATENCIA_PADRAO_MS
+    peso = max(1, round(10000 / (latencia + 100)))
+    cont = _estado["contadores"].get(inst['api_instance_id'])
+    if cont and cont['falhas_seguidas'] >= FALHAS_PENALIDADE: peso = max(1, peso // 10)
+    return peso
+
+def _carregar(get_conn):
+    conn = get_conn()
+    if not conn: return
+    try:
+        with conn.cursor() as cur:
+            try:
+                cur.execute("SELECT api_instance_id, api_token, status, latencia_ms FROM admin.wapi_instancias WHERE api_instance_id IS NOT NULL ORDER BY id")
+            except Exception:
+                # Antes do monitor de saúde criar a coluna latencia_ms
+                conn.rollback()
+                cur.execute("SELECT api_instance_id, api_token, status, NULL FROM admin.wapi_instancias WHERE api_instance_id IS NOT NULL ORDER BY id")
+            _estado["instancias"] = [{'api_instance_id': r[0], 'api_token': r[1], 'status': r[2], 'latencia_ms': r[3]} for r in cur.fetchall()]
+            _estado["carregado_em"] = time.monotonic()
+    except Exception as e:
+        print(f"Erro ao carregar instâncias do roteador: {e}")
+    finally:
+        conn.close()
+
+def _candidatas():
+    conectadas = [i for i in _estado["instancias"] if i['status'] == 'conectado']
+    return conectadas or _estado["instancias"]
+
+def _ultima_instancia_no_log(get_conn, telefone):
+    conn = get_conn()
+    if not conn: return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT instance_id FROM admin.wapi_logs
+                WHERE telefone = %s AND data_hora >= NOW() - INTERVAL '{DIAS_HISTORICO_FIXACAO} days'
+                ORDER BY data_hora DESC LIMIT 1
+            """, (telefone,))
+            res = cur.fetchone()
+            return res[0] if res else None
+    except Exception:
+        return None
+    finally:
+        conn.close()
+
+def escolher_instancia(get_conn, telefone=None):
+    """(api_instance_id, api_token) para o envio, ou None se não houver instância cadastrada."""
+    if time.monotonic() - _estado["carregado_em"] > INTERVALO_RECARGA or not _estado["instancias"]:
+        with _estado["lock"]:
+            if time.monotonic() - _estado["carregado_em"] > INTERVALO_RECARGA or not _estado["instancias"]:
+                _carregar(get_conn)
+
+    candidatas = _candidatas()
+    if not candidatas: return None
+    por_id = {i['api_instance_id']: i for i in candidatas}
+
+    if telefone:
+        with _estado["lock"]: fixada = _estado["fixacao"].get(telefone)
+        if fixada and fixada[1] > time.monotonic() and fixada[0] in por_id:
+            inst = por_id[fixada[0]]
+            return inst['api_instance_id'], inst['api_token']
+        if fixada is None:
+            anterior = _ultima_instancia_no_log(get_conn, telefone)
+            if anterior in por_id:
+                _fixar(telefone, anterior)
+                return anterior, por_id[anterior]['api_token']
+
+    # Round-robin ponderado suave: soma o peso de todas, escolhe a maior e desconta o total dela
+    with _estado["lock"]:
+        pesos = {i['api_instance_id']: _peso(i) for i in candidatas}
+        total = sum(pesos.values())
+        atual = _estado["atual"]
+        for inst_id, peso in pesos.items(): atual[inst_id] = atual.get(inst_id, 0) + peso
+        escolhida = max(pesos, key=lambda inst_id: atual[inst_id])
+        atual[escolhida] -= total
+    if telefone: _fixar(telefone, escolhida)
+    return escolhida, por_id[escolhida]['api_token']
+
+def _fixar(telefone, instance_id):
+    with _estado["lock"]:
+        _estado["fixacao"][telefone] = (instance_id, time.monotonic() + HORAS_FIXACAO * 3600)
+        if len(_estado["fixacao"]) > 50000:
+            agora = time.monotonic()
+            for tel in [t for t, (_, expira) in _estado["fixacao"].items() if expira < agora]:
+                _estado["fixacao"].pop(tel, None)
+
+def registrar_envio(instance_id, sucesso, latencia_ms):
+    """Chamado por modulo_wapi a cada envio de mensagem/mídia."""
+    with _estado["lock"]:
+        cont = _estado["contadores"].get(instance_id)
+        if cont is None:
+            cont = _estado["contadores"][instance_id] = {'enviados': 0, 'falhas': 0, 'falhas_seguidas': 0,
+                                                          'latencia_total_ms': 0.0, 'janela': deque()}
+        agora = time.monotonic()
+        cont['janela'].append(agora)
+        while cont['janela'] and cont['janela'][0] < agora - JANELA_VAZAO_SEG: cont['janela'].popleft()
+        cont['latencia_total_ms'] += latencia_ms
+        if sucesso:
+            cont['enviados'] += 1
+            cont['falhas_seguidas'] = 0
+        else:
+            cont['falhas'] += 1
+            cont['falhas_seguidas'] += 1
+
+def estatisticas_roteador():
+    """{instance_id: {enviados, falhas, falhas_seguidas, por_minuto, latencia_media_ms, peso}} deste processo."""
+    agora = time.monotonic()
+    with _estado["lock"]:
+        pesos = {i['api_instance_id']: _peso(i) for i in _candidatas()}
+        saida = {}
+        for inst_id, c in _estado["contadores"].items():
+            total = c['enviados'] + c['falhas']
+            saida[inst_id] = {
+                'enviados': c['enviados'], 'falhas': c['falhas'], 'falhas_seguidas': c['falhas_seguidas'],
+                'por_minuto': sum(1 for t in c['janela'] if t >= agora - JANELA_VAZAO_SEG) * 60 / JANELA_VAZAO_SEG,
+                'latencia_media_ms': c['latencia_total_ms'] / total if total else 0.0,
+                'peso': pesos.get(inst_id, 0),
+            }
+        return saida
+
+def invalidar():
+    """Força recarregar as instâncias na próxima escolha (após cadastrar/editar/excluir)."""
+    _estado["carregado_em"] = 0.0
@@ -0,0 +1,214 @@
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+import conexao
+import modulo_wapi
+
+# =============================================================================
+# MONITOR DE SAÚDE DAS INSTÂNCIAS W-API
+# Uma thread por processo consulta o status de todas as linhas de
+# admin.wapi_instancias em paralelo a cada INTERVALO_VERIFICACAO segundos.
+# O resultado vai para wapi_instancias (status, status_verificado_em,
+# latencia_ms), que a tela lê direto sem chamar a API, e para o histórico
+# admin.wapi_instancias_saude (retido por DIAS_RETENCAO_HISTORICO dias).
+# Uso fora do Streamlit: python modulo_whats_saude.py [--intervalo 60]
+# =============================================================================
+
+INTERVALO_VERIFICACAO = 60
+MAX_PARALELO = 8
+DIAS_RETENCAO_HISTORICO = 30
+ESTADOS_CONECTADOS = ('open', 'connected')
+
+_estado = {"lock": threading.Lock(), "thread": None, "parar": threading.Event(),
+           "estrutura_ok": False, "ultima_limpeza": 0.0}
+
+def get_conn():
+    try:
+        return psycopg2.connect(
+            host=conexao.host, port=conexao.port, database=conexao.database,
+            user=conexao.user, password=conexao.password
+        )
+    except Exception as e:
+        print(f"Erro de conexão DB: {e}")
+        return None
+
+def criar_estrutura_saude(cur):
+    cur.execute("""
+        ALTER TABLE admin.wapi_instancias
+            ADD COLUMN IF NOT EXISTS status_verificado_em TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS latencia_ms INTEGER
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS admin.wapi_instancias_saude (
+            id BIGSERIAL PRIMARY KEY,
+            id_instancia INTEGER,
+            api_instance_id VARCHAR(100),
+            data_hora TIMESTAMP NOT NULL DEFAULT NOW(),
+            status VARCHAR(30),
+            estado_api VARCHAR(50),
+            latencia_ms INTEGER,
+            detalhe TEXT
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_wapi_saude_instancia_data ON admin.wapi_instancias_saude (id_instancia, data_hora DESC)")
+
+def garantir_estrutura():
+    if _estado["estrutura_ok"]: return True
+    conn = get_conn()
+    if not conn: return False
+    try:
+        with conn.cursor() as cur: criar_estrutura_saude(cur)
+        conn.commit()
+        _estado["estrutura_ok"] = True
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro ao criar estrutura de saúde das instâncias: {e}")
+    finally:
+        conn.close()
+    return _estado["estrutura_ok"]
+
+# ==========================================================
+# VERIFICAÇÃO
+# ==========================================================
+def verificar_instancia(id_instancia, api_instance_id, token):
+    """Uma chamada de status-instance. Retorna (id_instancia, api_instance_id, status, estado_api, latencia_ms, detalhe)."""
+    inicio = time.perf_counter()
+    res = modulo_wapi.checar_status_api(api_instance_id, token)
+    latencia = int((time.perf_counter() - inicio) * 1000)
+    estado = str(res.get('state') or '') if isinstance(res, dict) else ''
+    if estado in ESTADOS_CONECTADOS: status = 'conectado'
+    elif estado == 'erro_req': status = 'sem_resposta'
+    else: status = 'desconectado'
+    detalhe = None if status == 'conectado' else str(res.get('details') or res)[:500] if isinstance(res, dict) else str(res)[:500]
+    return (id_instancia, api_instance_id, status, estado[:50], latencia, detalhe)
+
+def verificar_todas():
+    """Consulta todas as instâncias em paralelo e grava status + histórico. Retorna a lista de resultados."""
+    if not garantir_estrutura(): return []
+    conn = get_conn()
+    if not conn: return []
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, api_instance_id, api_token FROM admin.wapi_instancias WHERE api_instance_id IS NOT NULL")
+            instancias = cur.fetchall()
+        conn.commit()
+        if not instancias: return []
+
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALELO, len(instancias))) as pool:
+            resultados = list(pool.map(lambda i: verificar_instancia(*i), instancias))
+
+        with conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO admin.wapi_instancias_saude (id_instancia, api_instance_id, status, estado_api, latencia_ms, detalhe)
+                VALUES %s
+            """, resultados)
+            execute_values(cur, """
+                UPDATE admin.wapi_instancias i
+                SET status = v.status, latencia_ms = v.latencia, status_verificado_em = NOW()
+                FROM (VALUES %s) AS v(id, status, latencia)
+                WHERE i.id = v.id
+            """, [(r[0], r[2], r[4]) for r in resultados])
+
+            if time.monotonic() - _estado["ultima_limpeza"] > 86400:
+                cur.execute(f"DELETE FROM admin.wapi_instancias_saude WHERE data_hora < NOW() - INTERVAL '{DIAS_RETENCAO_HISTORICO} days'")
+                _estado["ultima_limpeza"] = time.monotonic()
+        conn.commit()
+        return resultados
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro na verificação das instâncias: {e}")
+        return []
+    finally:
+        conn.close()
+
+# ==========================================================
+# MONITOR EM SEGUNDO PLANO
+# ==========================================================
+def _loop_monitor(intervalo):
+    while not _estado["parar"].is_set():
+        inicio = time.monotonic()
+        verificar_todas()
+        _estado["parar"].wait(max(intervalo - (time.monotonic() - inicio), 1))
+
+def iniciar_monitor(intervalo=INTERVALO_VERIFICACAO):
+    """Sobe a thread do monitor uma vez por processo (chamado pela tela de instâncias)."""
+    with _estado["lock"]:
+        if _estado["thread"] is not None and _estado["thread"].is_alive(): return False
+        _estado["parar"].clear()
+        _estado["thread"] = threading.Thread(target=_loop_monitor, args=(intervalo,), name="wapi-saude", daemon=True)
+        _estado["thread"].start()
+        return True
+
+def parar_monitor():
+    _estado["parar"].set()
+
+def monitor_ativo():
+    return _estado["thread"] is not None and _estado["thread"].is_alive()
+
+# ==========================================================
+# CONSULTAS PARA A TELA
+# ==========================================================
+def historico_instancias(horas=24):
+    """{id_instancia: [(data_hora, status, latencia_ms)]} das últimas `horas` horas, numa consulta só."""
+    conn = get_conn()
+    if not conn: return {}
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id_instancia, data_hora, status, latencia_ms FROM admin.wapi_instancias_saude
+                WHERE data_hora >= NOW() - make_interval(hours => %s)
+                ORDER BY id_instancia, data_hora
+            """, (horas,))
+            historico = {}
+            for id_instancia, data_hora, status, latencia_ms in cur.fetchall():
+                historico.setdefault(id_instancia, []).append((data_hora, status, latencia_ms))
+            return historico
+    except Exception:
+        return {}
+    finally:
+        conn.close()
+
+def disponibilidade(horas=24):
+    """{id_instancia: (percentual_conectado, latencia_media_ms)} das últimas `horas` horas."""
+    conn = get_conn()
+    if not conn: return {}
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id_instancia,
+                       100.0 * COUNT(*) FILTER (WHERE status = 'conectado') / COUNT(*),
+                       AVG(latencia_ms)
+                FROM admin.wapi_instancias_saude
+                WHERE data_hora >= NOW() - make_interval(hours => %s)
+                GROUP BY id_instancia
+            """, (horas,))
+            return {r[0]: (float(r[1]), float(r[2] or 0)) for r in cur.fetchall()}
+    except Exception:
+        return {}
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Monitora o status das instâncias W-API até ser interrompido (Ctrl+C).")
+    ap.add_argument("--intervalo", type=int, default=INTERVALO_VERIFICACAO)
+    args = ap.parse_args()
+    print(f"🩺 Monitor de instâncias a cada {args.intervalo}s. Ctrl+C para parar.", flush=True)
+    try:
+        while True:
+            inicio = time.monotonic()
+            for r in verificar_todas():
+                print(f"   {r[1]}: {r[2]} ({r[4]} ms)", flush=True)
+            time.sleep(max(args.intervalo - (time.monotonic() - inicio), 1))
+    except KeyboardInterrupt:
+        pass
@@ -3,26 +3,38 @@
 # --- CONFIGURACOES ---
 PORTA=5001
 DIR_PROJETO="/root/meu_sistema/OPERACIONAL/MODULO_W-API"
-PYTHON_VENV="/root/meu_sistema/venv/bin/python"
+GUNICORN="/root/meu_sistema/venv/bin/gunicorn"
+ARQUIVO_PID="webhook.pid"
 ARQUIVO_LOG="sentinela.log"
 
 cd $DIR_PROJETO
 
-# Verifica se a porta esta ouvindo
-if ss -lptn "sport = :$PORTA" | grep -q $PORTA; then
-    # Opcional: Descomente a linha abaixo se quiser logar tambem quando estiver tudo bem (pode encher o disco)
-    # echo "$(date) - [OK] Webhook operando normal." >> $ARQUIVO_LOG
-    exit 0
+# O webhook roda sob gunicorn (gunicorn_webhook.conf.py). Nada de matar a porta:
+# - master vivo e /saude respondendo -> ok (503 = banco fora, so registra);
+# - master vivo e /saude sem resposta -> HUP (workers novos sobem, os antigos drenam e saem);
+# - master morto -> sobe de novo.
+if [ -f $ARQUIVO_PID ] && kill -0 "$(cat $ARQUIVO_PID)" 2>/dev/null; then
+    CODIGO=$(curl -s -o /dev/null -w '%{http_code}' --max-time 10 "http://127.0.0.1:$PORTA/saude")
+    if [ "$CODIGO" = "200" ]; then
+        # Opcional: Descomente a linha abaixo se quiser logar tambem quando estiver tudo bem (pode encher o disco)
+        # echo "$(date) - [OK] Webhook operando normal." >> $ARQUIVO_LOG
+        exit 0
+    elif [ "$CODIGO" = "503" ]; then
+        echo "$(date) - [AVISO] Webhook no ar, mas /saude degradado (banco?): $(curl -s --max-time 10 http://127.0.0.1:$PORTA/saude)" >> $ARQUIVO_LOG
+        exit 0
+    fi
+
+    echo "---------------------------------------------------" >> $ARQUIVO_LOG
+    echo "$(date) - [ALERTA] Webhook sem resposta (HTTP $CODIGO). Recarregando workers (HUP)." >> $ARQUIVO_LOG
+    kill -HUP "$(cat $ARQUIVO_PID)"
+    echo "---------------------------------------------------" >> $ARQUIVO_LOG
 else
     echo "---------------------------------------------------" >> $ARQUIVO_LOG
     echo "$(date) - [ALERTA] Webhook CAIU ou esta PARADO!" >> $ARQUIVO_LOG
-    
-    # 1. Tenta limpar qualquer residuo na porta
-    fuser -k $PORTA/tcp >> $ARQUIVO_LOG 2>&1
-    
-    # 2. Reinicia o servico
-    nohup $PYTHON_VENV webhook_wapi.py > webhook.log 2>&1 &
-    
+
+    # Reinicia o servico (gunicorn em segundo plano; grava o webhook.pid)
+    $GUNICORN -c gunicorn_webhook.conf.py --daemon >> $ARQUIVO_LOG 2>&1
+
     echo "$(date) - [SUCESSO] Comando de reinicio enviado." >> $ARQUIVO_LOG
     echo "---------------------------------------------------" >> $ARQUIVO_LOG
 fi
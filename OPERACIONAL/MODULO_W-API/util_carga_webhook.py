@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import random
+import argparse
+import threading
+import http.client
+from urllib.parse import urlparse
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+# =============================================================================
+# TESTE DE CARGA DO WEBHOOK (webhook_wapi)
+# Gera eventos no formato que a W-API manda (privado/grupo, fromMe, texto em
+# extendedTextMessage / conversation / text, mídia) a uma taxa fixa e mede a
+# latência de cada POST a partir do instante em que ele DEVERIA ter saído
+# (atraso do próprio gerador conta como latência: não esconde a saturação).
+#
+# Uso (webhook local apontando para um Postgres local via conexao.py):
+#   WEBHOOK_SALVAR_JSON=0 gunicorn -c gunicorn_webhook.conf.py
+#   python util_carga_webhook.py --taxas 50,100,200,400 --duracao 30
+# Ao final conta as linhas gravadas em admin.wapi_logs com o instanceId desta
+# rodada (CARGA-xxxx). Os telefones gerados usam DDD 00 (inexistente);
+# --limpar apaga os logs e números criados pelo teste.
+# =============================================================================
+
+EVENTOS_RECEBIDOS = ("webhookReceived", "message.received")
+EVENTOS_ENVIADOS = ("webhookDelivery", "message.sent")
+FRASES = ["Bom dia, tudo bem?", "Pode me mandar o boleto?", "Obrigado!", "Qual o prazo de entrega?",
+          "Segue o comprovante.", "Ok, combinado.", "Preciso falar com um atendente."]
+
+# ==========================================================
+# GERADOR DE PAYLOADS
+# ==========================================================
+class GeradorEventos:
+    def __init__(self, instance_id, contatos=500, grupos=20, perc_grupo=0.2, perc_enviada=0.3, perc_midia=0.1, perc_ignorado=0.02):
+        self.instance_id = instance_id
+        # 55 + DDD 00 + 9 + 8 dígitos -> limpar_telefone grava "009xxxxxxxx"
+        self.contatos = [f"55009{random.randint(10000000, 99999999)}" for _ in range(contatos)]
+        self.grupos = [(f"1203630{random.randint(10**11, 10**12 - 1)}@g.us", f"Grupo Carga {i}") for i in range(grupos)]
+        self.perc_grupo, self.perc_enviada, self.perc_midia, self.perc_ignorado = perc_grupo, perc_enviada, perc_midia, perc_ignorado
+
+    def _conteudo(self):
+        if random.random() < self.perc_midia:
+            return {"imageMessage": {"mimetype": "image/jpeg", "caption": "", "fileLength": "48213"}}
+        texto = random.choice(FRASES)
+        formato = random.choice(("extendedTextMessage", "conversation", "text"))
+        if formato == "extendedTextMessage": return {"extendedTextMessage": {"text": texto}}
+        return {formato: texto}
+
+    def gerar(self):
+        """(payload, grava_log) - grava_log diz se o webhook deve inserir em wapi_logs."""
+        if random.random() < self.perc_ignorado:
+            return {"event": "presence.update", "instanceId": self.instance_id}, False
+
+        enviada = random.random() < self.perc_enviada
+        em_grupo = random.random() < self.perc_grupo
+        contato = random.choice(self.contatos)
+        evento = {
+            "event": random.choice(EVENTOS_ENVIADOS if enviada else EVENTOS_RECEBIDOS),
+            "instanceId": self.instance_id,
+            "messageId": uuid.uuid4().hex.upper(),
+            "fromMe": enviada,
+            "isGroup": em_grupo,
+            "moment": int(time.time()),
+            "msgContent": self._conteudo(),
+        }
+        if em_grupo:
+            id_grupo, nome = random.choice(self.grupos)
+            evento["chat"] = {"id": id_grupo, "name": nome}
+            evento["sender"] = {"id": f"{contato}@s.whatsapp.net", "pushName": "Membro Carga"}
+        elif enviada:
+            evento["chat"] = {"id": f"{contato}@s.whatsapp.net"}
+            evento["sender"] = {"id": "5500900000000@s.whatsapp.net", "pushName": "Instância Carga"}
+        else:
+            evento["chat"] = {"id": f"{contato}@s.whatsapp.net"}
+            evento["sender"] = {"id": f"{contato}@s.whatsapp.net", "pushName": "Cliente Carga"}
+        return evento, True
+
+# ==========================================================
+# EXECUÇÃO
+# ==========================================================
+def _percentil(ordenados, p):
+    if not ordenados: return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))]
+
+class Etapa:
+    def __init__(self, taxa):
+        self.taxa = taxa
+        self.lock = threading.Lock()
+        self.latencias = []
+        self.erros = 0
+        self.status = {}
+        self.esperados_no_banco = 0
+
+    def registrar(self, latencia_ms, codigo, status, grava_log):
+        with self.lock:
+            self.latencias.append(latencia_ms)
+            if codigo is None or codigo >= 400:
+                self.erros += 1
+            else:
+                self.status[status] = self.status.get(status, 0) + 1
+                if grava_log: self.esperados_no_banco += 1
+
+    def resumo(self, duracao):
+        lat = sorted(self.latencias)
+        total = len(lat)
+        return {
+            "taxa_alvo": self.taxa, "enviados": total, "taxa_real": round(total / duracao, 1) if duracao else 0,
+            "erros": self.erros, "perc_erro": round(100 * self.erros / total, 2) if total else 0.0,
+            "p50_ms": round(_percentil(lat, 0.50), 1), "p95_ms": round(_percentil(lat, 0.95), 1),
+            "p99_ms": round(_percentil(lat, 0.99), 1), "max_ms": round(lat[-1], 1) if lat else 0.0,
+            "respostas": dict(self.status), "esperados_no_banco": self.esperados_no_banco,
+        }
+
+def _trabalhador(url, fila, timeout):
+    alvo = urlparse(url)
+    conn = None
+    while True:
+        item = fila.get()
+        if item is None: return
+        etapa, agendado, payload, grava_log = item
+        espera = agendado - time.perf_counter()
+        if espera > 0: time.sleep(espera)
+        corpo = json.dumps(payload).encode("utf-8")
+        codigo, status = None, None
+        try:
+            if conn is None: conn = http.client.HTTPConnection(alvo.hostname, alvo.port or 80, timeout=timeout)
+            conn.request("POST", alvo.path or "/webhook", body=corpo, headers={"Content-Type": "application/json"})
+            resposta = conn.getresponse()
+            dados = resposta.read()
+            codigo = resposta.status
+            try: status = json.loads(dados).get("status")
+            except ValueError: status = None
+        except Exception:
+            if conn is not None: conn.close()
+            conn = None
+        etapa.registrar((time.perf_counter() - agendado) * 1000, codigo, status, grava_log)
+
+def executar_etapa(url, gerador, taxa, duracao, concorrencia, timeout=30):
+    """Envia `taxa` eventos/s por `duracao` s (chegadas em intervalos fixos) e devolve o resumo."""
+    etapa = Etapa(taxa)
+    fila = queue.Queue(maxsize=concorrencia * 4)
+    threads = [threading.Thread(target=_trabalhador, args=(url, fila, timeout), daemon=True) for _ in range(concorrencia)]
+    for t in threads: t.start()
+
+    inicio = time.perf_counter()
+    total = int(taxa * duracao)
+    for i in range(total):
+        payload, grava_log = gerador.gerar()
+        fila.put((etapa, inicio + i / taxa, payload, grava_log))
+    for _ in threads: fila.put(None)
+    for t in threads: t.join()
+    return etapa.resumo(time.perf_counter() - inicio)
+
+# ==========================================================
+# CONFERÊNCIA NO SERVIDOR E NO BANCO
+# ==========================================================
+def consultar_saude(url):
+    alvo = urlparse(url)
+    try:
+        conn = http.client.HTTPConnection(alvo.hostname, alvo.port or 80, timeout=5)
+        conn.request("GET", "/saude")
+        resposta = conn.getresponse()
+        return json.loads(resposta.read())
+    except Exception:
+        return None
+
+def aguardar_fila(url, limite_seg):
+    """Espera a fila do worker que responder /saude zerar (com vários workers é uma amostra)."""
+    fim = time.monotonic() + limite_seg
+    while time.monotonic() < fim:
+        saude = consultar_saude(url)
+        if saude is None or (saude.get("fila", 0) == 0 and saude.get("em_processamento", 0) == 0): return saude
+        time.sleep(0.5)
+    return consultar_saude(url)
+
+def _conectar_banco():
+    try:
+        import psycopg2
+        import conexao
+        return psycopg2.connect(host=conexao.host, port=conexao.port, database=conexao.database,
+                                user=conexao.user, password=conexao.password)
+    except Exception as e:
+        print(f"⚠️ Sem acesso ao banco para conferir as linhas gravadas: {e}", flush=True)
+        return None
+
+def contar_linhas(instance_id):
+    conn = _conectar_banco()
+    if not conn: return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM admin.wapi_logs WHERE instance_id = %s", (instance_id,))
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+def limpar_dados_carga(instance_id):
+    conn = _conectar_banco()
+    if not conn: return
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM admin.wapi_logs WHERE instance_id = %s", (instance_id,))
+            logs = cur.rowcount
+            cur.execute("DELETE FROM admin.wapi_numeros WHERE telefone LIKE '00%'")
+            numeros = cur.rowcount
+        conn.commit()
+        print(f"🧹 Removidos {logs} log(s) e {numeros} número(s) do teste.", flush=True)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Teste de carga do webhook W-API.")
+    ap.add_argument("--url", default="http://127.0.0.1:5001/webhook")
+    ap.add_argument("--taxas", default="50,100,200", help="eventos/s de cada etapa, separados por vírgula")
+    ap.add_argument("--duracao", type=int, default=30, help="segundos por etapa")
+    ap.add_argument("--concorrencia", type=int, default=64, help="conexões simultâneas do gerador")
+    ap.add_argument("--contatos", type=int, default=500)
+    ap.add_argument("--perc-grupo", type=float, default=0.2)
+    ap.add_argument("--perc-enviada", type=float, default=0.3)
+    ap.add_argument("--espera-fila", type=int, default=120, help="segundos máximos aguardando a fila do webhook esvaziar")
+    ap.add_argument("--limpar", action="store_true", help="apaga do banco os dados gerados ao final")
+    ap.add_argument("--json", action="store_true", help="imprime o relatório final em JSON")
+    args = ap.parse_args()
+
+    instance_id = f"CARGA-{uuid.uuid4().hex[:8]}"
+    gerador = GeradorEventos(instance_id, args.contatos, perc_grupo=args.perc_grupo, perc_enviada=args.perc_enviada)
+    print(f"🚀 Carga em {args.url} (instanceId {instance_id})", flush=True)
+
+    etapas = []
+    for taxa in [float(t) for t in args.taxas.split(",") if t.strip()]:
+        r = executar_etapa(args.url, gerador, taxa, args.duracao, args.concorrencia)
+        etapas.append(r)
+        print(f"   {r['taxa_alvo']:>6.0f}/s alvo | {r['taxa_real']:>6.1f}/s real | erros {r['perc_erro']:>5.2f}% | "
+              f"p50 {r['p50_ms']:>7.1f} | p95 {r['p95_ms']:>7.1f} | p99 {r['p99_ms']:>7.1f} | máx {r['max_ms']:>7.1f} ms | {r['respostas']}", flush=True)
+
+    saude = aguardar_fila(args.url, args.espera_fila)
+    esperados = sum(r['esperados_no_banco'] for r in etapas)
+    gravados = contar_linhas(instance_id)
+    relatorio = {"instance_id": instance_id, "etapas": etapas, "esperados_no_banco": esperados,
+                 "gravados_no_banco": gravados, "saude_final": saude}
+    if args.json:
+        print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+    else:
+        if saude: print(f"🩺 /saude: fila {saude.get('fila')} | erros {saude.get('erros')} | db {saude.get('db_latencia_ms')} ms", flush=True)
+        if gravados is not None:
+            perdidos = esperados - gravados
+            print(f"💾 wapi_logs: {gravados}/{esperados} linha(s) gravada(s)" + (f" — {perdidos} faltando" if perdidos else ""), flush=True)
+    if args.limpar: limpar_dados_carga(instance_id)
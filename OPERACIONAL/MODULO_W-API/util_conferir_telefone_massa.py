@@ -0,0 +1,60 @@
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+import modulo_wapi
+import modulo_whats_disparo_massa as massa
+import util_stub_wapi as stub
+
+# =============================================================================
+# CONFERÊNCIA DO TELEFONE QUE SAI NO DISPARO EM MASSA
+# Uso: python util_conferir_telefone_massa.py
+# Sobe o stub da W-API numa porta livre e manda, pelo mesmo caminho do worker
+# (DisparadorMassa._enviar) e pelo envio avulso, os números abaixo no formato
+# em que a fila os guarda (limpar_telefone de enfileirar_lote). O telefone que
+# chega ao stub tem que ser o da limpeza única, inclusive no DDD 55, onde
+# limpar_telefone não é idempotente. Não usa o banco. Sai com código 1 se algo divergir.
+# =============================================================================
+
+# (como veio do cadastro, como deve chegar na W-API)
+CASOS = [
+    ("55 55 99999-8888", "55999998888"),
+    ("5555999998888", "55999998888"),
+    ("+55 (31) 99999-8888", "31999998888"),
+    ("31 9999-8888", "3199998888"),
+]
+
+def _ultimo_telefone():
+    with stub._lock: return stub._contagem["ultimos_telefones"][-1]
+
+def conferir():
+    stub.StubWapi.latencia = 0
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), stub.StubWapi)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    modulo_wapi.BASE_URL = f"http://127.0.0.1:{servidor.server_address[1]}"
+
+    disparador = massa.DisparadorMassa(num_workers=0)
+    disparador.instancias = {"CONFERENCIA": "token"}
+    ok = True
+    try:
+        for bruto, esperado in CASOS:
+            na_fila = modulo_wapi.limpar_telefone(bruto)
+            item = (0, "CONFERENCIA", na_fila, "conferência", 1, None, None, None, None, None)
+            disparador._enviar(item)
+            em_massa = _ultimo_telefone()
+            modulo_wapi.enviar_msg_api("CONFERENCIA", "token", bruto, "conferência")
+            avulso = _ultimo_telefone()
+            certo = em_massa == esperado and avulso == esperado
+            ok = ok and certo
+            print(f"{'✅' if certo else '❌'} {bruto:<22} fila {na_fila:<13} massa {em_massa:<13} avulso {avulso:<13} esperado {esperado}")
+    finally:
+        servidor.shutdown()
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if conferir() else 1)
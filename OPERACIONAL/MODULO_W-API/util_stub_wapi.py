@@ -0,0 +1,76 @@
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+# =============================================================================
+# STUB LOCAL DA W-API (TESTES DO DISPARO EM MASSA)
+# Uso: python util_stub_wapi.py [--porta 8089] [--latencia-ms 150] [--taxa-erro 0.05]
+# e rode o sistema/disparador com WAPI_BASE_URL=http://127.0.0.1:8089
+# Responde send-text/send-media com messageId; --taxa-erro devolve 500/429
+# aleatórios para exercitar o retry. GET /stats mostra as contagens e os
+# últimos telefones recebidos (campo "phone" do corpo).
+# =============================================================================
+
+_contagem = {"total": 0, "ok": 0, "erro": 0, "por_instancia": {}, "ultimos_telefones": []}
+MAX_TELEFONES = 1000
+_lock = threading.Lock()
+
+class StubWapi(BaseHTTPRequestHandler):
+    latencia = 0.15
+    taxa_erro = 0.0
+
+    def _responder(self, codigo, corpo):
+        dados = json.dumps(corpo).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        corpo = json.loads(self.rfile.read(tamanho) or b"{}")
+        time.sleep(self.latencia)
+
+        if url.path not in ("/message/send-text", "/message/send-media"):
+            return self._responder(404, {"error": True, "message": "rota inexistente"})
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._responder(401, {"error": True, "message": "token ausente"})
+
+        instancia = url.query.replace("instanceId=", "")
+        with _lock:
+            _contagem["total"] += 1
+            _contagem["por_instancia"][instancia] = _contagem["por_instancia"].get(instancia, 0) + 1
+            _contagem["ultimos_telefones"] = (_contagem["ultimos_telefones"] + [corpo.get("phone")])[-MAX_TELEFONES:]
+            falhar = random.random() < self.taxa_erro
+            _contagem["erro" if falhar else "ok"] += 1
+        if falhar:
+            return self._responder(random.choice([429, 500, 503]), {"error": True, "message": "falha simulada"})
+        self._responder(200, {"error": False, "messageId": uuid.uuid4().hex.upper(), "phone": corpo.get("phone")})
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/stats":
+            with _lock: return self._responder(200, _contagem)
+        if urlparse(self.path).path == "/instance/status-instance":
+            return self._responder(200, {"state": "open"})
+        self._responder(404, {"error": True})
+
+    def log_message(self, *args):
+        pass
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Servidor stub da W-API para testes locais.")
+    ap.add_argument("--porta", type=int, default=8089)
+    ap.add_argument("--latencia-ms", type=int, default=150)
+    ap.add_argument("--taxa-erro", type=float, default=0.0)
+    args = ap.parse_args()
+    StubWapi.latencia = args.latencia_ms / 1000
+    StubWapi.taxa_erro = args.taxa_erro
+    print(f"🧪 Stub W-API em http://127.0.0.1:{args.porta} (latência {args.latencia_ms}ms, erro {args.taxa_erro:.0%})", flush=True)
+    ThreadingHTTPServer(("0.0.0.0", args.porta), StubWapi).serve_forever()
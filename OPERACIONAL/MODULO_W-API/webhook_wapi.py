@@ -1,5 +1,8 @@
 import sys
 import os
+import time
+import queue
+import threading
 from flask import Flask, request, jsonify
 import psycopg2
 import re
@@ -25,8 +28,24 @@ try:
 except Exception as e:
     print(f" ❌ Erro no conexao.py: {e}", flush=True)
 
+# Upsert de admin.wapi_numeros (conciliação) junto com o log
+import modulo_wapi
+# Partições mensais futuras e retenção de admin.wapi_logs
+import modulo_whats_logs_particao
+
 app = Flask(__name__)
 
+# Fila de eventos por processo: a requisição só extrai os campos e enfileira;
+# threads de processamento gravam no banco. Em produção roda sob gunicorn
+# (gunicorn_webhook.conf.py), que chama encerrar() ao parar cada worker.
+FILA_MAX = int(os.environ.get("WEBHOOK_FILA_MAX", "10000"))
+THREADS_PROCESSAMENTO = int(os.environ.get("WEBHOOK_THREADS_PROCESSAMENTO", "2"))
+# Cópia de cada evento em WAPI_WEBHOOK_JASON (desligar em teste de carga: util_carga_webhook.py)
+SALVAR_JSON = os.environ.get("WEBHOOK_SALVAR_JSON", "1") == "1"
+fila_eventos = queue.Queue(maxsize=FILA_MAX)
+_estado = {"lock": threading.Lock(), "threads": [], "encerrando": False,
+           "em_processamento": 0, "processados": 0, "erros": 0, "inicio": time.time()}
+
 def get_conn():
     try:
         return psycopg2.connect(
@@ -87,7 +106,7 @@ def processar_mensagem(dados_proc):
     2. Se for Grupo, busca cliente e atualiza o registro criado.
     """
     conn = get_conn()
-    if not conn: return
+    if not conn: return False
     
     try:
         cur = conn.cursor()
@@ -120,6 +139,16 @@ def processar_mensagem(dados_proc):
         
         # Captura o ID do log que acabou de ser gerado (Ex: 35, 36...)
         novo_log_id = cur.fetchone()[0]
+
+        # Número + última interação na mesma transação do log.
+        # Em grupo, mensagem nossa traria o número da própria instância: não registra.
+        # Só depois da migração (python modulo_wapi.py migrar_numeros): sem a chave única não há upsert.
+        if modulo_wapi.estrutura_numeros_pronta(cur) and dados_proc['telefone'] and not (dados_proc['is_group'] and dados_proc['tipo'] == 'ENVIADA'):
+            modulo_wapi.registrar_numero(cur, dados_proc['telefone'], dados_proc['id_grupo'], dados_proc.get('nome_grupo'))
+
+        # Aviso para as telas de chat abertas (entregue junto com o COMMIT)
+        modulo_wapi.notificar_mensagem(cur, novo_log_id, dados_proc['telefone'], dados_proc['tipo'])
+
         conn.commit() # Salva garantido!
         
         print(f"💾 Log Básico Salvo! ID do Registro: {novo_log_id}", flush=True)
@@ -175,16 +204,84 @@ def processar_mensagem(dados_proc):
                  
                  cur.execute("UPDATE admin.wapi_logs SET id_cliente=%s, nome_cliente=%s WHERE id=%s", 
                              (id_cliente_encontrado, nome_cliente_encontrado, novo_log_id))
+                 # Vincula o número na conciliação se ainda estiver sem cliente
+                 cur.execute("UPDATE admin.wapi_numeros SET id_cliente=%s, nome_cliente=%s WHERE telefone=%s AND id_cliente IS NULL",
+                             (id_cliente_encontrado, nome_cliente_encontrado, dados_proc['telefone']))
                  conn.commit()
                  print(f"✅ Cliente identificado por Telefone e atualizado.", flush=True)
 
         cur.close()
         conn.close()
+        return True
 
     except Exception as e:
         if conn: conn.rollback()
         print(f"❌ Erro no processamento: {e}", flush=True)
         if conn: conn.close()
+        return False
+
+# ==============================================================================
+#  FILA DE PROCESSAMENTO
+# ==============================================================================
+def _processar_contando(dados_proc):
+    with _estado["lock"]: _estado["em_processamento"] += 1
+    try:
+        ok = processar_mensagem(dados_proc)
+    except Exception as e:
+        print(f"❌ Erro no processamento: {e}", flush=True)
+        ok = False
+    with _estado["lock"]:
+        _estado["em_processamento"] -= 1
+        _estado["processados" if ok else "erros"] += 1
+
+def _trabalhador():
+    while True:
+        dados_proc = fila_eventos.get()
+        try:
+            if dados_proc is None: return  # sinal de parada de encerrar()
+            _processar_contando(dados_proc)
+        finally:
+            fila_eventos.task_done()
+
+def iniciar_trabalhadores():
+    """Sobe as threads de processamento uma vez por processo (na primeira mensagem)."""
+    with _estado["lock"]:
+        if _estado["threads"]: return
+        for i in range(THREADS_PROCESSAMENTO):
+            t = threading.Thread(target=_trabalhador, name=f"webhook-fila-{i}", daemon=True)
+            t.start()
+            _estado["threads"].append(t)
+
+def enfileirar(dados_proc):
+    """Enfileira o evento; com a fila cheia (ou encerrando) processa na própria requisição."""
+    if not _estado["encerrando"]:
+        iniciar_trabalhadores()
+        try:
+            fila_eventos.put_nowait(dados_proc)
+            return "enfileirado"
+        except queue.Full:
+            pass
+    _processar_contando(dados_proc)
+    return "processado"
+
+def encerrar(timeout=20, ao_aguardar=None):
+    """
+    Drena a fila antes do processo sair: para de aceitar na fila, espera os eventos pendentes
+    serem gravados (até `timeout` segundos) e encerra as threads. Retorna quantos ficaram sem gravar.
+    `ao_aguardar` é chamado a cada volta da espera (o gunicorn usa para o heartbeat do worker).
+    """
+    _estado["encerrando"] = True
+    limite = time.monotonic() + timeout
+    while fila_eventos.unfinished_tasks and time.monotonic() < limite:
+        if ao_aguardar: ao_aguardar()
+        time.sleep(0.1)
+    pendentes = fila_eventos.qsize()
+    for _ in _estado["threads"]:
+        try: fila_eventos.put_nowait(None)
+        except queue.Full: break
+    if pendentes: print(f"⚠️ Encerrando com {pendentes} evento(s) não gravado(s) na fila.", flush=True)
+    else: print("✅ Fila do webhook drenada.", flush=True)
+    return pendentes
 
 # ==============================================================================
 #  SERVIDOR WEBHOOK
@@ -195,14 +292,15 @@ def webhook():
     if not dados: return jsonify({"status": "vazio"}), 200
     
     # 1. Log JSON
-    try:
-        pasta_json = os.path.join(BASE_DIR, "WAPI_WEBHOOK_JASON")
-        if not os.path.exists(pasta_json): os.makedirs(pasta_json)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        evento_nome = dados.get('event', 'msg')
-        with open(os.path.join(pasta_json, f"{timestamp}_{evento_nome}.json"), "w", encoding="utf-8") as f:
-            json.dump(dados, f, indent=4, ensure_ascii=False)
-    except: pass
+    if SALVAR_JSON:
+        try:
+            pasta_json = os.path.join(BASE_DIR, "WAPI_WEBHOOK_JASON")
+            if not os.path.exists(pasta_json): os.makedirs(pasta_json)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            evento_nome = dados.get('event', 'msg')
+            with open(os.path.join(pasta_json, f"{timestamp}_{evento_nome}.json"), "w", encoding="utf-8") as f:
+                json.dump(dados, f, indent=4, ensure_ascii=False)
+        except: pass
 
     # 2. Filtros
     event = dados.get("event")
@@ -266,10 +364,43 @@ def webhook():
     }
 
     if telefone_limpo or id_grupo:
-        processar_mensagem(dados_processados)
-        return jsonify({"status": "processado"}), 200
+        return jsonify({"status": enfileirar(dados_processados)}), 200
     else:
         return jsonify({"status": "sem_identificacao"}), 200
 
+@app.route('/saude', methods=['GET'])
+def saude():
+    """Estado deste worker: fila, contadores e latência de um SELECT 1 no banco. 503 se o banco não responder."""
+    inicio = time.perf_counter()
+    conn = get_conn()
+    db_ok = False
+    if conn:
+        try:
+            with conn.cursor() as cur: cur.execute("SELECT 1")
+            db_ok = True
+        except Exception: pass
+        finally: conn.close()
+    latencia_ms = round((time.perf_counter() - inicio) * 1000, 1)
+    with _estado["lock"]:
+        corpo = {
+            "status": "ok" if db_ok and not _estado["encerrando"] else "degradado",
+            "pid": os.getpid(),
+            "fila": fila_eventos.qsize(),
+            "fila_max": FILA_MAX,
+            "em_processamento": _estado["em_processamento"],
+            "processados": _estado["processados"],
+            "erros": _estado["erros"],
+            "threads_processamento": sum(1 for t in _estado["threads"] if t.is_alive()),
+            "db_ok": db_ok,
+            "db_latencia_ms": latencia_ms,
+            "encerrando": _estado["encerrando"],
+            "uptime_s": round(time.time() - _estado["inicio"]),
+        }
+    return jsonify(corpo), 200 if corpo["status"] == "ok" else 503
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001)
\ No newline at end of file
+    # Modo desenvolvimento (servidor do Flask). Produção: gunicorn -c gunicorn_webhook.conf.py
+    import atexit
+    modulo_whats_logs_particao.iniciar_manutencao()
+    atexit.register(encerrar)
+    app.run(host='0.0.0.0', port=5001, threaded=True)
\ No newline at end of file
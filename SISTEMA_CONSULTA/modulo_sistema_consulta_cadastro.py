@@ -8,6 +8,9 @@ import contextlib
 import sys
 import os
 import math
+import re
+import json
+from decimal import Decimal
 
 # ==============================================================================
 # 0. CONFIGURAÇÃO DE CAMINHOS (PATH FIX)
@@ -32,6 +35,17 @@ except ImportError as e:
     st.error(f"Erro crítico: Não foi possível importar 'modulo_validadores'. Detalhe: {e}")
     st.stop()
 
+try:
+    import modulo_catalogo as catalogo
+except ImportError as e:
+    st.error(f"Erro crítico: Não foi possível importar 'modulo_catalogo'. Detalhe: {e}")
+    st.stop()
+
+try:
+    import modulo_busca_indices
+except ImportError:
+    modulo_busca_indices = None
+
 # --- IMPORTAÇÃO DO MÓDULO FATOR CONFERI (PARA O BOTÃO) ---
 try:
     import modulo_fator_conferi
@@ -218,31 +232,100 @@ def buscar_relacao_auxiliar(tipo):
             st.error(f"Erro ao buscar auxiliar: {e}")
             return [], []
 
-def buscar_cliente_rapida(termo):
+# --- PESQUISA RÁPIDA: CLASSIFICADOR + SUBCONSULTAS TIPADAS ---
+
+ORCAMENTO_BUSCA_RAPIDA_MS = 2000
+LIMITE_BUSCA_RAPIDA = 30
+
+def _expr_tel(coluna):
+    return modulo_busca_indices.expr_digitos(coluna) if modulo_busca_indices else f"regexp_replace({coluna}::text, '[^0-9]', '', 'g')"
+
+# nome -> SQL que devolve ids de sistema_consulta_dados_cadastrais_cpf; cada uma casa com um índice
+SUBCONSULTAS_BUSCA = {
+    'cpf_exato': "SELECT id FROM sistema_consulta.sistema_consulta_dados_cadastrais_cpf WHERE cpf = %s",
+    'cpf_parcial': "SELECT id FROM sistema_consulta.sistema_consulta_dados_cadastrais_cpf WHERE (cpf::text) LIKE %s",
+    'telefone': f"""SELECT c.id FROM sistema_consulta.sistema_consulta_dados_cadastrais_telefone tel
+        JOIN sistema_consulta.sistema_consulta_dados_cadastrais_cpf c ON c.cpf = tel.cpf WHERE {_expr_tel('tel.telefone')} LIKE %s""",
+    'email': """SELECT c.id FROM sistema_consulta.sistema_consulta_dados_cadastrais_email e
+        JOIN sistema_consulta.sistema_consulta_dados_cadastrais_cpf c ON c.cpf = e.cpf WHERE e.email ILIKE %s""",
+    'nome': "SELECT id FROM sistema_consulta.sistema_consulta_dados_cadastrais_cpf WHERE nome ILIKE %s",
+    'identidade': "SELECT id FROM sistema_consulta.sistema_consulta_dados_cadastrais_cpf WHERE identidade ILIKE %s",
+    'outros_textos': """SELECT id FROM sistema_consulta.sistema_consulta_dados_cadastrais_cpf
+        WHERE nome_pai ILIKE %s OR campanhas ILIKE %s OR id_importacao ILIKE %s""",
+}
+
+# tipo do termo -> subconsultas em ordem de relevância (a primeira é a busca direta)
+PLANO_BUSCA_RAPIDA = {
+    'cpf': ['cpf_exato', 'telefone', 'cpf_parcial'],
+    'telefone': ['telefone', 'cpf_parcial'],
+    'email': ['email'],
+    'digitos': ['cpf_exato', 'cpf_parcial', 'telefone', 'identidade', 'outros_textos'],
+    'texto': ['nome', 'identidade', 'outros_textos'],
+}
+
+def classificar_termo_busca(termo):
+    """Identifica o tipo do termo digitado: 'cpf', 'telefone', 'email', 'digitos' ou 'texto'."""
+    texto = termo.strip()
+    if '@' in texto: return 'email'
+    digitos = v.ValidadorDocumentos.limpar_numero(texto)
+    if not digitos or not re.fullmatch(r'[\d\s.\-/()+]+', texto): return 'texto'
+    if '(' in texto or len(digitos) in (10, 12, 13): return 'telefone'
+    if len(digitos) == 11:
+        return 'cpf' if v.ValidadorDocumentos.cpf_para_sql(digitos) else 'telefone'
+    return 'digitos'
+
+def _params_subconsulta(nome, termo):
+    digitos = v.ValidadorDocumentos.limpar_numero(termo)
+    if nome == 'cpf_exato': return (v.ValidadorDocumentos.cpf_para_bigint(digitos),)
+    if nome in ('cpf_parcial', 'telefone'): return (f"%{digitos}%",)
+    if nome == 'outros_textos': return (f"%{termo}%",) * 3
+    return (f"%{termo}%",)
+
+def _buscar_ids_ranqueados(cur, subconsultas, termo):
+    """UNION ALL das subconsultas (cada uma limitada), com o rank da primeira em que o id apareceu."""
+    partes, params = [], []
+    for rank, nome in enumerate(subconsultas):
+        partes.append(f"SELECT id, {rank} AS rank FROM ({SUBCONSULTAS_BUSCA[nome]} LIMIT {LIMITE_BUSCA_RAPIDA}) s{rank}")
+        params.extend(_params_subconsulta(nome, termo))
+    cur.execute(f"""
+        SELECT t.id, t.nome, t.cpf, t.identidade
+        FROM (SELECT id, MIN(rank) AS rank FROM ({' UNION ALL '.join(partes)}) u GROUP BY id) r
+        JOIN sistema_consulta.sistema_consulta_dados_cadastrais_cpf t ON t.id = r.id
+        ORDER BY r.rank, t.nome LIMIT {LIMITE_BUSCA_RAPIDA}
+    """, tuple(params))
+    return cur.fetchall()
+
+def buscar_cliente_rapida(termo, orcamento_ms=ORCAMENTO_BUSCA_RAPIDA_MS):
+    """
+    Classifica o termo e roda primeiro a busca direta do tipo (CPF, telefone, e-mail ou nome).
+    Sem resultado, cai para o UNION ALL ranqueado das demais buscas do tipo.
+    Tudo dentro de orcamento_ms (statement_timeout); estourando, devolve o que já achou.
+    """
     with get_db_connection() as conn:
         if not conn: return []
-        termo_texto = termo.strip()
-        param_like_texto = f"%{termo_texto}%"
-        cpf_pesquisa_int = v.ValidadorDocumentos.cpf_para_bigint(termo)
-        query = """
-            SELECT t.id, t.nome, t.cpf, t.identidade 
-            FROM sistema_consulta.sistema_consulta_dados_cadastrais_cpf t
-            WHERE t.nome ILIKE %s OR t.identidade ILIKE %s OR t.nome_pai ILIKE %s OR t.campanhas ILIKE %s OR t.id_importacao ILIKE %s OR
-                EXISTS (SELECT 1 FROM sistema_consulta.sistema_consulta_dados_cadastrais_telefone WHERE cpf = t.cpf AND CAST(telefone AS TEXT) ILIKE %s)
-        """
-        params = [param_like_texto] * 6
-        if cpf_pesquisa_int:
-            query += " OR t.cpf = %s "
-            params.append(cpf_pesquisa_int)
-        else:
-            query += " OR CAST(t.cpf AS TEXT) ILIKE %s "
-            params.append(param_like_texto)
-        query += " LIMIT 30"
+        termo = termo.strip()
+        tipo = classificar_termo_busca(termo)
+        plano = PLANO_BUSCA_RAPIDA[tipo]
+
+        inicio = time.perf_counter()
+        resultado = []
         try:
             with conn.cursor() as cur:
-                cur.execute(query, tuple(params))
-                return cur.fetchall()
+                cur.execute("SET LOCAL statement_timeout = %s", (int(orcamento_ms),))
+                resultado = _buscar_ids_ranqueados(cur, plano[:1], termo)
+                if not resultado and len(plano) > 1:
+                    restante_ms = orcamento_ms - (time.perf_counter() - inicio) * 1000
+                    if restante_ms > 0:
+                        cur.execute("SET LOCAL statement_timeout = %s", (int(restante_ms),))
+                        resultado = _buscar_ids_ranqueados(cur, plano, termo)
+            conn.rollback()
+            return resultado
+        except psycopg2.extensions.QueryCanceledError:
+            conn.rollback()
+            st.toast("Busca interrompida pelo limite de tempo; refine o termo.")
+            return resultado
         except Exception as e:
+            conn.rollback()
             st.error(f"Erro na busca: {e}")
             return []
 
@@ -305,53 +388,126 @@ def buscar_cliente_dinamica(filtros_aplicados):
             st.error(f"Erro SQL: {e}")
             return []
 
-def carregar_dados_cliente_completo(cpf):
-    cpf_val = v.ValidadorDocumentos.cpf_para_bigint(str(cpf))
+# --- FICHA DO CLIENTE: CARGA EM UMA IDA AO BANCO ---
+
+@st.cache_data(ttl=300)
+def carregar_mapa_convenios():
+    """Mapa convênio -> tabela de referência (as colunas/tipos vêm do catálogo em cache)."""
     with get_db_connection() as conn:
         if not conn: return {}
-        dados = {}
         try:
             with conn.cursor() as cur:
-                cur.execute("SELECT * FROM sistema_consulta.sistema_consulta_dados_cadastrais_cpf WHERE cpf = %s", (cpf_val,))
-                cols_pessoais = [desc[0] for desc in cur.description]
-                row_pessoais = cur.fetchone()
-                if row_pessoais:
-                    d_pessoal = dict(zip(cols_pessoais, row_pessoais))
-                    for k, val in d_pessoal.items():
-                        if val is None and k != 'data_nascimento': d_pessoal[k] = ""
-                    dados['pessoal'] = d_pessoal
-                else: dados['pessoal'] = {}
-                try:
-                    cur.execute("SELECT * FROM sistema_consulta.sistema_consulta_dados_clt WHERE cpf = %s LIMIT 1", (cpf_val,))
-                    cols_clt = [desc[0] for desc in cur.description]
-                    row_clt = cur.fetchone()
-                    if row_clt:
-                        d_clt = dict(zip(cols_clt, row_clt))
-                        for k, val in d_clt.items():
-                            if val is None and 'data' not in k: d_clt[k] = ""
-                        dados['clt'] = d_clt
-                except: dados['clt'] = {}
-                cur.execute("SELECT id, telefone FROM sistema_consulta.sistema_consulta_dados_cadastrais_telefone WHERE cpf = %s ORDER BY id", (cpf_val,))
-                dados['telefones'] = [{'id': r[0], 'valor': r[1] or ""} for r in cur.fetchall()]
-                cur.execute("SELECT id, email FROM sistema_consulta.sistema_consulta_dados_cadastrais_email WHERE cpf = %s ORDER BY id", (cpf_val,))
-                dados['emails'] = [{'id': r[0], 'valor': r[1] or ""} for r in cur.fetchall()]
-                cur.execute("SELECT * FROM sistema_consulta.sistema_consulta_dados_cadastrais_endereco WHERE cpf = %s ORDER BY id", (cpf_val,))
-                cols_end = [desc[0] for desc in cur.description]
-                dados['enderecos'] = []
-                for r in cur.fetchall():
-                    d_end = dict(zip(cols_end, r))
-                    for k, val in d_end.items():
-                        if val is None: d_end[k] = ""
-                    dados['enderecos'].append(d_end)
-                cur.execute("SELECT agrupamento FROM sistema_consulta.sistema_consulta_dados_cadastrais_agrupamento_cpf WHERE cpf = %s", (cpf_val,))
-                dados['agrupamentos'] = [r[0] for r in cur.fetchall() if r[0]]
-                try:
-                    cur.execute("SELECT convenio FROM sistema_consulta.sistema_consulta_dados_cadastrais_convenio WHERE cpf = %s", (cpf_val,))
-                    dados['convenios_lista'] = [r[0] for r in cur.fetchall() if r[0]]
-                except: dados['convenios_lista'] = []
+                cur.execute("SELECT nome_convenio, tabela_referencia FROM sistema_consulta.sistema_consulta_convenio_tipo WHERE tabela_referencia IS NOT NULL")
+                return {r[0]: r[1] for r in cur.fetchall()}
+        except Exception: return {}
+
+def _converter_linha_json(linha, tipos):
+    """Devolve aos campos de data/hora vindos do JSON o tipo que o psycopg2 entregaria."""
+    for k, val in linha.items():
+        if not isinstance(val, str): continue
+        tipo = tipos.get(k, '')
+        try:
+            if tipo == 'date': linha[k] = date.fromisoformat(val)
+            elif tipo.startswith('timestamp'): linha[k] = datetime.fromisoformat(val)
+        except ValueError: pass
+    return linha
+
+def _vazios_para_texto(linha, manter=lambda k: False):
+    for k, val in linha.items():
+        if val is None and not manter(k): linha[k] = ""
+    return linha
+
+def carregar_perfil_cliente(cpf):
+    """
+    Carrega a ficha inteira (cadastro, CLT, contatos, endereços, agrupamentos, convênios,
+    contratos e dados de cada tabela de convênio) num único SELECT com sub-selects json_agg.
+    Retorna (dados, estrutura_financeira) no mesmo formato de
+    carregar_dados_cliente_completo / buscar_hierarquia_financeira.
+    """
+    cpf_val = v.ValidadorDocumentos.cpf_para_bigint(str(cpf))
+    mapa_convenios = carregar_mapa_convenios()
+    colunas = {t: dict(info['colunas']) for t, info in catalogo.obter_catalogo().get('sistema_consulta', {}).items()}
+    sc = 'sistema_consulta'
+
+    campos = {
+        'pessoal': f"(SELECT row_to_json(p) FROM {sc}.sistema_consulta_dados_cadastrais_cpf p WHERE p.cpf = %(cpf)s LIMIT 1)",
+        'telefones': f"(SELECT json_agg(json_build_object('id', id, 'valor', telefone) ORDER BY id) FROM {sc}.sistema_consulta_dados_cadastrais_telefone WHERE cpf = %(cpf)s)",
+        'emails': f"(SELECT json_agg(json_build_object('id', id, 'valor', email) ORDER BY id) FROM {sc}.sistema_consulta_dados_cadastrais_email WHERE cpf = %(cpf)s)",
+        'enderecos': f"(SELECT json_agg(e ORDER BY e.id) FROM {sc}.sistema_consulta_dados_cadastrais_endereco e WHERE e.cpf = %(cpf)s)",
+        'agrupamentos': f"(SELECT json_agg(agrupamento) FROM {sc}.sistema_consulta_dados_cadastrais_agrupamento_cpf WHERE cpf = %(cpf)s AND agrupamento IS NOT NULL AND agrupamento <> '')",
+        'contratos': f"(SELECT json_agg(k ORDER BY k.convenio, k.matricula, k.data_inicio DESC) FROM {sc}.sistema_consulta_contrato k WHERE k.cpf = %(cpf)s)",
+    }
+    if 'sistema_consulta_dados_clt' in colunas:
+        campos['clt'] = f"(SELECT row_to_json(c) FROM {sc}.sistema_consulta_dados_clt c WHERE c.cpf = %(cpf)s LIMIT 1)"
+    if 'sistema_consulta_dados_cadastrais_convenio' in colunas:
+        campos['convenios_lista'] = f"(SELECT json_agg(convenio) FROM {sc}.sistema_consulta_dados_cadastrais_convenio WHERE cpf = %(cpf)s AND convenio IS NOT NULL AND convenio <> '')"
+
+    # Tabelas de convênio: o EXISTS sem correlação vira filtro único, então só as do cliente são lidas
+    tabelas_conv = {}
+    params = {'cpf': cpf_val}
+    for nome_conv, tabela_ref in mapa_convenios.items():
+        tabela = tabela_ref.replace('sistema_consulta.', '')
+        if tabela not in colunas or 'cpf' not in colunas[tabela]: continue
+        tabelas_conv.setdefault(tabela, []).append(nome_conv)
+    for i, (tabela, nomes_conv) in enumerate(tabelas_conv.items()):
+        params[f'conv_{i}'] = nomes_conv
+        campos[f'conv_{i}'] = sql.SQL(
+            "(SELECT json_agg(x) FROM {sc}.{tab} x WHERE x.cpf = %(cpf)s AND EXISTS "
+            "(SELECT 1 FROM {sc}.sistema_consulta_contrato WHERE cpf = %(cpf)s AND convenio = ANY(%({p})s)))"
+        ).format(sc=sql.Identifier(sc), tab=sql.Identifier(tabela), p=sql.SQL(f'conv_{i}'))
+
+    with get_db_connection() as conn:
+        if not conn: return {}, {}
+        try:
+            with conn.cursor() as cur:
+                selects = [sql.SQL("({})::text AS {}").format(c if isinstance(c, sql.Composable) else sql.SQL(c), sql.Identifier(nome)) for nome, c in campos.items()]
+                cur.execute(sql.SQL("SELECT {}").format(sql.SQL(", ").join(selects)), params)
+                row = cur.fetchone()
         except Exception as e:
             st.error(f"Erro ao carregar cliente: {e}")
-        return dados
+            return {}, {}
+
+    bruto = {nome: (json.loads(val, parse_float=Decimal) if val else None) for nome, val in zip(campos.keys(), row)}
+    tipos = lambda tabela: colunas.get(tabela, {})
+
+    dados = {}
+    pessoal = bruto['pessoal'] or {}
+    dados['pessoal'] = _vazios_para_texto(_converter_linha_json(pessoal, tipos('sistema_consulta_dados_cadastrais_cpf')), lambda k: k == 'data_nascimento')
+    if bruto.get('clt'):
+        dados['clt'] = _vazios_para_texto(_converter_linha_json(bruto['clt'], tipos('sistema_consulta_dados_clt')), lambda k: 'data' in k)
+    elif 'clt' not in campos:
+        dados['clt'] = {}
+    dados['telefones'] = [{'id': r['id'], 'valor': r['valor'] or ""} for r in bruto['telefones'] or []]
+    dados['emails'] = [{'id': r['id'], 'valor': r['valor'] or ""} for r in bruto['emails'] or []]
+    dados['enderecos'] = [_vazios_para_texto(_converter_linha_json(r, tipos('sistema_consulta_dados_cadastrais_endereco'))) for r in bruto['enderecos'] or []]
+    dados['agrupamentos'] = bruto['agrupamentos'] or []
+    dados['convenios_lista'] = bruto.get('convenios_lista') or []
+
+    estrutura = {}
+    for d_contrato in bruto['contratos'] or []:
+        d_contrato = _vazios_para_texto(_converter_linha_json(d_contrato, tipos('sistema_consulta_contrato')))
+        nome_conv = d_contrato.get('convenio') or 'DESCONHECIDO'
+        num_matr = d_contrato.get('matricula')
+        if num_matr is None or num_matr == "": num_matr = 0
+        chave = (nome_conv, num_matr)
+        if chave not in estrutura: estrutura[chave] = {'contratos': [], 'dados_convenio': {}, 'tabela_ref': None}
+        estrutura[chave]['contratos'].append(d_contrato)
+
+    linhas_conv = {tabela: bruto.get(f'conv_{i}') or [] for i, tabela in enumerate(tabelas_conv)}
+    for (nome_conv, num_matr), dados_grupo in estrutura.items():
+        tabela_ref = mapa_convenios.get(nome_conv)
+        if not tabela_ref: continue
+        dados_grupo['tabela_ref'] = tabela_ref
+        tabela = tabela_ref.replace('sistema_consulta.', '')
+        linhas = linhas_conv.get(tabela, [])
+        if 'matricula' in tipos(tabela) and num_matr != 0:
+            linhas = [l for l in linhas if str(l.get('matricula')) == str(num_matr)]
+        if linhas:
+            dados_grupo['dados_convenio'] = _vazios_para_texto(_converter_linha_json(dict(linhas[0]), tipos(tabela)))
+    return dados, estrutura
+
+def carregar_dados_cliente_completo(cpf):
+    return carregar_perfil_cliente(cpf)[0]
 
 def listar_contratos_cliente(cpf):
     cpf_val = v.ValidadorDocumentos.cpf_para_bigint(str(cpf))
@@ -384,15 +540,8 @@ def buscar_tabela_por_convenio(nome_convenio):
                 return res[0] if res else None
         except Exception: return None
 
-@st.cache_data(ttl=3600)
 def listar_colunas_tabela(nome_tabela):
-    with get_db_connection() as conn:
-        if not conn: return []
-        try:
-            with conn.cursor() as cur:
-                cur.execute("SELECT column_name FROM information_schema.columns WHERE table_schema = 'sistema_consulta' AND table_name = %s", (nome_tabela.replace('sistema_consulta.', ''),))
-                return [row[0] for row in cur.fetchall()]
-        except Exception: return []
+    return catalogo.listar_colunas(nome_tabela.replace('sistema_consulta.', ''), 'sistema_consulta')
 
 def listar_tipos_convenio_disponiveis():
     with get_db_connection() as conn:
@@ -428,57 +577,7 @@ def buscar_dados_dinamicos_especificos(tabela, cpf, matricula):
         except Exception: return {}
 
 def buscar_hierarquia_financeira(cpf):
-    cpf_val = v.ValidadorDocumentos.cpf_para_bigint(str(cpf))
-    with get_db_connection() as conn:
-        if not conn: return {}
-        estrutura = {}
-        try:
-            with conn.cursor() as cur:
-                cur.execute("SELECT * FROM sistema_consulta.sistema_consulta_contrato WHERE cpf = %s ORDER BY convenio, matricula, data_inicio DESC", (cpf_val,))
-                cols_contrato = [desc[0] for desc in cur.description]
-                rows_contratos = cur.fetchall()
-                if not rows_contratos: return {}
-                mapa_convenio_tabela = {} 
-                for row in rows_contratos:
-                    d_contrato = dict(zip(cols_contrato, row))
-                    for k, val in d_contrato.items():
-                        if val is None: d_contrato[k] = ""
-                    nome_conv = d_contrato.get('convenio') or 'DESCONHECIDO'
-                    num_matr = d_contrato.get('matricula')
-                    if num_matr is None: num_matr = 0
-                    chave = (nome_conv, num_matr)
-                    if chave not in estrutura: estrutura[chave] = {'contratos': [], 'dados_convenio': {}, 'tabela_ref': None}
-                    estrutura[chave]['contratos'].append(d_contrato)
-                convenios_unicos = list(set([k[0] for k in estrutura.keys()]))
-                if convenios_unicos:
-                    cur.execute("SELECT nome_convenio, tabela_referencia FROM sistema_consulta.sistema_consulta_convenio_tipo WHERE nome_convenio = ANY(%s)", (convenios_unicos,))
-                    for r in cur.fetchall(): mapa_convenio_tabela[r[0]] = r[1]
-                for (nome_conv, num_matr), dados_grupo in estrutura.items():
-                    tabela_ref = mapa_convenio_tabela.get(nome_conv)
-                    if tabela_ref:
-                        dados_grupo['tabela_ref'] = tabela_ref
-                        try:
-                            cur.execute(sql.SQL("SELECT column_name FROM information_schema.columns WHERE table_schema = 'sistema_consulta' AND table_name = %s"), (tabela_ref.replace('sistema_consulta.', ''),))
-                            colunas_tabela_ref = [c[0] for c in cur.fetchall()]
-                            tem_matricula = 'matricula' in colunas_tabela_ref
-                            query_dinamica = sql.SQL("SELECT * FROM sistema_consulta.{} WHERE cpf = %s").format(sql.Identifier(tabela_ref.replace('sistema_consulta.', '')))
-                            params_dinamica = [cpf_val]
-                            if tem_matricula and num_matr != 0:
-                                query_dinamica = sql.SQL("SELECT * FROM sistema_consulta.{} WHERE cpf = %s AND matricula = %s LIMIT 1").format(sql.Identifier(tabela_ref.replace('sistema_consulta.', '')))
-                                params_dinamica.append(num_matr)
-                            else:
-                                query_dinamica = sql.SQL("SELECT * FROM sistema_consulta.{} WHERE cpf = %s LIMIT 1").format(sql.Identifier(tabela_ref.replace('sistema_consulta.', '')))
-                            cur.execute(query_dinamica, params_dinamica)
-                            row_dados = cur.fetchone()
-                            if row_dados:
-                                cols_desc = [d[0] for d in cur.description]
-                                dict_dados = dict(zip(cols_desc, row_dados))
-                                for k, val in dict_dados.items():
-                                    if val is None: dict_dados[k] = ""
-                                dados_grupo['dados_convenio'] = dict_dados
-                        except Exception: pass
-        except Exception as e: st.error(f"Erro na busca financeira: {e}")
-        return estrutura
+    return carregar_perfil_cliente(cpf)[1]
 
 def salvar_novo_cliente(dados_form):
     cpf_bigint = v.ValidadorDocumentos.cpf_para_bigint(dados_form.get('cpf'))
@@ -794,9 +893,8 @@ def tela_ficha_cliente(cpf, modo='visualizar'):
                     st.success("Cadastrado!"); st.session_state['cliente_ativo_cpf'] = v.ValidadorDocumentos.cpf_para_bigint(cpf_in); st.session_state['modo_visualizacao'] = 'visualizar'; time.sleep(1); st.rerun()
         return
 
-    dados = carregar_dados_cliente_completo(cpf)
+    dados, financeiro = carregar_perfil_cliente(cpf)
     pessoal = dados.get('pessoal', {})
-    financeiro = buscar_hierarquia_financeira(cpf)
 
     st.markdown("""<style>.stTextInput label p, .stTextArea label p, .stDateInput label p, .stSelectbox label p {color: black !important; text-decoration: underline; font-weight: bold;} input:disabled, textarea:disabled {color: black !important; -webkit-text-fill-color: black !important; opacity: 1 !important; font-weight: 500;}</style>""", unsafe_allow_html=True)
 
@@ -1084,6 +1182,8 @@ def app_cadastro():
         </style>
     """, unsafe_allow_html=True)
 
+    if modulo_busca_indices: modulo_busca_indices.garantir_indices_busca('sistema_consulta')
+
     if 'modo_visualizacao' not in st.session_state: st.session_state['modo_visualizacao'] = None
     if st.session_state['modo_visualizacao'] == 'visualizar':
         if st.session_state.get('cliente_ativo_cpf'): tela_ficha_cliente(st.session_state['cliente_ativo_cpf'])
@@ -9,6 +9,9 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 
+# Mesmo flag de sistema.py: só recarrega módulos já importados no modo de desenvolvimento
+RECARREGAR_MODULOS = os.environ.get("SISTEMA_HOT_RELOAD") == "1"
+
 def carregar_modulo(nome_modulo):
     """
     Função auxiliar para importar módulos apenas quando necessário (Lazy Import).
@@ -16,7 +19,9 @@ def carregar_modulo(nome_modulo):
     """
     try:
         if nome_modulo in sys.modules:
-            # Se já foi importado, recarrega para pegar alterações recentes
+            # Já importado: reaproveita (recarrega só no modo de desenvolvimento)
+            if not RECARREGAR_MODULOS:
+                return sys.modules[nome_modulo]
             return importlib.reload(sys.modules[nome_modulo])
         else:
             # Se não, importa pela primeira vez
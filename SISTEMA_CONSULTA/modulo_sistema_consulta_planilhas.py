@@ -18,6 +18,9 @@ except ImportError:
     st.error("Arquivo 'conexao.py' não encontrado.")
     conexao = None
 
+import modulo_catalogo as catalogo
+import modulo_salvamento_incremental as salvamento
+
 # --- CONSTANTES ---
 # Tabelas que NÃO podem ser editadas diretamente por serem gigantes
 TABELAS_READ_ONLY = [
@@ -41,19 +44,7 @@ def get_conn():
         return None
 
 def listar_tabelas():
-    conn = get_conn()
-    if not conn: return []
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT table_name 
-                FROM information_schema.tables 
-                WHERE table_schema = 'sistema_consulta' 
-                ORDER BY table_name
-            """)
-            return [r[0] for r in cur.fetchall()]
-    except: return []
-    finally: conn.close()
+    return catalogo.listar_tabelas('sistema_consulta')
 
 def carregar_dados_paginados(tabela, pagina, linhas_por_pagina, filtro_col=None, filtro_val=None):
     """Lê dados com LIMIT e OFFSET para não travar a memória"""
@@ -100,33 +91,23 @@ def carregar_dados_paginados(tabela, pagina, linhas_por_pagina, filtro_col=None,
         return pd.DataFrame(), 0
     finally: conn.close()
 
-def salvar_edicao_pequena(df_alterado, tabela, chave_primaria='id'):
+def salvar_edicao_pequena(df_alterado, tabela, df_original, chave_primaria=None):
     """
-    Salva edições APENAS para tabelas de configuração (pequenas).
-    Usa DELETE + INSERT (Truncate) ou UPDATE linha a linha seria muito complexo aqui.
-    Para tabelas pequenas, Truncate + Insert é aceitável.
+    Grava só as linhas incluídas/alteradas/excluídas na página em edição,
+    comparando com df_original pela chave primária (ver modulo_salvamento_incremental).
+    As demais linhas da tabela (outras páginas) não são tocadas.
     """
     conn = get_conn()
     if not conn: return False
     
     try:
-        cur = conn.cursor()
-        # 1. Limpa tabela
-        cur.execute(f"TRUNCATE TABLE sistema_consulta.{tabela} RESTART IDENTITY")
-        
-        # 2. Insere dados novos
-        colunas = list(df_alterado.columns)
-        vals = [tuple(x) for x in df_alterado.to_numpy()]
-        
-        placeholders = ",".join(["%s"] * len(colunas))
-        cols_str = ",".join(colunas)
-        
-        insert_query = f"INSERT INTO sistema_consulta.{tabela} ({cols_str}) VALUES ({placeholders})"
-        cur.executemany(insert_query, vals)
-        
+        chaves = [chave_primaria] if chave_primaria else None
+        resultado = salvamento.salvar_diff(conn, 'sistema_consulta', tabela, df_original, df_alterado, chaves=chaves)
         conn.commit()
+        st.toast(salvamento.resumo_diff(resultado))
         return True
     except Exception as e:
+        conn.rollback()
         st.error(f"Erro ao salvar: {e}")
         return False
     finally: conn.close()
@@ -150,14 +131,8 @@ def app_planilhas():
         # Filtros Rápidos
         cols_filtro = []
         if tabela_sel:
-            conn_temp = get_conn()
-            try:
-                # Pega colunas para o filtro
-                cur = conn_temp.cursor()
-                cur.execute(f"SELECT column_name FROM information_schema.columns WHERE table_name = '{tabela_sel}' AND table_schema = 'sistema_consulta'")
-                cols_filtro = [r[0] for r in cur.fetchall()]
-            except: pass
-            finally: conn_temp.close()
+            # Pega colunas para o filtro
+            cols_filtro = catalogo.listar_colunas(tabela_sel, 'sistema_consulta')
 
         c_filtro_col, c_filtro_val = st.columns([1, 2])
         col_f = c_filtro_col.selectbox("Filtrar por Coluna:", ["(Sem Filtro)"] + cols_filtro)
@@ -181,8 +156,8 @@ def app_planilhas():
             # Tabela Pequena (Configuração): Permite Edição
             df_editado = st.data_editor(df, num_rows="dynamic", use_container_width=True, key=f"edit_{tabela_sel}")
             
-            if st.button("💾 Salvar Alterações (Sobrescrever Tabela)"):
-                if salvar_edicao_pequena(df_editado, tabela_sel):
+            if st.button("💾 Salvar Alterações"):
+                if salvar_edicao_pequena(df_editado, tabela_sel, df):
                     st.success("Tabela atualizada com sucesso!")
                     time.sleep(1)
                     st.rerun()
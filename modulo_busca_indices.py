@@ -0,0 +1,121 @@
+import psycopg2
+import threading
+
+try:
+    import conexao
+except ImportError:
+    conexao = None
+
+# =============================================================================
+# ÍNDICES DE BUSCA (pg_trgm)
+# Buscas do tipo ILIKE '%termo%' só usam índice com GIN de trigramas.
+# CPF e telefone são indexados pela expressão "só dígitos"; as consultas
+# precisam repetir exatamente a mesma expressão para o planner usar o índice.
+# Os editores de planilha gravam todas as colunas da linha, por isso a
+# normalização fica no índice e não em colunas novas na tabela.
+# =============================================================================
+
+def expr_digitos(coluna):
+    """Expressão SQL (idêntica à dos índices) que deixa só os dígitos da coluna."""
+    return f"regexp_replace({coluna}::text, '[^0-9]', '', 'g')"
+
+# grupo (schema) -> [(nome_indice, tabela, método, expressão)]
+INDICES_BUSCA = {
+    'banco_pf': [
+        ('idx_pf_dados_nome_trgm', 'pf_dados', 'gin', 'nome gin_trgm_ops'),
+        ('idx_pf_dados_cpf_trgm', 'pf_dados', 'gin', 'cpf gin_trgm_ops'),
+        ('idx_pf_telefones_numero_trgm', 'pf_telefones', 'gin', f"({expr_digitos('numero')}) gin_trgm_ops"),
+        ('idx_pf_telefones_cpf', 'pf_telefones', 'btree', 'cpf'),
+        # CPFs tocados por importações novas (refresh incremental do público das campanhas)
+        ('idx_pf_telefones_importacao', 'pf_telefones', 'btree', 'importacao_id'),
+        ('idx_pf_emails_importacao', 'pf_emails', 'btree', 'importacao_id'),
+        ('idx_pf_enderecos_importacao', 'pf_enderecos', 'btree', 'importacao_id'),
+        ('idx_pf_emprego_renda_importacao', 'pf_emprego_renda', 'btree', 'importacao_id'),
+        ('idx_pf_contratos_importacao', 'pf_contratos', 'btree', 'importacao_id'),
+        ('idx_pf_matricula_dados_clt_importacao', 'pf_matricula_dados_clt', 'btree', 'importacao_id'),
+        # pf_dados.importacao_id acumula "1, 5, 7": indexa o último id (mesma expressão da consulta)
+        ('idx_pf_dados_ultima_importacao', 'pf_dados', 'btree', r"((regexp_match(importacao_id, '(\d+)\s*$'))[1]::BIGINT)"),
+    ],
+    'sistema_consulta': [
+        ('idx_sc_cpf_nome_trgm', 'sistema_consulta_dados_cadastrais_cpf', 'gin', 'nome gin_trgm_ops'),
+        ('idx_sc_cpf_identidade_trgm', 'sistema_consulta_dados_cadastrais_cpf', 'gin', 'identidade gin_trgm_ops'),
+        ('idx_sc_cpf_nome_pai_trgm', 'sistema_consulta_dados_cadastrais_cpf', 'gin', 'nome_pai gin_trgm_ops'),
+        ('idx_sc_cpf_campanhas_trgm', 'sistema_consulta_dados_cadastrais_cpf', 'gin', 'campanhas gin_trgm_ops'),
+        ('idx_sc_cpf_id_importacao_trgm', 'sistema_consulta_dados_cadastrais_cpf', 'gin', 'id_importacao gin_trgm_ops'),
+        ('idx_sc_cpf_cpf_texto_trgm', 'sistema_consulta_dados_cadastrais_cpf', 'gin', '(cpf::text) gin_trgm_ops'),
+        ('idx_sc_telefone_digitos_trgm', 'sistema_consulta_dados_cadastrais_telefone', 'gin', f"({expr_digitos('telefone')}) gin_trgm_ops"),
+        ('idx_sc_telefone_cpf', 'sistema_consulta_dados_cadastrais_telefone', 'btree', 'cpf'),
+        ('idx_sc_email_email_trgm', 'sistema_consulta_dados_cadastrais_email', 'gin', 'email gin_trgm_ops'),
+        ('idx_sc_email_cpf', 'sistema_consulta_dados_cadastrais_email', 'btree', 'cpf'),
+    ],
+    'admin': [
+        # Última instância que falou com o número (fixação do roteador de envio do WhatsApp)
+        ('idx_wapi_logs_telefone_data', 'wapi_logs', 'btree', 'telefone, data_hora DESC'),
+        ('idx_wapi_logs_data_hora', 'wapi_logs', 'btree', 'data_hora DESC'),
+        # Conciliação de números (telefone já gravado limpo pelo webhook)
+        ('idx_wapi_numeros_telefone_trgm', 'wapi_numeros', 'gin', 'telefone gin_trgm_ops'),
+        ('idx_wapi_numeros_nome_cliente_trgm', 'wapi_numeros', 'gin', 'nome_cliente gin_trgm_ops'),
+        ('idx_wapi_numeros_grupo_trgm', 'wapi_numeros', 'gin', 'grupo gin_trgm_ops'),
+        ('idx_wapi_numeros_ultima_interacao', 'wapi_numeros', 'btree', 'data_ultima_interacao DESC NULLS LAST'),
+    ],
+}
+
+_grupos_provisionados = set()
+_lock_provisionamento = threading.Lock()
+
+def get_conn():
+    try:
+        return psycopg2.connect(
+            host=conexao.host, port=conexao.port, database=conexao.database,
+            user=conexao.user, password=conexao.password
+        )
+    except: return None
+
+def provisionar_indices_busca(grupo, schema=None, conn=None, concorrente=True):
+    """
+    Cria a extensão pg_trgm e os índices do grupo (IF NOT EXISTS).
+    Roda em autocommit para permitir CREATE INDEX CONCURRENTLY (não trava escrita nas tabelas);
+    cada índice é independente: falha em um não impede os outros.
+    Retorna a lista de (nome_indice, erro) que não puderam ser criados.
+    """
+    schema = schema or grupo
+    conn_propria = conn is None
+    conn = conn or get_conn()
+    if not conn: return [('conexao', 'sem conexão')]
+
+    falhas = []
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            try: cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            except Exception as e: falhas.append(('pg_trgm', str(e)))
+
+            modo = "CONCURRENTLY " if concorrente else ""
+            for nome, tabela, metodo, expressao in INDICES_BUSCA.get(grupo, []):
+                try:
+                    # Tabela particionada (ex.: admin.wapi_logs) não aceita CONCURRENTLY
+                    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (f"{schema}.{tabela}",))
+                    particionada = (cur.fetchone() or (None,))[0] == 'p'
+                    cur.execute(f"CREATE INDEX {'' if particionada else modo}IF NOT EXISTS {nome} ON {schema}.{tabela} USING {metodo} ({expressao})")
+                except Exception as e:
+                    falhas.append((nome, str(e)))
+    finally:
+        if conn_propria: conn.close()
+    return falhas
+
+def _provisionar_em_segundo_plano(grupo):
+    falhas = provisionar_indices_busca(grupo)
+    for nome, erro in falhas: print(f"Índice de busca {nome} não criado: {erro}")
+    if any(nome == 'conexao' for nome, _ in falhas):
+        with _lock_provisionamento: _grupos_provisionados.discard(grupo)
+
+def garantir_indices_busca(grupo):
+    """
+    Provisiona os índices do grupo uma vez por processo (chamado pelo setup dos módulos).
+    A criação em bases grandes leva minutos, então roda numa thread e a tela não espera;
+    até terminar, as buscas funcionam normalmente, só que sem o índice.
+    """
+    with _lock_provisionamento:
+        if grupo in _grupos_provisionados: return
+        _grupos_provisionados.add(grupo)
+    threading.Thread(target=_provisionar_em_segundo_plano, args=(grupo,), daemon=True).start()
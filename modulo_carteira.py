@@ -0,0 +1,96 @@
+import psycopg2
+from decimal import Decimal
+
+try:
+    import conexao
+except ImportError:
+    conexao = None
+
+# =============================================================================
+# SALDO DAS CARTEIRAS DE CLIENTES
+# O extrato (cliente.extrato_carteira_por_produto) continua sendo o histórico;
+# o saldo corrente fica numa linha por cliente, atualizada na mesma transação
+# do lançamento. As funções de movimentação recebem o cursor da transação
+# do chamador.
+# =============================================================================
+
+TABELA_SALDO = "cliente.saldo_carteira_cliente"
+
+_tabela_verificada = False
+
+def get_conn():
+    try:
+        return psycopg2.connect(
+            host=conexao.host, port=conexao.port, database=conexao.database,
+            user=conexao.user, password=conexao.password
+        )
+    except: return None
+
+def criar_tabela_saldo():
+    conn = get_conn()
+    if not conn: return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {TABELA_SALDO} (
+                    id_cliente TEXT PRIMARY KEY,
+                    saldo NUMERIC NOT NULL DEFAULT 0,
+                    data_atualizacao TIMESTAMP DEFAULT NOW()
+                )
+            """)
+        conn.commit(); return True
+    except: return False
+    finally: conn.close()
+
+def garantir_tabela_saldo():
+    """Cria a tabela de saldo uma vez por processo, em conexão própria (fora da transação do lançamento)."""
+    global _tabela_verificada
+    if not _tabela_verificada:
+        _tabela_verificada = criar_tabela_saldo()
+
+def _semear_saldo_do_extrato(cur, id_cliente):
+    """Primeiro acesso do cliente: copia o último saldo_novo do extrato (ou 0) para a tabela de saldo."""
+    cur.execute(f"""
+        INSERT INTO {TABELA_SALDO} (id_cliente, saldo, data_atualizacao)
+        SELECT %s, COALESCE((
+            SELECT saldo_novo FROM cliente.extrato_carteira_por_produto
+            WHERE id_cliente = %s ORDER BY id DESC LIMIT 1
+        ), 0), NOW()
+        ON CONFLICT (id_cliente) DO NOTHING
+    """, (id_cliente, id_cliente))
+
+def obter_saldo(cur, id_cliente):
+    """Saldo atual do cliente (leitura simples pela chave, sem travar a linha)."""
+    id_cliente = str(id_cliente)
+    garantir_tabela_saldo()
+    cur.execute(f"SELECT saldo FROM {TABELA_SALDO} WHERE id_cliente = %s", (id_cliente,))
+    res = cur.fetchone()
+    if res: return float(res[0])
+
+    cur.execute("SELECT saldo_novo FROM cliente.extrato_carteira_por_produto WHERE id_cliente = %s ORDER BY id DESC LIMIT 1", (id_cliente,))
+    res = cur.fetchone()
+    return float(res[0]) if res and res[0] is not None else 0.0
+
+def movimentar_saldo(cur, id_cliente, tipo_lancamento, valor):
+    """
+    Aplica CREDITO/DEBITO no saldo com UPDATE ... RETURNING e retorna (saldo_anterior, saldo_novo).
+    A linha do cliente fica travada até o commit/rollback do chamador, então lançamentos
+    concorrentes do mesmo cliente são serializados e o extrato nunca recebe saldos repetidos.
+    """
+    id_cliente = str(id_cliente)
+    delta = Decimal(str(valor))
+    if tipo_lancamento != 'CREDITO': delta = -delta
+
+    garantir_tabela_saldo()
+    sql_update = f"""
+        UPDATE {TABELA_SALDO} SET saldo = saldo + %s, data_atualizacao = NOW()
+        WHERE id_cliente = %s
+        RETURNING saldo - %s, saldo
+    """
+    cur.execute(sql_update, (delta, id_cliente, delta))
+    res = cur.fetchone()
+    if not res:
+        _semear_saldo_do_extrato(cur, id_cliente)
+        cur.execute(sql_update, (delta, id_cliente, delta))
+        res = cur.fetchone()
+    return float(res[0]), float(res[1])
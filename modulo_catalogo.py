@@ -0,0 +1,197 @@
+import time
+import threading
+import psycopg2
+
+try:
+    import conexao
+except ImportError:
+    conexao = None
+
+# =============================================================================
+# CATÁLOGO DE SCHEMAS/TABELAS/COLUNAS (CACHE POR PROCESSO)
+# Carregado do pg_catalog numa única consulta e guardado em memória.
+# Um event trigger incrementa admin.catalogo_schema_versao a cada DDL; a versão
+# é conferida no máximo a cada INTERVALO_VERIFICACAO_VERSAO segundos. Sem
+# permissão para criar o event trigger (exige superusuário), o catálogo é
+# recarregado a cada INTERVALO_RECARGA_SEM_TRIGGER segundos.
+# =============================================================================
+
+INTERVALO_VERIFICACAO_VERSAO = 30
+INTERVALO_RECARGA_SEM_TRIGGER = 300
+
+SCHEMAS_SISTEMA = ('information_schema', 'pg_catalog', 'pg_toast')
+
+# relkind do pg_class -> table_type do information_schema
+TIPOS_RELACAO = {'r': 'BASE TABLE', 'p': 'BASE TABLE', 'v': 'VIEW', 'm': 'VIEW', 'f': 'FOREIGN'}
+
+_estado = {"lock": threading.Lock(), "catalogo": None, "versao": None, "verificado_em": 0.0,
+           "carregado_em": 0.0, "estrutura_ok": False, "trigger_ok": False}
+
+def get_conn():
+    try:
+        return psycopg2.connect(
+            host=conexao.host, port=conexao.port, database=conexao.database,
+            user=conexao.user, password=conexao.password
+        )
+    except: return None
+
+def criar_estrutura_versao_catalogo(cur):
+    """Tabela de versão do catálogo (linha única, incrementada pelos event triggers)."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS admin.catalogo_schema_versao (
+            id INTEGER PRIMARY KEY DEFAULT 1,
+            versao BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("INSERT INTO admin.catalogo_schema_versao (id, versao) VALUES (1, 0) ON CONFLICT (id) DO NOTHING")
+
+def criar_event_triggers_catalogo(cur):
+    """
+    Event triggers valem para o banco inteiro e rodam com o papel de quem faz o DDL:
+    as funções são SECURITY DEFINER (dono = quem as criou) com search_path fixo, e
+    engolem qualquer erro, para o incremento da versão nunca barrar DDL de outro papel.
+    """
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION admin.fn_catalogo_versao_ddl() RETURNS event_trigger AS $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_event_trigger_ddl_commands()
+                       WHERE schema_name IS NULL OR schema_name NOT LIKE 'pg_temp%') THEN
+                UPDATE admin.catalogo_schema_versao SET versao = versao + 1 WHERE id = 1;
+            END IF;
+        EXCEPTION WHEN OTHERS THEN
+            NULL;  -- versão não incrementada: o catálogo recarrega pelo intervalo
+        END;
+        $$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = pg_catalog, pg_temp
+    """)
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION admin.fn_catalogo_versao_drop() RETURNS event_trigger AS $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_event_trigger_dropped_objects() WHERE NOT is_temporary) THEN
+                UPDATE admin.catalogo_schema_versao SET versao = versao + 1 WHERE id = 1;
+            END IF;
+        EXCEPTION WHEN OTHERS THEN
+            NULL;  -- versão não incrementada: o catálogo recarrega pelo intervalo
+        END;
+        $$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = pg_catalog, pg_temp
+    """)
+    cur.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_event_trigger WHERE evtname = 'trg_catalogo_versao_ddl') THEN
+                CREATE EVENT TRIGGER trg_catalogo_versao_ddl ON ddl_command_end
+                EXECUTE FUNCTION admin.fn_catalogo_versao_ddl();
+            END IF;
+            IF NOT EXISTS (SELECT 1 FROM pg_event_trigger WHERE evtname = 'trg_catalogo_versao_drop') THEN
+                CREATE EVENT TRIGGER trg_catalogo_versao_drop ON sql_drop
+                EXECUTE FUNCTION admin.fn_catalogo_versao_drop();
+            END IF;
+        END $$
+    """)
+
+def _carregar_catalogo(cur):
+    """{schema: {tabela: {'tipo': 'BASE TABLE'|'VIEW'|..., 'colunas': [(coluna, tipo), ...], 'pk': [coluna, ...]}}} numa consulta."""
+    cur.execute("""
+        SELECT n.nspname, c.relname, c.relkind, a.attname, format_type(a.atttypid, NULL),
+               COALESCE(a.attnum = ANY(i.indkey), FALSE)
+        FROM pg_namespace n
+        LEFT JOIN pg_class c ON c.relnamespace = n.oid AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+        LEFT JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        LEFT JOIN pg_index i ON i.indrelid = c.oid AND i.indisprimary
+        WHERE n.nspname NOT IN %s AND n.nspname NOT LIKE 'pg_temp_%%' AND n.nspname NOT LIKE 'pg_toast_temp_%%'
+        ORDER BY n.nspname, c.relname, a.attnum
+    """, (SCHEMAS_SISTEMA,))
+    catalogo = {}
+    for schema, tabela, relkind, coluna, tipo, eh_pk in cur.fetchall():
+        tabelas = catalogo.setdefault(schema, {})
+        if tabela is None: continue
+        info = tabelas.setdefault(tabela, {'tipo': TIPOS_RELACAO.get(relkind, relkind), 'colunas': [], 'pk': []})
+        if coluna is not None:
+            info['colunas'].append((coluna, tipo))
+            if eh_pk: info['pk'].append(coluna)
+    return catalogo
+
+def obter_catalogo():
+    """Catálogo em cache; só vai ao banco quando não há cache ou a versão pode ter mudado."""
+    agora = time.monotonic()
+    if _estado["catalogo"] is not None and agora - _estado["verificado_em"] < INTERVALO_VERIFICACAO_VERSAO:
+        return _estado["catalogo"]
+
+    with _estado["lock"]:
+        if _estado["catalogo"] is not None and agora - _estado["verificado_em"] < INTERVALO_VERIFICACAO_VERSAO:
+            return _estado["catalogo"]
+
+        conn = get_conn()
+        if not conn: return _estado["catalogo"] or {}
+        try:
+            cur = conn.cursor()
+            if not _estado["estrutura_ok"]:
+                try:
+                    criar_estrutura_versao_catalogo(cur)
+                    conn.commit()
+                    _estado["estrutura_ok"] = True
+                except Exception as e:
+                    print(f"Aviso: versão do catálogo indisponível: {e}")
+                    conn.rollback()
+                if _estado["estrutura_ok"]:
+                    try:
+                        criar_event_triggers_catalogo(cur)
+                        conn.commit()
+                    except Exception as e:
+                        print(f"Aviso: event trigger do catálogo não criado (recarga por tempo): {e}")
+                        conn.rollback()
+                    cur.execute("SELECT COUNT(*) FROM pg_event_trigger WHERE evtname IN ('trg_catalogo_versao_ddl', 'trg_catalogo_versao_drop') AND evtenabled <> 'D'")
+                    _estado["trigger_ok"] = cur.fetchone()[0] == 2
+
+            versao = None
+            if _estado["estrutura_ok"]:
+                cur.execute("SELECT versao FROM admin.catalogo_schema_versao WHERE id = 1")
+                res = cur.fetchone()
+                versao = res[0] if res else None
+
+            expirado = not _estado["trigger_ok"] and agora - _estado["carregado_em"] >= INTERVALO_RECARGA_SEM_TRIGGER
+            if _estado["catalogo"] is None or versao is None or versao != _estado["versao"] or expirado:
+                _estado["catalogo"] = _carregar_catalogo(cur)
+                _estado["versao"] = versao
+                _estado["carregado_em"] = time.monotonic()
+            _estado["verificado_em"] = time.monotonic()
+            conn.close()
+            return _estado["catalogo"]
+        except Exception as e:
+            print(f"Erro ao carregar catálogo: {e}")
+            conn.close()
+            return _estado["catalogo"] or {}
+
+def _separar_nome(tabela, schema=None):
+    if schema is None and '.' in tabela: schema, tabela = tabela.split('.', 1)
+    return (schema or 'public').strip('"'), tabela.strip('"')
+
+# --- CONSULTAS AO CATÁLOGO ---
+
+def listar_schemas():
+    return sorted(obter_catalogo().keys())
+
+def listar_tabelas(schema, apenas_base=False):
+    tabelas = obter_catalogo().get(schema, {})
+    return sorted(t for t, info in tabelas.items() if not apenas_base or info['tipo'] == 'BASE TABLE')
+
+def tabela_existe(tabela, schema=None):
+    schema, tabela = _separar_nome(tabela, schema)
+    return tabela in obter_catalogo().get(schema, {})
+
+def listar_colunas_tipos(tabela, schema=None):
+    """[(coluna, tipo)] na ordem da tabela; aceita 'schema.tabela' ou tabela + schema."""
+    schema, tabela = _separar_nome(tabela, schema)
+    info = obter_catalogo().get(schema, {}).get(tabela)
+    return list(info['colunas']) if info else []
+
+def listar_colunas(tabela, schema=None):
+    return [c for c, _ in listar_colunas_tipos(tabela, schema)]
+
+def tabela_tem_coluna(tabela, coluna, schema=None):
+    return coluna in listar_colunas(tabela, schema)
+
+def listar_chave_primaria(tabela, schema=None):
+    """Colunas da chave primária (lista vazia se a tabela não tiver PK)."""
+    schema, tabela = _separar_nome(tabela, schema)
+    info = obter_catalogo().get(schema, {}).get(tabela)
+    return list(info['pk']) if info else []
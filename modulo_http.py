@@ -0,0 +1,153 @@
+import time
+import random
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# =============================================================================
+# CLIENTE HTTP COMPARTILHADO (APIs EXTERNAS)
+# Uma requests.Session por host (scheme://host:porta) por processo, com pool
+# de conexões keep-alive: DNS + TCP + TLS só na primeira chamada.
+# Cada chamada informa um `endpoint` (ex.: 'wapi.send-text'), que define o
+# timeout, o orçamento total de tempo (somando as tentativas) e quantas vezes
+# repetir. Só repete o que é seguro: GET/HEAD idempotentes, ou qualquer método
+# quando a conexão nem chegou a ser aberta (ConnectTimeout). Chamadas que
+# cobram ou enviam mensagem ficam com tentativas=1.
+# A latência de cada chamada vai para um histograma por endpoint
+# (estatisticas_http()).
+# =============================================================================
+
+POOL_POR_HOST = 16
+STATUS_REPETIVEIS = (429, 500, 502, 503, 504)
+BACKOFF_BASE_SEG = 0.5
+BACKOFF_MAX_SEG = 8.0
+FAIXAS_LATENCIA_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# endpoint -> timeout (conexão, leitura), orçamento total em segundos e tentativas
+CONFIG_PADRAO = {'timeout': (5, 10), 'orcamento': 30, 'tentativas': 3}
+CONFIG_ENDPOINTS = {
+    'wapi.send-text': {'timeout': (5, 10), 'orcamento': 20, 'tentativas': 1},
+    'wapi.send-media': {'timeout': (5, 60), 'orcamento': 90, 'tentativas': 1},
+    'wapi.qr-code': {'timeout': (5, 10), 'orcamento': 20, 'tentativas': 2},
+    'wapi.connect-phone': {'timeout': (5, 10), 'orcamento': 20, 'tentativas': 1},
+    'wapi.status-instance': {'timeout': (3, 8), 'orcamento': 15, 'tentativas': 3},
+    'wapi.info': {'timeout': (3, 8), 'orcamento': 15, 'tentativas': 3},
+    'wapi.update-webhook': {'timeout': (5, 10), 'orcamento': 20, 'tentativas': 1},
+    'fator.saldo': {'timeout': (5, 10), 'orcamento': 20, 'tentativas': 3},
+    'fator.cons-cpf': {'timeout': (5, 30), 'orcamento': 40, 'tentativas': 1},
+}
+
+_sessoes = {}
+_lock_sessoes = threading.Lock()
+_metricas = {}
+_lock_metricas = threading.Lock()
+
+def _chave_host(url):
+    partes = urlsplit(url)
+    return f"{partes.scheme}://{partes.netloc}"
+
+def obter_sessao(url):
+    """Session compartilhada do host da URL (criada na primeira chamada)."""
+    chave = _chave_host(url)
+    sessao = _sessoes.get(chave)
+    if sessao is not None: return sessao
+    with _lock_sessoes:
+        sessao = _sessoes.get(chave)
+        if sessao is None:
+            sessao = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_POR_HOST)
+            sessao.mount("http://", adaptador)
+            sessao.mount("https://", adaptador)
+            _sessoes[chave] = sessao
+    return sessao
+
+def configurar_endpoint(endpoint, **config):
+    """Ajusta timeout/orcamento/tentativas de um endpoint em tempo de execução."""
+    CONFIG_ENDPOINTS[endpoint] = {**CONFIG_PADRAO, **CONFIG_ENDPOINTS.get(endpoint, {}), **config}
+
+def _registrar(endpoint, ms, status):
+    with _lock_metricas:
+        m = _metricas.get(endpoint)
+        if m is None:
+            m = _metricas[endpoint] = {'chamadas': 0, 'erros': 0, 'repeticoes': 0, 'total_ms': 0.0,
+                                       'max_ms': 0.0, 'faixas': [0] * (len(FAIXAS_LATENCIA_MS) + 1)}
+        m['chamadas'] += 1
+        m['total_ms'] += ms
+        m['max_ms'] = max(m['max_ms'], ms)
+        if status is None or status >= 400: m['erros'] += 1
+        i = next((i for i, limite in enumerate(FAIXAS_LATENCIA_MS) if ms <= limite), len(FAIXAS_LATENCIA_MS))
+        m['faixas'][i] += 1
+
+def _espera_backoff(tentativa, resposta=None):
+    """Backoff exponencial com jitter total; respeita Retry-After numérico quando o servidor manda."""
+    if resposta is not None:
+        retry_after = resposta.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit(): return min(float(retry_after), BACKOFF_MAX_SEG)
+    return random.uniform(0, min(BACKOFF_MAX_SEG, BACKOFF_BASE_SEG * (2 ** tentativa)))
+
+def requisitar(metodo, url, endpoint=None, **kwargs):
+    """
+    Igual a requests.request (retorna Response ou levanta a exceção da última tentativa),
+    passando pela sessão do host e pelas regras do endpoint. `timeout` em kwargs sobrepõe o do endpoint.
+    """
+    endpoint = endpoint or _chave_host(url)
+    config = {**CONFIG_PADRAO, **CONFIG_ENDPOINTS.get(endpoint, {})}
+    timeout = kwargs.pop('timeout', None) or config['timeout']
+    timeout_conexao, timeout_leitura = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    idempotente = metodo.upper() in ('GET', 'HEAD', 'OPTIONS')
+    sessao = obter_sessao(url)
+    limite = time.monotonic() + config['orcamento']
+
+    tentativa = 0
+    while True:
+        restante = limite - time.monotonic()
+        inicio = time.perf_counter()
+        try:
+            resposta = sessao.request(metodo, url, timeout=(min(timeout_conexao, max(restante, 0.1)), min(timeout_leitura, max(restante, 0.1))), **kwargs)
+        except requests.exceptions.RequestException as e:
+            _registrar(endpoint, (time.perf_counter() - inicio) * 1000, None)
+            seguro = idempotente or isinstance(e, requests.exceptions.ConnectTimeout)
+            tentativa += 1
+            espera = _espera_backoff(tentativa)
+            if not seguro or tentativa >= config['tentativas'] or time.monotonic() + espera >= limite: raise
+            with _lock_metricas: _metricas[endpoint]['repeticoes'] += 1
+            time.sleep(espera)
+            continue
+
+        _registrar(endpoint, (time.perf_counter() - inicio) * 1000, resposta.status_code)
+        tentativa += 1
+        if resposta.status_code not in STATUS_REPETIVEIS or not idempotente or tentativa >= config['tentativas']:
+            return resposta
+        espera = _espera_backoff(tentativa, resposta)
+        if time.monotonic() + espera >= limite: return resposta
+        with _lock_metricas: _metricas[endpoint]['repeticoes'] += 1
+        time.sleep(espera)
+
+def get(url, endpoint=None, **kwargs):
+    return requisitar('GET', url, endpoint, **kwargs)
+
+def post(url, endpoint=None, **kwargs):
+    return requisitar('POST', url, endpoint, **kwargs)
+
+def _percentil(faixas, total, p):
+    alvo, acumulado = total * p, 0
+    for i, n in enumerate(faixas):
+        acumulado += n
+        if acumulado >= alvo: return FAIXAS_LATENCIA_MS[i] if i < len(FAIXAS_LATENCIA_MS) else float('inf')
+    return float('inf')
+
+def estatisticas_http():
+    """{endpoint: {chamadas, erros, repeticoes, media_ms, max_ms, p50_ms, p95_ms, p99_ms, faixas}} (percentis pelo limite superior da faixa)."""
+    with _lock_metricas:
+        copia = {e: {**m, 'faixas': list(m['faixas'])} for e, m in _metricas.items()}
+    for m in copia.values():
+        n = m['chamadas']
+        m['media_ms'] = m.pop('total_ms') / n if n else 0.0
+        for p in (50, 95, 99): m[f'p{p}_ms'] = _percentil(m['faixas'], n, p / 100)
+        m['faixas'] = dict(zip([f"<={f}" for f in FAIXAS_LATENCIA_MS] + [f">{FAIXAS_LATENCIA_MS[-1]}"], m['faixas']))
+    return copia
+
+def resetar_estatisticas():
+    with _lock_metricas: _metricas.clear()
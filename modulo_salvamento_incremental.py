@@ -0,0 +1,120 @@
+import math
+
+import pandas as pd
+from psycopg2 import sql
+from psycopg2.extras import execute_values, Json
+
+import modulo_catalogo as catalogo
+
+# =============================================================================
+# SALVAMENTO INCREMENTAL DOS EDITORES DE PLANILHA
+# Compara o DataFrame editado com o que foi carregado, pela chave primária,
+# e grava só as linhas incluídas/alteradas/excluídas, em lotes
+# (INSERT ... VALUES, UPDATE ... FROM (VALUES), DELETE ... USING (VALUES)).
+# Nada de TRUNCATE: dependentes (FKs) não são apagados em cascata, e uma
+# exclusão bloqueada por FK volta como erro para o usuário.
+# =============================================================================
+
+TAMANHO_LOTE = 1000
+
+def _valor_banco(valor):
+    """Converte o valor do DataFrame (numpy/pandas) para o tipo Python que o psycopg2 adapta."""
+    if valor is None or isinstance(valor, (dict, list)): return valor
+    try:
+        if pd.isna(valor): return None
+    except (TypeError, ValueError): pass
+    if isinstance(valor, pd.Timestamp): return valor.to_pydatetime()
+    if hasattr(valor, 'item'): return valor.item()
+    return valor
+
+def _adaptar(valor):
+    return Json(valor) if isinstance(valor, dict) else valor
+
+def _valor_chave(valor):
+    valor = _valor_banco(valor)
+    if isinstance(valor, float) and not math.isnan(valor) and valor.is_integer(): return int(valor)
+    return valor
+
+def calcular_diff(df_original, df_editado, chaves):
+    """
+    Retorna (inserir, atualizar, excluir):
+    inserir/atualizar são listas de dicts {coluna: valor}; excluir é a lista de tuplas de chave.
+    Linha editada sem chave (nova no editor) ou com chave inexistente no original vira INSERT.
+    """
+    colunas = [c for c in df_editado.columns if c in df_original.columns] if df_original is not None else list(df_editado.columns)
+    originais = {}
+    if df_original is not None:
+        for reg in df_original.to_dict('records'):
+            chave = tuple(_valor_chave(reg.get(k)) for k in chaves)
+            originais[chave] = {c: _valor_banco(reg.get(c)) for c in colunas}
+
+    inserir, atualizar, vistas = [], [], set()
+    for reg in df_editado.to_dict('records'):
+        linha = {c: _valor_banco(reg.get(c)) for c in colunas}
+        chave = tuple(_valor_chave(reg.get(k)) for k in chaves)
+        if any(v is None for v in chave) or chave not in originais:
+            inserir.append(linha)
+            continue
+        vistas.add(chave)
+        if linha != originais[chave]: atualizar.append(linha)
+
+    excluir = [chave for chave in originais if chave not in vistas]
+    return inserir, atualizar, excluir
+
+def _cast(coluna, tipos):
+    tipo = tipos.get(coluna)
+    return sql.SQL("v.{}::{}").format(sql.Identifier(coluna), sql.SQL(tipo)) if tipo else sql.SQL("v.{}").format(sql.Identifier(coluna))
+
+def salvar_diff(conn, schema, tabela, df_original, df_editado, chaves=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Aplica o diff na tabela dentro da transação de conn (o commit/rollback fica com o chamador).
+    chaves: colunas da PK; por padrão vêm do catálogo. Levanta ValueError se a tabela não tiver chave.
+    Retorna {'inseridos': n, 'atualizados': n, 'excluidos': n}.
+    """
+    chaves = list(chaves or catalogo.listar_chave_primaria(tabela, schema))
+    if not chaves or any(k not in df_editado.columns for k in chaves):
+        raise ValueError(f"Tabela {schema}.{tabela} sem chave primária visível no editor; salvamento incremental indisponível.")
+
+    tipos = dict(catalogo.listar_colunas_tipos(tabela, schema))
+    if tipos:
+        df_editado = df_editado[[c for c in df_editado.columns if c in tipos]]
+    inserir, atualizar, excluir = calcular_diff(df_original, df_editado, chaves)
+
+    ident_tabela = sql.Identifier(schema, tabela)
+    cur = conn.cursor()
+
+    if excluir:
+        query = sql.SQL("DELETE FROM {t} AS t USING (VALUES %s) AS v({cols}) WHERE {cond}").format(
+            t=ident_tabela,
+            cols=sql.SQL(", ").join(map(sql.Identifier, chaves)),
+            cond=sql.SQL(" AND ").join(sql.SQL("t.{} = {}").format(sql.Identifier(k), _cast(k, tipos)) for k in chaves),
+        )
+        execute_values(cur, query.as_string(conn), excluir, page_size=tamanho_lote)
+
+    if atualizar:
+        colunas = [c for c in atualizar[0].keys() if c not in chaves]
+        if colunas:
+            ordem = chaves + colunas
+            query = sql.SQL("UPDATE {t} AS t SET {sets} FROM (VALUES %s) AS v({cols}) WHERE {cond}").format(
+                t=ident_tabela,
+                sets=sql.SQL(", ").join(sql.SQL("{} = {}").format(sql.Identifier(c), _cast(c, tipos)) for c in colunas),
+                cols=sql.SQL(", ").join(map(sql.Identifier, ordem)),
+                cond=sql.SQL(" AND ").join(sql.SQL("t.{} = {}").format(sql.Identifier(k), _cast(k, tipos)) for k in chaves),
+            )
+            execute_values(cur, query.as_string(conn), [tuple(_adaptar(l[c]) for c in ordem) for l in atualizar], page_size=tamanho_lote)
+
+    if inserir:
+        # Colunas vazias em todas as linhas novas ficam de fora para valerem os DEFAULTs (id serial, data_criacao...)
+        colunas = [c for c in inserir[0].keys() if any(l[c] is not None for l in inserir)]
+        if colunas:
+            query = sql.SQL("INSERT INTO {t} ({cols}) VALUES %s").format(
+                t=ident_tabela, cols=sql.SQL(", ").join(map(sql.Identifier, colunas)))
+            execute_values(cur, query.as_string(conn), [tuple(_adaptar(l[c]) for c in colunas) for l in inserir], page_size=tamanho_lote)
+        else:
+            for _ in inserir: cur.execute(sql.SQL("INSERT INTO {t} DEFAULT VALUES").format(t=ident_tabela))
+
+    cur.close()
+    return {'inseridos': len(inserir), 'atualizados': len(atualizar), 'excluidos': len(excluir)}
+
+def resumo_diff(resultado):
+    return f"{resultado['inseridos']} incluída(s), {resultado['atualizados']} alterada(s), {resultado['excluidos']} excluída(s)."
@@ -3,7 +3,10 @@ import os
 import sys
 import psycopg2
 from psycopg2 import pool
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 import contextlib
+import select
+import threading
 from datetime import datetime, timedelta
 import time
 import importlib
@@ -46,7 +49,7 @@ for pasta in pastas_modulos:
     if os.path.exists(caminho) and caminho not in sys.path:
         sys.path.append(caminho)
 
-# --- 3. IMPORTAÇÕES DE MÓDULOS ---
+# --- 3. IMPORTAÇÕES DE MÓDULOS (SOB DEMANDA) ---
 try:
     import conexao
     
@@ -56,54 +59,67 @@ try:
         st.error("❌ ERRO FATAL: O arquivo 'modulo_validadores.py' não foi encontrado na pasta raiz!")
         st.stop()
 
-    import modulo_wapi
-    import modulo_whats_controlador
-    
-    def importar_seguro(nome_modulo):
+except Exception as e:
+    st.error(f"🔥 Erro Crítico Geral nas Importações: {e}")
+    st.stop()
+
+# Em produção cada módulo é importado uma única vez, quando o menu dele é aberto.
+# Com SISTEMA_HOT_RELOAD=1 no ambiente, o módulo (e suas dependências) é recarregado a cada abertura.
+RECARREGAR_MODULOS = os.environ.get("SISTEMA_HOT_RELOAD") == "1"
+
+# nome do módulo -> (arquivo relativo à raiz ou None, dependências recarregadas junto no modo dev)
+MODULOS_SISTEMA = {
+    "modulo_wapi": ("OPERACIONAL/MODULO_W-API/modulo_wapi.py", []),
+    "modulo_whats_controlador": ("OPERACIONAL/MODULO_W-API/modulo_whats_controlador.py", [
+        "modulo_whats_disparador", "modulo_whats_instancias", "modulo_whats_modelos_mensagem",
+        "modulo_whats_registros", "modulo_whats_numeros"]),
+    "modulo_tela_cliente": (None, []),
+    "modulo_permissoes": (None, []),
+    "modulo_chat": ("OPERACIONAL/MODULO_CHAT/modulo_chat.py", []),
+    "modulo_pessoa_fisica": ("OPERACIONAL/BANCO DE PLANILHAS/modulo_pessoa_fisica.py", [
+        "modulo_pf_cadastro", "modulo_pf_importacao", "modulo_pf_config_exportacao",
+        "modulo_pf_exportacao", "modulo_pf_campanhas", "modulo_pf_planilhas"]),
+    "modulo_comercial_geral": ("COMERCIAL/modulo_comercial_geral.py", []),
+    "modulo_conexoes": ("CONEXÕES/modulo_conexoes.py", []),
+    "modulo_sistema_consulta_menu": ("SISTEMA_CONSULTA/modulo_sistema_consulta_menu.py", []),
+}
+
+@st.cache_resource
+def get_registro_modulos():
+    """Tempos de importação por módulo (segundos), compartilhados pelo processo."""
+    return {"lock": threading.Lock(), "tempos": {}}
+
+def carregar_modulo(nome_modulo):
+    caminho_relativo, dependencias = MODULOS_SISTEMA.get(nome_modulo, (None, []))
+    if caminho_relativo and not os.path.exists(os.path.join(BASE_DIR, caminho_relativo)):
+        return None
+
+    if nome_modulo in sys.modules and not RECARREGAR_MODULOS:
+        return sys.modules[nome_modulo]
+
+    registro = get_registro_modulos()
+    with registro["lock"]:
+        if nome_modulo in sys.modules and not RECARREGAR_MODULOS:
+            return sys.modules[nome_modulo]
+        inicio = time.perf_counter()
         try:
             if nome_modulo in sys.modules:
-                return importlib.reload(sys.modules[nome_modulo])
+                for dep in dependencias:
+                    if dep in sys.modules: importlib.reload(sys.modules[dep])
+                modulo = importlib.reload(sys.modules[nome_modulo])
             else:
-                return __import__(nome_modulo)
-        except ImportError:
+                modulo = importlib.import_module(nome_modulo)
+        except ImportError as e:
+            if caminho_relativo: st.error(f"⚠️ Erro no arquivo '{caminho_relativo}': {e}")
             return None
         except Exception as e:
             st.error(f"⚠️ Erro grave ao carregar módulo '{nome_modulo}': {e}")
             return None
 
-    modulo_tela_cliente = importar_seguro("modulo_tela_cliente")
-    modulo_permissoes = importar_seguro("modulo_permissoes")
-
-    def carregar_modulo_por_caminho(caminho_relativo, nome_modulo):
-        caminho_completo = os.path.join(BASE_DIR, caminho_relativo)
-        if os.path.exists(caminho_completo):
-            try:
-                if nome_modulo in sys.modules:
-                    return importlib.reload(sys.modules[nome_modulo])
-                else:
-                    return __import__(nome_modulo)
-            except Exception as e:
-                st.error(f"⚠️ Erro no arquivo '{caminho_relativo}': {e}")
-                return None
-        return None
-
-    modulo_chat = carregar_modulo_por_caminho("OPERACIONAL/MODULO_CHAT/modulo_chat.py", "modulo_chat")
-    modulo_pf_cadastro = carregar_modulo_por_caminho("OPERACIONAL/BANCO DE PLANILHAS/modulo_pf_cadastro.py", "modulo_pf_cadastro")
-    modulo_pf_pesquisa = carregar_modulo_por_caminho("OPERACIONAL/BANCO DE PLANILHAS/modulo_pf_pesquisa.py", "modulo_pf_pesquisa")
-    modulo_pf_importacao = carregar_modulo_por_caminho("OPERACIONAL/BANCO DE PLANILHAS/modulo_pf_importacao.py", "modulo_pf_importacao")
-    modulo_pf = carregar_modulo_por_caminho("OPERACIONAL/BANCO DE PLANILHAS/modulo_pessoa_fisica.py", "modulo_pessoa_fisica")
-    modulo_pf_campanhas = carregar_modulo_por_caminho("OPERACIONAL/BANCO DE PLANILHAS/modulo_pf_campanhas.py", "modulo_pf_campanhas")
-    modulo_produtos = carregar_modulo_por_caminho("COMERCIAL/PRODUTOS_E_SERVICOS/modulo_produtos.py", "modulo_produtos")
-    modulo_pedidos = carregar_modulo_por_caminho("COMERCIAL/PEDIDOS/modulo_pedidos.py", "modulo_pedidos")
-    modulo_tarefas = carregar_modulo_por_caminho("COMERCIAL/TAREFAS/modulo_tarefas.py", "modulo_tarefas")
-    modulo_rf = carregar_modulo_por_caminho("COMERCIAL/RENOVACAO_E_FEEDBACK/modulo_renovacao_feedback.py", "modulo_renovacao_feedback")
-    modulo_comercial_geral = carregar_modulo_por_caminho("COMERCIAL/modulo_comercial_geral.py", "modulo_comercial_geral")
-    modulo_conexoes = carregar_modulo_por_caminho("CONEXÕES/modulo_conexoes.py", "modulo_conexoes")
-    modulo_sistema_consulta_menu = carregar_modulo_por_caminho("SISTEMA_CONSULTA/modulo_sistema_consulta_menu.py", "modulo_sistema_consulta_menu")
-
-except Exception as e:
-    st.error(f"🔥 Erro Crítico Geral nas Importações: {e}")
-    st.stop()
+        tempo = time.perf_counter() - inicio
+        registro["tempos"][nome_modulo] = tempo
+        print(f"[módulos] {nome_modulo} carregado em {tempo * 1000:.0f} ms", flush=True)
+        return modulo
 
 # --- 4. FUNÇÕES DE BANCO DE DADOS (POOL CONNECTION) ---
 
@@ -155,6 +171,58 @@ def get_conn():
 
 # --- 5. FUNÇÕES DE SEGURANÇA E LOGIN ---
 
+# Sessão validada no banco fica valendo por este intervalo; um login novo em outro
+# lugar avisa pelo canal LISTEN/NOTIFY e força a revalidação no próximo clique.
+INTERVALO_REVALIDACAO_SESSAO = 60
+CANAL_SESSOES = "sessoes_ativas"
+
+def _escutar_canal_sessoes(estado):
+    """Thread do ouvinte: registra o horário do último aviso de novo login por id_usuario."""
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(
+                host=conexao.host, port=conexao.port, database=conexao.database,
+                user=conexao.user, password=conexao.password, connect_timeout=5
+            )
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute(f"LISTEN {CANAL_SESSOES}")
+            estado["ativo"] = True
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    aviso = conn.notifies.pop(0)
+                    with estado["lock"]:
+                        estado["avisos"][aviso.payload] = time.monotonic()
+        except Exception as e:
+            print(f"Ouvinte de sessões desconectado: {e}")
+        finally:
+            estado["ativo"] = False
+            if conn:
+                try: conn.close()
+                except: pass
+        time.sleep(5)
+
+@st.cache_resource
+def get_ouvinte_sessoes():
+    estado = {"lock": threading.Lock(), "avisos": {}, "ativo": False}
+    threading.Thread(target=_escutar_canal_sessoes, args=(estado,), daemon=True, name="ouvinte_sessoes").start()
+    return estado
+
+def sessao_precisa_revalidar(id_usuario):
+    """Sem ouvinte ativo (avisos podem ter sido perdidos) a validação volta a ser a cada clique."""
+    validada_em = st.session_state.get('sessao_validada_em')
+    if validada_em is None: return True
+
+    ouvinte = get_ouvinte_sessoes()
+    if not ouvinte["ativo"]: return True
+    if time.monotonic() - validada_em > INTERVALO_REVALIDACAO_SESSAO: return True
+
+    aviso = ouvinte["avisos"].get(str(id_usuario))
+    return aviso is not None and aviso >= validada_em
+
 def verificar_sessao_unica_db(id_usuario, token_atual):
     """Verifica se o token da sessão atual ainda é o válido no banco."""
     # Alteração: Uso de context manager do pool
@@ -184,6 +252,8 @@ def registrar_sessao_db(id_usuario, nome_usuario):
                 INSERT INTO admin.sessoes_ativas (token, id_usuario, nome_usuario, data_inicio, ultimo_clique)
                 VALUES (%s, %s, %s, NOW(), NOW())
             """, (token, id_usuario, nome_usuario))
+            # Avisa as outras instâncias (entregue no commit) para derrubarem a sessão antiga
+            cur.execute("SELECT pg_notify(%s, %s)", (CANAL_SESSOES, str(id_usuario)))
             conn.commit()
             return token
         except Exception as e:
@@ -295,8 +365,9 @@ def enviar_nova_senha_whatsapp(email_destino):
             
             if not telefone or len(telefone) < 10: return "Usuário sem telefone válido cadastrado."
 
-            cur.execute("SELECT api_instance_id, api_token FROM wapi_instancias LIMIT 1")
-            inst = cur.fetchone()
+            modulo_wapi = carregar_modulo("modulo_wapi")
+            if not modulo_wapi: return "Módulo WhatsApp indisponível."
+            inst = modulo_wapi.buscar_instancia_ativa(telefone)
             if not inst: return "Nenhuma instância de WhatsApp configurada no sistema."
             
             alfabeto = string.ascii_letters + string.digits
@@ -350,10 +421,13 @@ def gerenciar_sessao():
         uid = st.session_state.get('usuario_id')
         token = st.session_state.get('token_sessao')
         
-        if not verificar_sessao_unica_db(uid, token):
-            st.session_state.clear()
-            st.warning("🔒 Sua conta foi conectada em outro dispositivo/navegador. Esta sessão foi encerrada.")
-            st.stop()
+        if sessao_precisa_revalidar(uid):
+            inicio_validacao = time.monotonic()
+            if not verificar_sessao_unica_db(uid, token):
+                st.session_state.clear()
+                st.warning("🔒 Sua conta foi conectada em outro dispositivo/navegador. Esta sessão foi encerrada.")
+                st.stop()
+            st.session_state['sessao_validada_em'] = inicio_validacao
 
     tempo_total = agora - st.session_state['hora_login']
     mm, ss = divmod(tempo_total.seconds, 60)
@@ -387,6 +461,9 @@ def dialog_mensagem_rapida():
             msg = st.text_area("Mensagem")
             if st.button("Enviar", type="primary"):
                 if destino and msg:
+                    modulo_wapi = carregar_modulo("modulo_wapi")
+                    if not modulo_wapi: st.error("Módulo WhatsApp indisponível."); return
+                    inst = modulo_wapi.buscar_instancia_ativa(destino) or inst
                     res = modulo_wapi.enviar_msg_api(inst[0], inst[1], destino, msg)
                     if res.get('success'): st.success("Enviado!"); time.sleep(1); st.rerun()
                     else: st.error("Erro no envio.")
@@ -548,29 +625,37 @@ def main():
         pagina = st.session_state['pagina_central']
         
         if pagina == "Início":
+            modulo_chat = carregar_modulo("modulo_chat")
             if modulo_chat: modulo_chat.app_chat_screen()
             else: st.info("Painel Inicial (Módulo Chat não detectado)")
             
         elif pagina == "Clientes":
+            modulo_permissoes = carregar_modulo("modulo_permissoes")
             if modulo_permissoes and modulo_permissoes.verificar_bloqueio_de_acesso("bloqueio_menu_cliente", "Clientes", False):
                 st.error("🚫 Acesso Negado ao Módulo Clientes"); st.stop()
+            modulo_tela_cliente = carregar_modulo("modulo_tela_cliente")
             if modulo_tela_cliente: modulo_tela_cliente.app_clientes()
             
         elif pagina == "Comercial":
+            modulo_comercial_geral = carregar_modulo("modulo_comercial_geral")
             if modulo_comercial_geral: modulo_comercial_geral.app_comercial_geral()
             else: st.warning("⚠️ Módulo Comercial Geral não encontrado.")
 
         elif pagina == "BancoDados":
+            modulo_pf = carregar_modulo("modulo_pessoa_fisica")
             if modulo_pf: modulo_pf.app_pessoa_fisica()
             else: st.warning("Módulo Pessoa Física não carregado.")
 
         elif pagina == "WhatsApp":
+            modulo_whats_controlador = carregar_modulo("modulo_whats_controlador")
             modulo_whats_controlador.app_wapi() if modulo_whats_controlador else st.warning("Módulo WhatsApp Off")
             
         elif pagina == "Conexoes":
+            modulo_conexoes = carregar_modulo("modulo_conexoes")
             modulo_conexoes.app_conexoes() if modulo_conexoes else st.warning("Módulo Conexões Off")
 
         elif pagina == "CRM_Consulta":
+            modulo_sistema_consulta_menu = carregar_modulo("modulo_sistema_consulta_menu")
             if modulo_sistema_consulta_menu:
                 modulo_sistema_consulta_menu.app_sistema_consulta()
             else:
@@ -0,0 +1,128 @@
+import time
+import argparse
+import statistics
+
+import modulo_busca_indices as mbi
+
+# =============================================================================
+# BENCHMARK DAS BUSCAS (ANTES x DEPOIS DOS ÍNDICES TRIGRAM)
+# Uso: python util_benchmark_busca.py [--linhas 5000000] [--repeticoes 5] [--manter]
+# Cria uma base sintética no schema bench_busca com as mesmas tabelas de
+# banco_pf e sistema_consulta, mede as consultas antigas e as reescritas sem
+# índice e depois com os índices de INDICES_BUSCA. O schema é apagado no
+# final, a menos que --manter seja usado.
+# =============================================================================
+
+SCHEMA = "bench_busca"
+
+def criar_base_sintetica(cur, linhas):
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    nomes = "ARRAY['MARIA','JOSE','ANA','JOAO','ANTONIO','FRANCISCA','CARLOS','PAULO','LUCIA','PEDRO','SANDRA','MARCOS']"
+    sobrenomes = "ARRAY['SILVA','SANTOS','OLIVEIRA','SOUZA','RODRIGUES','FERREIRA','ALVES','PEREIRA','LIMA','GOMES','COSTA','RIBEIRO']"
+    nome_expr = f"""
+        ({nomes})[1 + (g * 7) % 12] || ' ' || ({sobrenomes})[1 + (g * 13) % 12] || ' ' ||
+        ({sobrenomes})[1 + (g * 31) % 12] || ' ' || md5(g::text)::varchar(6)
+    """
+
+    cur.execute(f"""
+        CREATE TABLE {SCHEMA}.pf_dados AS
+        SELECT g AS id, lpad((g * 7919 % 99999999999)::text, 11, '0')::varchar(20) AS cpf,
+               ({nome_expr})::varchar(255) AS nome, DATE '1950-01-01' + (g % 20000) AS data_nascimento
+        FROM generate_series(1, %s) g
+    """, (linhas,))
+    cur.execute(f"ALTER TABLE {SCHEMA}.pf_dados ADD PRIMARY KEY (cpf)")
+    cur.execute(f"""
+        CREATE TABLE {SCHEMA}.pf_telefones AS
+        SELECT d.id, d.cpf, ('(' || (11 + d.id % 80) || ')9' || lpad((d.id * 104729 % 100000000)::text, 8, '0'))::varchar(20) AS numero
+        FROM {SCHEMA}.pf_dados d
+    """)
+
+    cur.execute(f"""
+        CREATE TABLE {SCHEMA}.sistema_consulta_dados_cadastrais_cpf AS
+        SELECT id, cpf::bigint AS cpf, nome::text AS nome, ('MG' || (id * 17 % 9999999))::text AS identidade,
+               ('JOSE ' || md5((id + 1)::text)::varchar(6))::text AS nome_pai,
+               (CASE WHEN id % 50 = 0 THEN 'CAMPANHA ' || (id % 7) END)::varchar(255) AS campanhas,
+               ((id % 300) + 1)::text AS id_importacao
+        FROM {SCHEMA}.pf_dados
+    """)
+    cur.execute(f"ALTER TABLE {SCHEMA}.sistema_consulta_dados_cadastrais_cpf ADD PRIMARY KEY (id)")
+    cur.execute(f"""
+        CREATE TABLE {SCHEMA}.sistema_consulta_dados_cadastrais_telefone AS
+        SELECT t.id, d.cpf::bigint AS cpf, regexp_replace(t.numero, '[^0-9]', '', 'g')::varchar(20) AS telefone
+        FROM {SCHEMA}.pf_telefones t JOIN {SCHEMA}.pf_dados d ON d.cpf = t.cpf
+    """)
+    cur.execute(f"ANALYZE {SCHEMA}.pf_dados; ANALYZE {SCHEMA}.pf_telefones")
+    cur.execute(f"ANALYZE {SCHEMA}.sistema_consulta_dados_cadastrais_cpf; ANALYZE {SCHEMA}.sistema_consulta_dados_cadastrais_telefone")
+
+def consultas(termo_nome, termo_digitos):
+    s, like_n, like_d = SCHEMA, f"%{termo_nome}%", f"%{termo_digitos}%"
+    tel_pf, tel_sc = mbi.expr_digitos('t.numero'), mbi.expr_digitos('tel.telefone')
+    return [
+        ("PF nome (antiga)", f"SELECT DISTINCT d.id, d.nome, d.cpf, d.data_nascimento FROM {s}.pf_dados d WHERE d.nome ILIKE %s ORDER BY d.nome LIMIT 50", (like_n,)),
+        ("PF nome (nova)", f"SELECT d.id, d.nome, d.cpf, d.data_nascimento FROM {s}.pf_dados d WHERE d.nome ILIKE %s ORDER BY d.nome LIMIT 50", (like_n,)),
+        ("PF cpf/tel (antiga)", f"SELECT DISTINCT d.id, d.nome, d.cpf, d.data_nascimento FROM {s}.pf_dados d LEFT JOIN {s}.pf_telefones t ON d.cpf = t.cpf WHERE d.cpf LIKE %s OR t.numero LIKE %s ORDER BY d.nome LIMIT 50", (like_d, like_d)),
+        ("PF cpf/tel (nova)", f"""SELECT * FROM (SELECT d.id, d.nome, d.cpf, d.data_nascimento FROM {s}.pf_dados d WHERE d.cpf LIKE %s
+            UNION SELECT d.id, d.nome, d.cpf, d.data_nascimento FROM {s}.pf_telefones t JOIN {s}.pf_dados d ON d.cpf = t.cpf WHERE {tel_pf} LIKE %s) sub
+            ORDER BY nome LIMIT 50""", (like_d, like_d)),
+        ("Consulta rápida (antiga)", f"""SELECT t.id, t.nome, t.cpf, t.identidade FROM {s}.sistema_consulta_dados_cadastrais_cpf t
+            WHERE t.nome ILIKE %s OR t.identidade ILIKE %s OR t.nome_pai ILIKE %s OR t.campanhas ILIKE %s OR t.id_importacao ILIKE %s OR
+            EXISTS (SELECT 1 FROM {s}.sistema_consulta_dados_cadastrais_telefone WHERE cpf = t.cpf AND CAST(telefone AS TEXT) ILIKE %s)
+            OR CAST(t.cpf AS TEXT) ILIKE %s LIMIT 30""", (like_d,) * 7),
+        ("Consulta rápida (nova)", f"""SELECT t.id, t.nome, t.cpf, t.identidade FROM {s}.sistema_consulta_dados_cadastrais_cpf t
+            WHERE t.id IN (SELECT id FROM (
+                SELECT id FROM {s}.sistema_consulta_dados_cadastrais_cpf
+                WHERE nome ILIKE %s OR identidade ILIKE %s OR nome_pai ILIKE %s OR campanhas ILIKE %s OR id_importacao ILIKE %s OR (cpf::text) LIKE %s
+                UNION SELECT c.id FROM {s}.sistema_consulta_dados_cadastrais_telefone tel
+                JOIN {s}.sistema_consulta_dados_cadastrais_cpf c ON c.cpf = tel.cpf WHERE {tel_sc} LIKE %s
+            ) AS ids LIMIT 30)""", (like_d,) * 7),
+    ]
+
+def medir(cur, query, params, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        cur.execute(query, params)
+        cur.fetchall()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos)
+
+def executar_benchmark(linhas, repeticoes, termo_nome, termo_digitos, manter):
+    conn = mbi.get_conn()
+    if not conn:
+        print("❌ Sem conexão com o banco (verifique conexao.py)")
+        return
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        print(f"⏳ Gerando base sintética com {linhas:,} linhas em {SCHEMA}...")
+        inicio = time.perf_counter()
+        criar_base_sintetica(cur, linhas)
+        print(f"   pronto em {time.perf_counter() - inicio:.0f}s")
+
+        lista = consultas(termo_nome, termo_digitos)
+        sem_indice = {nome: medir(cur, q, p, repeticoes) for nome, q, p in lista}
+
+        print("⏳ Criando índices de busca...")
+        for grupo in mbi.INDICES_BUSCA:
+            for nome, erro in mbi.provisionar_indices_busca(grupo, schema=SCHEMA, conn=conn, concorrente=False):
+                print(f"   ⚠️ {nome}: {erro}")
+        cur.execute(f"ANALYZE {SCHEMA}.pf_dados; ANALYZE {SCHEMA}.pf_telefones")
+        cur.execute(f"ANALYZE {SCHEMA}.sistema_consulta_dados_cadastrais_cpf; ANALYZE {SCHEMA}.sistema_consulta_dados_cadastrais_telefone")
+
+        print(f"\n{'CONSULTA':<28} {'SEM ÍNDICE ms':>14} {'COM ÍNDICE ms':>14}")
+        for nome, q, p in lista:
+            print(f"{nome:<28} {sem_indice[nome]:>14.1f} {medir(cur, q, p, repeticoes):>14.1f}")
+    finally:
+        if not manter: cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Mede as buscas de PF e Sistema Consulta com e sem índices trigram.")
+    ap.add_argument("--linhas", type=int, default=5_000_000)
+    ap.add_argument("--repeticoes", type=int, default=5)
+    ap.add_argument("--nome", default="RIBEIRO COSTA")
+    ap.add_argument("--digitos", default="98765")
+    ap.add_argument("--manter", action="store_true", help="Não apaga o schema sintético no final")
+    args = ap.parse_args()
+    executar_benchmark(args.linhas, args.repeticoes, args.nome, args.digitos, args.manter)